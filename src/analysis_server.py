@@ -11,7 +11,6 @@ import time
 import threading
 import queue
 import argparse
-from pathlib import Path
 from datetime import datetime
 from flask import Flask, render_template, jsonify, request, Response
 from flask_cors import CORS
@@ -20,12 +19,11 @@ import signal
 
 # Import our modules
 from orchestrator import MappingOrchestrator
-from ingest import StoryIngestor
-from chunk_dispatcher import ChunkDispatcher
 from verifier import MappingVerifier
 from merge_chunks import ChunkMerger
 from post_processor import PostProcessor
 from gap_detector import GapDetector
+from story_index import StoryIndex
 
 app = Flask(__name__)
 CORS(app)
@@ -43,12 +41,16 @@ class AnalysisServer:
         self.error = None
         self.analysis_thread = None
         self.cancel_requested = False
+        self.orchestrator = None
         
         # Analysis parameters
         self.story_file = None
         self.model_name = "qwen2.5:32b"
         self.batch_size = 10
         self.use_mock_llm = False
+        self.concurrency = 1
+        self.stream = False
+        self.rows_received = 0
         
     def log(self, message, level="info"):
         """Add message to log queue"""
@@ -82,17 +84,31 @@ class AnalysisServer:
             self.cancel_requested = False
             self.log(f"Starting analysis of {self.story_file}", "info")
             
+            orchestrator = MappingOrchestrator(
+                story_file=self.story_file,
+                batch_size=self.batch_size,
+                use_mock_llm=self.use_mock_llm,
+                model_name=self.model_name,
+                concurrency=self.concurrency,
+                stream=self.stream,
+                on_row=self._on_row
+            )
+            fingerprints = orchestrator.stage_fingerprints()
+            
+            def needs_run(stage):
+                if orchestrator.stage_needs_run(stage, fingerprints[stage]):
+                    return True
+                self.log("Inputs and settings unchanged since the last run, skipped", "info")
+                return False
+            
             # Step 1: Ingest story
             self.current_task = "Ingesting story"
             self.log("Step 1/6: Ingesting story...", "info")
             
-            if Path("story.json").exists():
-                self.log("Using existing story.json", "info")
-            else:
-                ingestor = StoryIngestor(self.story_file)
-                ingestor.process_story()
-                ingestor.save_to_json("story.json")
-                self.log(f"Ingested {len(ingestor.story_data['data'])} text units", "info")
+            if needs_run("ingest"):
+                units = orchestrator.ingest_story()
+                orchestrator.stage_state.record("ingest", fingerprints['ingest'], orchestrator.ingest_outputs())
+                self.log(f"Ingested {units} text units", "info")
             
             if self.cancel_requested:
                 self.log("Analysis cancelled by user", "warning")
@@ -102,12 +118,15 @@ class AnalysisServer:
             self.current_task = "Creating batches"
             self.log("Step 2/6: Creating batches...", "info")
             
-            dispatcher = ChunkDispatcher("story.json", self.batch_size)
-            batches = dispatcher.create_batches()
-            dispatcher.save_all_batches("batches")
-            
-            self.total_steps = len(batches)
-            self.log(f"Created {len(batches)} batches of {self.batch_size} units each", "info")
+            story_index = StoryIndex.load("story.json")
+            orchestrator.story_index = story_index
+            dispatcher = orchestrator.create_dispatcher()
+            if needs_run("dispatch"):
+                self.total_steps = dispatcher.save_manifest("batches")
+                orchestrator.stage_state.record("dispatch", fingerprints['dispatch'], ["batches/manifest.json"])
+            else:
+                self.total_steps = dispatcher.count_batches()
+            self.log(f"Created {self.total_steps} batches of {self.batch_size} units each", "info")
             
             if self.cancel_requested:
                 self.log("Analysis cancelled by user", "warning")
@@ -117,32 +136,32 @@ class AnalysisServer:
             self.current_task = "Processing batches"
             self.log("Step 3/6: Processing batches with LLM...", "info")
             
-            orchestrator = MappingOrchestrator(
-                story_file=self.story_file,
-                batch_size=self.batch_size,
-                use_mock_llm=self.use_mock_llm,
-                model_name=self.model_name
-            )
-            
-            # Process each batch
-            for i, batch in enumerate(batches):
-                if self.cancel_requested:
-                    self.log("Analysis cancelled by user", "warning")
-                    return
-                    
-                self.progress = i + 1
+            # Process batches, reporting each one as it completes
+            def on_result(batch, result, completed, total):
+                self.progress = completed
                 batch_id = batch['batch_id']
                 
                 if self.verbose:
-                    self.log(f"Processing {batch_id} ({i+1}/{len(batches)})", "debug")
-                
-                result = orchestrator.process_batch(batch)
+                    self.log(f"Completed {batch_id} ({completed}/{total})", "debug")
                 
                 if result:
                     self.log(f"✓ {batch_id} processed successfully", "debug")
                 else:
                     self.log(f"✗ {batch_id} failed processing", "warning")
             
+            if needs_run("process"):
+                self.orchestrator = orchestrator
+                results = orchestrator.process_batches(dispatcher.iter_batches(), on_result=on_result,
+                                                       should_cancel=lambda: self.cancel_requested,
+                                                       render=lambda descriptor: dispatcher.render_batch(descriptor, "batches"),
+                                                       total=self.total_steps)
+                self.orchestrator = None
+                orchestrator.metrics.save("run_metrics.json")
+                if orchestrator.processing_complete(results, self.total_steps):
+                    orchestrator.stage_state.record("process", fingerprints['process'], ["results"])
+            else:
+                self.progress = self.total_steps
+            
             if self.cancel_requested:
                 self.log("Analysis cancelled by user", "warning")
                 return
@@ -151,13 +170,16 @@ class AnalysisServer:
             self.current_task = "Merging results"
             self.log("Step 4/6: Merging results...", "info")
             
-            merger = ChunkMerger("results")
-            merger.merge_all_results()
-            merger.enrich_with_metadata()
-            merger.save_mappings("mapping")
-            stats = merger.merge_stats
-            
-            self.log(f"Merged {stats['total_units']} units from {stats['batches_processed']} batches", "info")
+            if needs_run("merge"):
+                merger = ChunkMerger("results", story_index=story_index)
+                merger.merge_all_results(batch['batch_id'] for batch in dispatcher.iter_batches())
+                merger.enrich_with_metadata()
+                merger.save_mappings("mapping")
+                orchestrator.stage_state.record("merge", fingerprints['merge'],
+                                                ["mapping.json", "mapping.md", "mapping.csv"])
+                stats = merger.merge_stats
+                
+                self.log(f"Merged {stats['total_units']} units from {stats['batches_processed']} batches", "info")
             
             if self.cancel_requested:
                 self.log("Analysis cancelled by user", "warning")
@@ -167,10 +189,12 @@ class AnalysisServer:
             self.current_task = "Generating visualizations"
             self.log("Step 5/6: Generating visualizations and reports...", "info")
             
-            processor = PostProcessor("mapping.json")
-            processor.save_all_views("derived_views")
-            
-            self.log("Generated character network, location flow, and derived views", "info")
+            if needs_run("post_process"):
+                processor = PostProcessor("mapping.json")
+                processor.save_all_views("derived_views")
+                orchestrator.stage_state.record("post_process", fingerprints['post_process'], ["derived_views"])
+                
+                self.log("Generated character network, location flow, and derived views", "info")
             
             if self.cancel_requested:
                 self.log("Analysis cancelled by user", "warning")
@@ -180,13 +204,18 @@ class AnalysisServer:
             self.current_task = "Verifying integrity"
             self.log("Step 6/6: Running gap detection...", "info")
             
-            detector = GapDetector("story.json", "mapping.json")
-            missing_uids = detector.detect_missing_uids()
-            
-            if missing_uids:
-                self.log(f"Warning: {len(missing_uids)} UIDs missing from analysis", "warning")
-            else:
-                self.log("✓ 100% coverage achieved - no gaps detected", "success")
+            if needs_run("gap_detection"):
+                detector = GapDetector("story.json", "mapping.json", story_index=story_index)
+                missing_uids = detector.detect_missing_uids()
+                
+                if missing_uids:
+                    self.log(f"Warning: {len(missing_uids)} UIDs missing from analysis", "warning")
+                else:
+                    self.log("✓ 100% coverage achieved - no gaps detected", "success")
+                
+                with open("gap_report.json", 'w', encoding='utf-8') as f:
+                    json.dump(detector.generate_gap_report(), f, indent=2)
+                orchestrator.stage_state.record("gap_detection", fingerprints['gap_detection'], ["gap_report.json"])
             
             # Complete
             self.end_time = datetime.now()
@@ -201,7 +230,12 @@ class AnalysisServer:
             self.log(f"Error during analysis: {str(e)}", "error")
             raise
     
-    def start_analysis(self, story_file, model_name=None, batch_size=None, use_mock=False):
+    def _on_row(self, batch_id, row):
+        """Count rows as they stream in so the UI moves before a batch finishes"""
+        self.rows_received += 1
+    
+    def start_analysis(self, story_file, model_name=None, batch_size=None, use_mock=False, concurrency=None,
+                       stream=False):
         """Start analysis in background thread"""
         if self.status == "running":
             return False, "Analysis already running"
@@ -211,10 +245,14 @@ class AnalysisServer:
             self.model_name = model_name
         if batch_size:
             self.batch_size = batch_size
+        if concurrency:
+            self.concurrency = concurrency
         self.use_mock_llm = use_mock
+        self.stream = stream
         
         # Reset state
         self.progress = 0
+        self.rows_received = 0
         self.total_steps = 0
         self.error = None
         self.current_task = "Initializing"
@@ -231,6 +269,10 @@ class AnalysisServer:
         if self.status == "running":
             self.cancel_requested = True
             self.status = "cancelling"
+            orchestrator = self.orchestrator
+            if orchestrator is not None:
+                # Interrupt generations already running rather than waiting for them
+                orchestrator.cancel()
             return True, "Cancellation requested"
         return False, "No analysis running"
 
@@ -361,6 +403,7 @@ def index():
                 <p><strong>Current Status:</strong> <span id="status" class="status-idle">Idle</span></p>
                 <p><strong>Current Task:</strong> <span id="task">None</span></p>
                 <p><strong>Progress:</strong> <span id="progress-text">0 / 0</span></p>
+                <p><strong>Rows Streamed:</strong> <span id="rows-received">0</span></p>
                 <div class="progress-bar">
                     <div class="progress-fill" id="progress-bar" style="width: 0%">0%</div>
                 </div>
@@ -384,6 +427,14 @@ def index():
                     <label>Batch Size:</label>
                     <input type="number" id="batch-size" value="10" min="1" max="50" style="width: 60px;">
                     
+                    <label>Concurrency:</label>
+                    <input type="number" id="concurrency" value="1" min="1" max="16" style="width: 60px;">
+                    
+                    <label>
+                        <input type="checkbox" id="stream">
+                        <span class="checkbox-label">Stream Responses</span>
+                    </label>
+                    
                     <label>
                         <input type="checkbox" id="verbose" onchange="toggleVerbose()">
                         <span class="checkbox-label">Verbose Logging</span>
@@ -409,6 +460,8 @@ def index():
                 const storyFile = document.getElementById('story-file').value;
                 const modelName = document.getElementById('model-name').value;
                 const batchSize = document.getElementById('batch-size').value;
+                const concurrency = document.getElementById('concurrency').value;
+                const stream = document.getElementById('stream').checked;
                 const useMock = modelName === 'mock';
                 
                 fetch('/api/start', {
@@ -418,6 +471,8 @@ def index():
                         story_file: storyFile,
                         model_name: useMock ? 'qwen2.5:32b' : modelName,
                         batch_size: parseInt(batchSize),
+                        concurrency: parseInt(concurrency),
+                        stream: stream,
                         use_mock: useMock
                     })
                 })
@@ -481,6 +536,7 @@ def index():
                     // Update progress
                     const progressText = `${data.progress} / ${data.total_steps}`;
                     document.getElementById('progress-text').textContent = progressText;
+                    document.getElementById('rows-received').textContent = data.rows_received;
                     
                     const percentage = data.total_steps > 0 ? 
                         Math.round((data.progress / data.total_steps) * 100) : 0;
@@ -536,6 +592,7 @@ def api_status():
         'current_task': server.current_task,
         'progress': server.progress,
         'total_steps': server.total_steps,
+        'rows_received': server.rows_received,
         'verbose': server.verbose,
         'logs': server.get_logs()
     })
@@ -548,7 +605,9 @@ def api_start():
         story_file=data.get('story_file'),
         model_name=data.get('model_name'),
         batch_size=data.get('batch_size'),
-        use_mock=data.get('use_mock', False)
+        use_mock=data.get('use_mock', False),
+        concurrency=data.get('concurrency'),
+        stream=data.get('stream', False)
     )
     return jsonify({'success': success, 'message': message})
 
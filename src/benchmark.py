@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for Zero-Loss Mapping Workflow
+Measures pipeline performance against the mock LLM so results are reproducible offline
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List
+
+# Import our modules
+from ingest import StoryIngestor, SentenceSegmenter, ABBREVIATIONS
+from chunk_dispatcher import ChunkDispatcher, MAPPING_INSTRUCTIONS
+from corpus_ingest import CorpusIngestor
+from orchestrator import MappingOrchestrator, ANALYSIS_REQUIREMENTS
+from story_index import StoryIndex
+from story_store import StoryStore
+from verifier import MappingVerifier
+
+DEFAULT_STORY = str(Path(__file__).resolve().parent.parent / "examples" / "sample_story.txt")
+
+
+class SimulatedLatencyOrchestrator(MappingOrchestrator):
+    """Mock-LLM orchestrator that sleeps for a fixed time per call, like a busy server would"""
+
+    def __init__(self, latency: float, **kwargs):
+        super().__init__(use_mock_llm=True, **kwargs)
+        self.latency = latency
+
+    def mock_llm_process(self, batch: Dict[str, Any]) -> str:
+        time.sleep(self.latency)
+        return super().mock_llm_process(batch)
+
+
+def quiet():
+    """Silence the per-batch progress output of the pipeline modules"""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def prepare_workspace(story_file: str, batch_size: int) -> List[Dict[str, Any]]:
+    """Ingest the story and write batches into the current directory"""
+    ingestor = StoryIngestor(story_file)
+    ingestor.process_story()
+    ingestor.save_to_json("story.json")
+
+    dispatcher = ChunkDispatcher("story.json", batch_size)
+    batches = dispatcher.create_batches()
+    dispatcher.save_all_batches("batches")
+    return batches
+
+
+def bench_concurrency(args):
+    """Wall time of the batch processing stage as the number of batches in flight grows"""
+    with quiet():
+        batches = prepare_workspace(args.story, args.batch_size)
+    levels = [int(n) for n in args.levels.split(',')]
+
+    timings = []
+    for level in levels:
+        orchestrator = SimulatedLatencyOrchestrator(
+            args.latency,
+            story_file=args.story,
+            batch_size=args.batch_size,
+            concurrency=level
+        )
+        start = time.perf_counter()
+        with quiet():
+            orchestrator.process_batches(batches)
+        elapsed = time.perf_counter() - start
+        timings.append((level, elapsed, orchestrator.stats['units_verified']))
+
+    baseline = timings[0][1]
+    print(f"\nConcurrency benchmark: {len(batches)} batches, {args.latency:.2f}s simulated latency per call")
+    print(f"{'Concurrency':>12} {'Wall time':>10} {'Speedup':>8} {'Units verified':>15}")
+    for level, elapsed, verified in timings:
+        print(f"{level:>12} {elapsed:>9.2f}s {baseline / elapsed:>7.2f}x {verified:>15}")
+
+
+def synthetic_story(story_data: Dict[str, Any], copies: int) -> Dict[str, Any]:
+    """Repeat a story's chapters `copies` times with fresh chapter numbers and UIDs"""
+    units = story_data['data']
+    chapters = max(unit['chapter'] for unit in units)
+    data = []
+    for copy in range(copies):
+        for unit in units:
+            chapter = unit['chapter'] + copy * chapters
+            data.append({
+                **unit,
+                "uid": f"CH{chapter:02d}-P{unit['paragraph']:03d}-S{unit['sentence']:03d}",
+                "chapter": chapter
+            })
+    return {"metadata": {**story_data['metadata'], "total_chapters": chapters * copies}, "data": data}
+
+
+def bench_story_index(args):
+    """Per-batch verification cost with and without the shared story index, as the story grows"""
+    with quiet():
+        prepare_workspace(args.story, args.batch_size)
+    with open("story.json", 'r', encoding='utf-8') as f:
+        base_story = json.load(f)
+    orchestrator = MappingOrchestrator(use_mock_llm=True)
+    scales = [int(n) for n in args.scales.split(',')]
+
+    print(f"\nVerification cost per batch ({args.batches} batches of {args.batch_size} units per measurement)")
+    print(f"{'Story units':>12} {'Reload story.json':>18} {'Shared index':>13} {'Index build':>12}")
+    for scale in scales:
+        story = synthetic_story(base_story, scale)
+        with open("story.json", 'w', encoding='utf-8') as f:
+            json.dump(story, f, indent=2, ensure_ascii=False)
+        with quiet():
+            dispatcher = ChunkDispatcher("story.json", args.batch_size)
+            batches = dispatcher.create_batches()[:args.batches]
+            dispatcher.batches = batches
+            dispatcher.save_all_batches("batches")
+        responses = [orchestrator.mock_llm_process(batch) for batch in batches]
+
+        # Previous behaviour: every verifier re-reads the batch file and re-parses story.json
+        start = time.perf_counter()
+        for batch, response in zip(batches, responses):
+            verifier = MappingVerifier(f"batches/{batch['batch_id']}.json", "story.json")
+            verifier.story_data
+            verifier.generate_report(verifier.parse_markdown_table(response), response)
+        reload_cost = (time.perf_counter() - start) / len(batches)
+
+        start = time.perf_counter()
+        index = StoryIndex.load("story.json")
+        build_cost = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for batch, response in zip(batches, responses):
+            verifier = MappingVerifier(batch_data=batch, story_index=index)
+            verifier.generate_report(verifier.parse_markdown_table(response), response)
+        shared_cost = (time.perf_counter() - start) / len(batches)
+
+        print(f"{len(index):>12} {reload_cost * 1000:>16.2f}ms {shared_cost * 1000:>11.2f}ms "
+              f"{build_cost * 1000:>10.1f}ms")
+
+
+def bench_dispatch(args):
+    """Peak memory of rendering every batch up front vs. streaming descriptors, as the story grows"""
+    with quiet():
+        prepare_workspace(args.story, args.batch_size)
+    with open("story.json", 'r', encoding='utf-8') as f:
+        base_story = json.load(f)
+    scales = [int(n) for n in args.scales.split(',')]
+
+    print(f"\nPeak dispatcher memory ({args.batch_size} units per batch)")
+    print(f"{'Story units':>12} {'Batches':>8} {'create_batches':>15} {'iter_batches':>13}")
+    for scale in scales:
+        index = StoryIndex(synthetic_story(base_story, scale))
+
+        tracemalloc.start()
+        dispatcher = ChunkDispatcher("story.json", args.batch_size, story_index=index)
+        batches = dispatcher.create_batches()
+        _, eager_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del batches, dispatcher
+
+        tracemalloc.start()
+        dispatcher = ChunkDispatcher("story.json", args.batch_size, story_index=index)
+        total = dispatcher.count_batches()
+        for descriptor in dispatcher.iter_batches():
+            dispatcher.render_batch(descriptor)
+        _, lazy_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"{len(index):>12} {total:>8} {eager_peak / 2**20:>13.2f}MB {lazy_peak / 2**20:>11.2f}MB")
+
+
+def single_message_layout(batch: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Previous request layout: one user message with the analysis requirements after the units"""
+    content = f"You are an expert literary analyst. {MAPPING_INSTRUCTIONS}\n\n{batch['prompt']}\n\n{ANALYSIS_REQUIREMENTS}"
+    return [{'role': 'user', 'content': content}]
+
+
+def bench_prefix_cache(args):
+    """Ollama prompt evaluation per call: single user message vs. stable system prompt prefix"""
+    import ollama
+
+    with quiet():
+        batches = prepare_workspace(args.story, args.batch_size)[:args.batches]
+    orchestrator = MappingOrchestrator(use_mock_llm=True, model_name=args.model)
+    layouts = [
+        ("single message", single_message_layout),
+        ("system prefix", orchestrator.build_llm_messages)
+    ]
+
+    print(f"\nPrompt evaluation on {args.model} ({len(batches)} batches, keep_alive={args.keep_alive})")
+    print(f"{'Layout':>15} {'Tokens/call':>12} {'Eval ms/call':>13} {'First call ms':>14}")
+    for name, build_messages in layouts:
+        counts, durations = [], []
+        for batch in batches:
+            try:
+                response = ollama.chat(
+                    model=args.model,
+                    messages=build_messages(batch),
+                    options={**orchestrator.llm_options, 'num_predict': 1},
+                    keep_alive=args.keep_alive
+                )
+            except Exception as e:
+                print(f"Error calling Ollama: {e}")
+                sys.exit(1)
+            counts.append(response.get('prompt_eval_count') or 0)
+            durations.append((response.get('prompt_eval_duration') or 0) / 1e6)
+
+        # The first call of each layout pays for the shared prefix; the rest show the reuse
+        steady = slice(1, None) if len(batches) > 1 else slice(None)
+        print(f"{name:>15} {sum(counts[steady]) / len(counts[steady]):>12.0f} "
+              f"{sum(durations[steady]) / len(durations[steady]):>13.1f} {durations[0]:>14.1f}")
+
+
+def bench_uid_aliases(args):
+    """Prompt and response size with full UIDs vs. per-batch aliases, plus live acceptance if a model is given"""
+    with quiet():
+        prepare_workspace(args.story, args.batch_size)
+    index = StoryIndex.load("story.json")
+
+    rows = []
+    for prompt_mode in ("echo", "uid"):
+        for uid_aliases in (False, True):
+            with quiet():
+                orchestrator = MappingOrchestrator(use_mock_llm=args.model is None, model_name=args.model or "mock",
+                                                   use_cache=False, repair_retries=0, story_index=index,
+                                                   prompt_mode=prompt_mode, uid_aliases=uid_aliases)
+                batches = orchestrator.create_dispatcher().create_batches()
+            prompt_tokens = sum(batch['estimated_prompt_tokens'] for batch in batches)
+            output_tokens = sum(batch['estimated_output_tokens'] for batch in batches)
+
+            live = None
+            if args.model:
+                with quiet():
+                    results = orchestrator.process_batches(batches)
+                metrics = orchestrator.metrics.summary()
+                accepted = sum(1 for result in results
+                               if result and result['verification']['recommendation'].startswith('ACCEPT'))
+                live = (metrics['tokens']['prompt'] / len(batches), metrics['tokens']['generated'] / len(batches),
+                        accepted / len(batches) * 100)
+            rows.append((prompt_mode, uid_aliases, len(batches), prompt_tokens, output_tokens, live))
+
+    print(f"\nUID encoding ({args.batch_size} units per batch; estimates use the dispatcher's token accounting)")
+    print(f"{'Prompt mode':>11} {'UIDs':>8} {'Est. prompt tok':>16} {'Est. output tok':>16}"
+          + (f" {'Prompt tok':>11} {'Output tok':>11} {'Accepted':>9}" if args.model else ""))
+    for prompt_mode, uid_aliases, count, prompt_tokens, output_tokens, live in rows:
+        line = (f"{prompt_mode:>11} {'aliases' if uid_aliases else 'full':>8} "
+                f"{prompt_tokens / count:>16.0f} {output_tokens / count:>16.0f}")
+        if live:
+            line += f" {live[0]:>11.0f} {live[1]:>11.0f} {live[2]:>8.0f}%"
+        print(line)
+    if not args.model:
+        print("Pass --model to measure real per-batch tokens and first-pass acceptance on Ollama")
+
+
+def multi_pass_split(text: str) -> List[str]:
+    """Previous sentence splitter: three abbreviation passes, a lookbehind split and a restore pass"""
+    text = re.sub(r'\b(Dr|Mr|Mrs|Ms|Prof|Sr|Jr)\.\s*', r'\1<PERIOD> ', text)
+    text = re.sub(r'\b(Inc|Ltd|Corp|Co)\.\s*', r'\1<PERIOD> ', text)
+    text = re.sub(r'\b(etc|vs|e\.g|i\.e)\.\s*', r'\1<PERIOD> ', text)
+    sentences = re.split(r'(?<=[.!?])\s+(?=[A-Z])', text)
+    sentences = [s.replace('<PERIOD>', '.') for s in sentences]
+    return [s.strip() for s in sentences if s.strip()]
+
+
+def regex_clean(text: str) -> str:
+    """Previous unit cleaning: a whitespace regex per unit"""
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def bench_segmenter(args):
+    """Units per second of the multi-pass sentence splitter vs. the single-pass segmenter"""
+    text = Path(args.story).read_text(encoding='utf-8')
+    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+    copies = max(1, int(args.megabytes * 2**20 / len(text.encode('utf-8'))) + 1)
+    corpus = paragraphs * copies
+    size = sum(len(p.encode('utf-8')) for p in corpus) / 2**20
+
+    segmenter = SentenceSegmenter(ABBREVIATIONS["en"])
+    splitters = [
+        ("multi-pass", multi_pass_split, regex_clean),
+        ("single-pass", segmenter.split, lambda unit: ' '.join(unit.split()))
+    ]
+
+    print(f"\nSentence segmentation of a {size:.1f} MB synthetic corpus ({len(corpus)} paragraphs)")
+    print(f"{'Splitter':>12} {'Units':>9} {'Seconds':>8} {'Units/sec':>11}")
+    outputs = []
+    for name, split, clean in splitters:
+        start = time.perf_counter()
+        units = [clean(sentence) for paragraph in corpus for sentence in split(paragraph)]
+        elapsed = time.perf_counter() - start
+        outputs.append(units)
+        print(f"{name:>12} {len(units):>9} {elapsed:>8.2f} {len(units) / elapsed:>11.0f}")
+
+    if outputs[0] != outputs[1]:
+        print("✗ Splitters disagree on the corpus")
+        sys.exit(1)
+    print("✓ Identical units from both splitters")
+
+
+def bench_corpus(args):
+    """Wall time of a parallel ingest of one large story as the number of worker processes grows"""
+    text = Path(args.story).read_text(encoding='utf-8')
+    copies = max(1, int(args.megabytes * 2**20 / len(text.encode('utf-8'))) + 1)
+    with open("corpus.txt", 'w', encoding='utf-8') as f:
+        for _ in range(copies):
+            f.write(text.rstrip('\n') + "\n\n")
+    size = Path("corpus.txt").stat().st_size / 2**20
+    levels = [int(n) for n in args.levels.split(',')]
+
+    timings = []
+    outputs = set()
+    for level in levels:
+        ingestor = CorpusIngestor(["corpus.txt"], workers=level, segment_mb=args.segment_mb)
+        output = f"corpus_{level}.jsonl"
+        start = time.perf_counter()
+        with quiet():
+            ingestor.save(output)
+        timings.append((level, time.perf_counter() - start, ingestor.uid_count))
+        with open(output, 'rb') as f:
+            # Everything but the trailing metadata line must match across worker counts
+            outputs.add(hash(f.read().rsplit(b'\n', 2)[0]))
+
+    baseline = timings[0][1]
+    print(f"\nCorpus ingest of a {size:.1f} MB story ({os.cpu_count()} CPUs, {args.segment_mb:g} MB segments)")
+    print(f"{'Workers':>8} {'Units':>9} {'Seconds':>8} {'Speedup':>8} {'Efficiency':>11}")
+    for level, elapsed, units in timings:
+        speedup = baseline / elapsed
+        print(f"{level:>8} {units:>9} {elapsed:>8.2f} {speedup:>7.2f}x {speedup / level * levels[0]:>10.0%}")
+
+    if len(outputs) != 1:
+        print("✗ Output differs between worker counts")
+        sys.exit(1)
+    print("✓ Identical unit stream for every worker count")
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process in MB"""
+    try:
+        # VmHWM starts afresh with every exec; ru_maxrss may carry over the parent's peak
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def store_pass(story_json: str, batch_size: int, verify_every: int) -> Dict[str, Any]:
+    """
+    Load the index, render every batch and verify a sample of them (runs in a fresh process)
+
+    Returns the process's peak RSS, the wall time and the bytes the batch
+    files would take on disk.
+    """
+    start = time.perf_counter()
+    batch_bytes = 0
+    with quiet():
+        index = StoryIndex.load(story_json)
+        dispatcher = ChunkDispatcher(story_json, batch_size, story_index=index)
+        orchestrator = MappingOrchestrator(use_mock_llm=True, story_index=index)
+        for descriptor in dispatcher.iter_batches():
+            batch = dispatcher.render_batch(descriptor)
+            batch_bytes += len(json.dumps(batch, indent=2, ensure_ascii=False).encode('utf-8'))
+            if descriptor['batch_index'] % verify_every == 0:
+                response = orchestrator.mock_llm_process(batch)
+                verifier = MappingVerifier(batch_data=batch, story_index=index)
+                verifier.generate_report(verifier.parse_markdown_table(response), response)
+    return {
+        "rss_mb": peak_rss_mb(),
+        "seconds": time.perf_counter() - start,
+        "batch_bytes": batch_bytes
+    }
+
+
+def bench_story_store(args):
+    """Disk footprint and peak RSS of a large story with inline unit texts vs. a memory-mapped text store"""
+    with quiet():
+        prepare_workspace(args.story, args.batch_size)
+    with open("story.json", 'r', encoding='utf-8') as f:
+        base_story = json.load(f)
+    copies = -(-args.units // len(base_story['data']))
+    story = synthetic_story(base_story, copies)
+    story['data'] = story['data'][:args.units]
+    os.makedirs("inline", exist_ok=True)
+    with open("inline/story.json", 'w', encoding='utf-8') as f:
+        json.dump(story, f, indent=2, ensure_ascii=False)
+    del story, base_story
+    os.makedirs("store", exist_ok=True)
+    shutil.copy("inline/story.json", "store/story.json")
+    StoryStore.pack("store/story.json")
+
+    # A fresh spawned process per layout, so each peak RSS starts from a clean interpreter
+    results = {}
+    for layout in ("inline", "store"):
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results[layout] = pool.submit(store_pass, f"{layout}/story.json", args.batch_size,
+                                          args.verify_every).result()
+
+    sizes = {
+        "inline": {"story.json": Path("inline/story.json").stat().st_size, "story.text": 0},
+        "store": {"story.json": Path("store/story.json").stat().st_size,
+                  "story.text": Path("store/story.text").stat().st_size}
+    }
+    print(f"\nStory store for {args.units} units ({args.batch_size} units per batch, "
+          f"every {args.verify_every}th batch verified)")
+    print(f"{'Layout':>8} {'story.json':>11} {'story.text':>11} {'Batch files':>12} {'Total':>9} "
+          f"{'Peak RSS':>9} {'Seconds':>8}")
+    for layout, result in results.items():
+        files = sizes[layout]
+        total = files["story.json"] + files["story.text"] + result["batch_bytes"]
+        print(f"{layout:>8} {files['story.json'] / 2**20:>9.1f}MB {files['story.text'] / 2**20:>9.1f}MB "
+              f"{result['batch_bytes'] / 2**20:>10.1f}MB {total / 2**20:>7.1f}MB "
+              f"{result['rss_mb']:>7.0f}MB {result['seconds']:>8.1f}")
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Zero-Loss Mapping pipeline benchmarks")
+    parser.add_argument("--story", default=DEFAULT_STORY, help="Path to story file")
+    parser.add_argument("--batch-size", type=int, default=15, help="Sentences per batch")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    concurrency = subparsers.add_parser("concurrency", help="Batch throughput vs. --concurrency")
+    concurrency.add_argument("--levels", default="1,2,4,8", help="Comma-separated concurrency levels")
+    concurrency.add_argument("--latency", type=float, default=0.2, help="Simulated seconds per LLM call")
+    concurrency.set_defaults(func=bench_concurrency)
+
+    story_index = subparsers.add_parser("story-index", help="Verification cost vs. story length")
+    story_index.add_argument("--scales", default="1,4,16,64", help="Comma-separated story size multipliers")
+    story_index.add_argument("--batches", type=int, default=10, help="Batches verified per measurement")
+    story_index.set_defaults(func=bench_story_index)
+
+    dispatch = subparsers.add_parser("dispatch", help="Dispatcher memory vs. story length")
+    dispatch.add_argument("--scales", default="1,10,100", help="Comma-separated story size multipliers")
+    dispatch.set_defaults(func=bench_dispatch)
+
+    prefix_cache = subparsers.add_parser("prefix-cache", help="Ollama prompt eval with and without the shared system prefix")
+    prefix_cache.add_argument("--model", default="qwen2.5:72b", help="Ollama model to measure")
+    prefix_cache.add_argument("--batches", type=int, default=8, help="Batches sent per layout")
+    prefix_cache.add_argument("--keep-alive", default="30m", help="Ollama keep_alive for the measured calls")
+    prefix_cache.set_defaults(func=bench_prefix_cache)
+
+    uid_aliases = subparsers.add_parser("uid-aliases", help="Token cost of full UIDs vs. per-batch aliases")
+    uid_aliases.add_argument("--model", default=None, help="Ollama model for live token counts and acceptance rate")
+    uid_aliases.set_defaults(func=bench_uid_aliases)
+
+    segmenter = subparsers.add_parser("segmenter", help="Sentence splitting throughput, multi-pass vs. single-pass")
+    segmenter.add_argument("--megabytes", type=float, default=8.0, help="Size of the synthetic corpus")
+    segmenter.set_defaults(func=bench_segmenter)
+
+    corpus = subparsers.add_parser("corpus", help="Parallel ingest wall time vs. worker processes")
+    corpus.add_argument("--megabytes", type=float, default=32.0, help="Size of the synthetic story")
+    corpus.add_argument("--levels", default="1,2,4,8", help="Comma-separated worker counts to compare")
+    corpus.add_argument("--segment-mb", type=float, default=4.0, help="Segment size the story is split into")
+    corpus.set_defaults(func=bench_corpus)
+
+    story_store = subparsers.add_parser("story-store", help="Disk and memory of inline unit texts vs. the text store")
+    story_store.add_argument("--units", type=int, default=1000000, help="Units in the synthetic story")
+    story_store.add_argument("--verify-every", type=int, default=100, help="Verify one batch in this many")
+    story_store.set_defaults(func=bench_story_store)
+
+    args = parser.parse_args()
+    args.story = str(Path(args.story).resolve())
+
+    if not Path(args.story).exists():
+        print(f"Error: Story file '{args.story}' not found!")
+        sys.exit(1)
+
+    # The pipeline reads and writes relative to the working directory
+    with tempfile.TemporaryDirectory(prefix="narrative-bench-") as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            args.func(args)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
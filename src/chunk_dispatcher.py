@@ -7,86 +7,314 @@ Batches sentences into manageable chunks for LLM processing
 import json
 import os
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Set, Tuple
 from datetime import datetime
 
+from story_index import StoryIndex
+
+# Rough token accounting (~1.5 tokens per word) used to size batches
+TOKENS_PER_WORD = 1.5
+UID_TOKENS = 8                  # a UID such as CH03-P117-S004 plus separators
+ALIAS_TOKENS = 2                # a per-batch alias such as 12 plus separators
+ROW_ANNOTATION_TOKENS = 45      # purpose, characters, locations, items and links of one row
+PROMPT_OVERHEAD_TOKENS = 700    # instruction template and table header, when the caller doesn't measure its own
+CONTEXT_SAFETY_MARGIN = 0.9     # share of the context window the packer is allowed to fill
+DEFAULT_CONTEXT_SIZE = 8192     # context window "tokens" packing assumes when none is given
+
+# Column descriptions given to the model, in table order
+COLUMN_GUIDE = [
+    ("UID", "The unique identifier (copy exactly)"),
+    ("Raw Sentence", "The original text (copy exactly, no changes)"),
+    ("Narrative Purpose", "Brief description of what this text accomplishes in the story"),
+    ("Characters", "Main characters mentioned (comma-separated)"),
+    ("Locations", "Locations mentioned (comma-separated)"),
+    ("Key Items/Concepts", "Important items, abilities, or concepts (comma-separated)"),
+    ("Links", "Related UIDs this connects to (comma-separated, can be empty)")
+]
+
+
+def mapping_instructions(output_format: str = "markdown", echo_text: bool = True) -> str:
+    """
+    Static instructions shared by every batch
+    
+    They are kept byte-identical across requests so the model server can reuse
+    the evaluated prefix instead of re-reading it per request.
+    
+    Args:
+        output_format: "markdown" table or "json" row objects
+        echo_text: Ask the model to copy each sentence into a Raw Sentence column
+    """
+    row_kind = "row object" if output_format == "json" else "Markdown table row"
+    columns = [(name, text) for name, text in COLUMN_GUIDE if echo_text or name != "Raw Sentence"]
+    rules = ["You MUST include EVERY UID listed - no omissions"]
+    if echo_text:
+        rules.append("Copy the Raw Sentence text EXACTLY as provided")
+    rules += [
+        "Do NOT merge, paraphrase, or skip any entries",
+        "Each UID gets exactly ONE row",
+        'Use "N/A" for empty fields rather than leaving blank'
+    ]
+    
+    lines = [
+        "You are the Mapping Agent for a story analysis system.",
+        "",
+        f"For each UID in the user's list, produce **one {row_kind}** with these columns:"
+    ]
+    lines += [f"- {name}: {text}" for name, text in columns]
+    lines += ["", "CRITICAL RULES:"]
+    lines += [f"{number}. {rule}" for number, rule in enumerate(rules, 1)]
+    lines.append("")
+    
+    if output_format == "json":
+        lines += [
+            'Respond with a JSON object {"rows": [...]} holding one object per UID, in the order',
+            "listed, whose keys are exactly the column names above and whose values are strings."
+        ]
+    else:
+        names = [name for name, _ in columns]
+        lines += [
+            "Start your response with the table header:",
+            "| " + " | ".join(names) + " |",
+            "|" + "|".join("-" * (len(name) + 2) for name in names) + "|"
+        ]
+    return "\n".join(lines)
+
+
+MAPPING_INSTRUCTIONS = mapping_instructions("markdown")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a piece of text"""
+    return int(len(text.split()) * TOKENS_PER_WORD + 0.5)
+
+
+def prompt_overhead_tokens(system_prompt: str) -> int:
+    """Estimated tokens every batch request spends outside its units: the system prompt and the prompt framing"""
+    return estimate_tokens(system_prompt) + estimate_tokens(ChunkDispatcher.generate_prompt([]))
+
+
+def unit_token_cost(unit: Dict[str, Any], echo_text: bool = True,
+                    uid_tokens: int = UID_TOKENS) -> Tuple[int, int]:
+    """Estimated (prompt tokens, output tokens) one unit adds to a batch"""
+    if 'text' in unit:
+        text_tokens = estimate_tokens(unit['text'])
+    else:
+        # Units of a text store carry no text; the ingest's word count gives the same estimate
+        text_tokens = int(unit['metadata']['word_count'] * TOKENS_PER_WORD + 0.5)
+    prompt_tokens = uid_tokens + text_tokens
+    # The row echoes the UID (and, unless annotating by UID, the sentence), then adds the annotations
+    output_tokens = uid_tokens + (text_tokens if echo_text else 0) + ROW_ANNOTATION_TOKENS
+    return prompt_tokens, output_tokens
+
+
+def batch_aliases(units: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Short per-batch aliases ("1", "2", ...) for the units' UIDs, as alias -> UID"""
+    return {str(position): unit['uid'] for position, unit in enumerate(units, 1)}
+
 
 class ChunkDispatcher:
-    def __init__(self, story_json_path: str, batch_size: int = 10):
+    def __init__(self,
+                 story_json_path: str,
+                 batch_size: int = 10,
+                 story_index: Optional[StoryIndex] = None,
+                 pack_mode: str = "units",
+                 context_size: int = DEFAULT_CONTEXT_SIZE,
+                 max_batch_units: int = 60,
+                 respect_chapters: bool = False,
+                 echo_text: bool = True,
+                 uid_aliases: bool = False,
+                 changed_uids: Optional[Set[str]] = None,
+                 prompt_overhead: int = PROMPT_OVERHEAD_TOKENS):
         """
         Initialize dispatcher with story data and batch size
         
         Args:
             story_json_path: Path to the story.json file
-            batch_size: Number of sentences per batch (default 10)
+            batch_size: Number of sentences per batch (default 10) in "units" pack mode
+            story_index: Shared index over story.json; loaded from story_json_path if omitted
+            pack_mode: "units" cuts fixed-size batches; "tokens" fills batches up to token budgets
+            context_size: Model context window (tokens) the "tokens" budgets are derived from
+            max_batch_units: Upper bound on units per batch in "tokens" pack mode
+            respect_chapters: Never let a batch span two chapters
+            echo_text: Responses echo each sentence (False for annotate-by-UID prompts)
+            uid_aliases: Label units in prompts with short per-batch aliases instead of full UIDs
+            changed_uids: Added and modified UIDs of an incremental ingest; batches are then
+                flagged with whether they touch the change set
+            prompt_overhead: Tokens each request spends outside its units (see prompt_overhead_tokens())
         """
+        if pack_mode not in ("units", "tokens"):
+            raise ValueError(f"Unknown pack mode: {pack_mode}")
+        
         self.story_json_path = Path(story_json_path)
         self.batch_size = batch_size
-        self.story_data = self._load_story_data()
+        self.story_index = story_index or StoryIndex.load(str(self.story_json_path))
+        self.story_data = self.story_index.story_data
+        self.pack_mode = pack_mode
+        self.context_size = context_size
+        self.max_batch_units = max_batch_units
+        self.respect_chapters = respect_chapters
+        self.echo_text = echo_text
+        self.uid_aliases = uid_aliases
+        self.changed_uids = changed_uids
+        self.uid_tokens = ALIAS_TOKENS if uid_aliases else UID_TOKENS
+        self.prompt_overhead = prompt_overhead
+        self.prompt_token_budget, self.output_token_budget = self.token_budgets(context_size, prompt_overhead)
         self.batches = []
+        self.total_batches: Optional[int] = None
+    
+    @staticmethod
+    def token_budgets(context_size: int, prompt_overhead: int = PROMPT_OVERHEAD_TOKENS) -> Tuple[int, int]:
+        """
+        Split a context window into (prompt, output) token budgets for batch units
         
-    def _load_story_data(self) -> Dict[str, Any]:
-        """Load the story data from JSON"""
-        with open(self.story_json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        Prompt and response share the window, and every unit costs a little
+        more to answer than to ask, so output gets the larger share.
+        """
+        usable = int(context_size * CONTEXT_SAFETY_MARGIN) - prompt_overhead
+        if usable <= 0:
+            raise ValueError(f"Context size {context_size} is too small for the prompt template")
+        prompt_budget = usable * 2 // 5
+        return prompt_budget, usable - prompt_budget
     
-    def create_batches(self) -> List[Dict[str, Any]]:
-        """Create batches of sentences for processing"""
+    def _unit_count_ranges(self, units: List[Dict[str, Any]]) -> Iterator[Tuple[int, int]]:
+        """[start, end) ranges of at most batch_size units"""
+        start = 0
+        while start < len(units):
+            end = min(start + self.batch_size, len(units))
+            if self.respect_chapters:
+                chapter = StoryIndex.chapter_key(units[start])
+                chapter_end = self.story_index.chapter_ranges.get(chapter, (start, end))[1]
+                end = min(end, chapter_end)
+            yield start, end
+            start = end
+    
+    def _token_budget_ranges(self, units: List[Dict[str, Any]],
+                             warn: bool = False) -> Iterator[Tuple[int, int]]:
+        """[start, end) ranges filled greedily up to the prompt and output token budgets"""
+        start = 0
+        prompt_tokens = output_tokens = 0
+        for i, unit in enumerate(units):
+            unit_prompt, unit_output = unit_token_cost(unit, self.echo_text, self.uid_tokens)
+            
+            starts_new_chapter = (self.respect_chapters and i > start
+                                  and StoryIndex.chapter_key(unit) != StoryIndex.chapter_key(units[i - 1]))
+            over_budget = (prompt_tokens + unit_prompt > self.prompt_token_budget
+                           or output_tokens + unit_output > self.output_token_budget)
+            full = i - start >= self.max_batch_units
+            
+            if i > start and (starts_new_chapter or over_budget or full):
+                yield start, i
+                start = i
+                prompt_tokens = output_tokens = 0
+            
+            if warn and (unit_prompt > self.prompt_token_budget or unit_output > self.output_token_budget):
+                print(f"⚠ {unit['uid']} alone exceeds the batch token budget (~{unit_output} output tokens)")
+            prompt_tokens += unit_prompt
+            output_tokens += unit_output
+        
+        if start < len(units):
+            yield start, len(units)
+    
+    def _ranges(self, warn: bool = False) -> Iterator[Tuple[int, int]]:
         units = self.story_data['data']
+        if self.pack_mode == "tokens":
+            return self._token_budget_ranges(units, warn)
+        return self._unit_count_ranges(units)
+    
+    def count_batches(self) -> int:
+        """Number of batches the story splits into (one pass over the units, nothing rendered)"""
+        if self.total_batches is None:
+            self.total_batches = sum(1 for _ in self._ranges(warn=True))
+        return self.total_batches
+    
+    def iter_batches(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yield lightweight batch descriptors in story order
         
-        # Create batches
-        for i in range(0, len(units), self.batch_size):
-            batch_units = units[i:i + self.batch_size]
-            
-            batch = {
-                "batch_id": f"BATCH_{i//self.batch_size + 1:04d}",
-                "batch_index": i // self.batch_size + 1,
-                "total_batches": (len(units) + self.batch_size - 1) // self.batch_size,
-                "units_count": len(batch_units),
-                "units": batch_units,
-                "created_at": datetime.now().isoformat(),
-                "status": "pending",
-                "prompt": self._generate_prompt(batch_units)
+        A descriptor holds only the batch ID and its [start, end) unit range;
+        render_batch() turns it into a full batch when a worker picks it up.
+        """
+        for batch_index, (start, end) in enumerate(self._ranges(), 1):
+            descriptor = {
+                "batch_id": f"BATCH_{batch_index:04d}",
+                "batch_index": batch_index,
+                "start": start,
+                "end": end,
+                "units_count": end - start,
+                "status": "pending"
             }
-            
-            self.batches.append(batch)
+            if self.changed_uids is not None:
+                descriptor["touches_changes"] = self.touches_changes(start, end)
+            yield descriptor
+    
+    def touches_changes(self, start: int, end: int) -> bool:
+        """Whether any unit in [start, end) was added or modified by the last incremental ingest"""
+        return any(unit['uid'] in self.changed_uids for unit in self.story_data['data'][start:end])
+    
+    def render_batch(self, descriptor: Dict[str, Any], output_dir: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Materialize a batch descriptor with its units and prompt
+        
+        Args:
+            descriptor: Descriptor yielded by iter_batches()
+            output_dir: If given, also write the rendered batch file there
+        """
+        batch_units = self.story_data['data'][descriptor['start']:descriptor['end']]
+        costs = [unit_token_cost(unit, self.echo_text, self.uid_tokens) for unit in batch_units]
+        
+        batch = {
+            "batch_id": descriptor['batch_id'],
+            "batch_index": descriptor['batch_index'],
+            "total_batches": self.count_batches(),
+            "units_count": len(batch_units),
+            "units": batch_units,
+            "estimated_prompt_tokens": self.prompt_overhead + sum(p for p, _ in costs),
+            "estimated_output_tokens": sum(o for _, o in costs),
+            "created_at": datetime.now().isoformat(),
+            "status": "pending",
+            "prompt": self.generate_prompt(batch_units, self.uid_aliases,
+                                           [self.story_index.unit_text(unit) for unit in batch_units],
+                                           self.echo_text)
+        }
+        if "touches_changes" in descriptor:
+            batch["touches_changes"] = descriptor["touches_changes"]
+        if self.uid_aliases:
+            # Stored with the batch so responses can be mapped back to real UIDs
+            batch["uid_aliases"] = batch_aliases(batch_units)
         
+        if output_dir:
+            self.save_batch(batch, output_dir)
+        return batch
+    
+    def create_batches(self) -> List[Dict[str, Any]]:
+        """Create and render every batch up front"""
+        self.batches = [self.render_batch(descriptor) for descriptor in self.iter_batches()]
         return self.batches
     
-    def _generate_prompt(self, units: List[Dict[str, Any]]) -> str:
-        """Generate the LLM prompt for a batch of units"""
-        prompt = """You are the Mapping Agent for a story analysis system.
-
-For each UID below, produce **one Markdown table row** with these columns:
-- UID: The unique identifier (copy exactly)
-- Raw Sentence: The original text (copy exactly, no changes)
-- Narrative Purpose: Brief description of what this text accomplishes in the story
-- Characters: Main characters mentioned (comma-separated)
-- Locations: Locations mentioned (comma-separated)
-- Key Items/Concepts: Important items, abilities, or concepts (comma-separated)
-- Links: Related UIDs this connects to (comma-separated, can be empty)
-
-CRITICAL RULES:
-1. You MUST include EVERY UID listed below - no omissions
-2. Copy the Raw Sentence text EXACTLY as provided
-3. Do NOT merge, paraphrase, or skip any entries
-4. Each UID gets exactly ONE row
-5. Use "N/A" for empty fields rather than leaving blank
-
-Start your response with the table header:
-| UID | Raw Sentence | Narrative Purpose | Characters | Locations | Key Items/Concepts | Links |
-|-----|--------------|-------------------|------------|-----------|-------------------|-------|
-
-UID List and Sentences:
-"""
+    @staticmethod
+    def generate_prompt(units: List[Dict[str, Any]], use_aliases: bool = False,
+                        texts: Optional[List[str]] = None, echo_text: bool = True) -> str:
+        """
+        Generate the per-batch part of the LLM prompt: the units to annotate
+        
+        The instructions come from mapping_instructions() and are sent separately
+        as a system message, so every request starts with the same prefix.
+        With use_aliases, units are labelled by their batch_aliases() instead of UIDs.
+        texts gives the units' text when they carry none (see StoryIndex.unit_text).
+        Without echo_text the reminder leaves out copying, as the rows carry no text.
+        """
+        parts = ["UID List and Sentences:\n"]
+        if texts is None:
+            texts = [unit['text'] for unit in units]
         
         # Add each unit to the prompt
-        for unit in units:
-            prompt += f"\n{unit['uid']}: {unit['text']}"
+        labels = batch_aliases(units) if use_aliases else [unit['uid'] for unit in units]
+        parts.extend(f"\n{label}: {text}" for label, text in zip(labels, texts))
         
-        prompt += "\n\nRemember: One row per UID, no omissions, exact text copying."
+        parts.append("\n\nRemember: One row per UID, no omissions, exact text copying." if echo_text
+                     else "\n\nRemember: One row per UID, no omissions.")
         
-        return prompt
+        return "".join(parts)
     
     def save_batch(self, batch: Dict[str, Any], output_dir: str = "batches"):
         """Save a single batch to file"""
@@ -99,55 +327,87 @@ UID List and Sentences:
     
     def save_all_batches(self, output_dir: str = "batches"):
         """Save all batches to files"""
-        output_path = Path(output_dir)
-        output_path.mkdir(exist_ok=True)
-        
         # Save individual batch files
         for batch in self.batches:
             self.save_batch(batch, output_dir)
         
-        # Save batch manifest
+        self.save_manifest(output_dir, self.batches)
+        print(f"✓ Saved to {output_dir}/")
+    
+    def save_manifest(self, output_dir: str = "batches",
+                      batches: Optional[Iterable[Dict[str, Any]]] = None) -> int:
+        """
+        Save the batch manifest without rendering any prompts
+        
+        Args:
+            output_dir: Directory for manifest.json
+            batches: Batches or descriptors to list; defaults to iter_batches()
+            
+        Returns:
+            Number of batches listed
+        """
+        output_path = Path(output_dir)
+        output_path.mkdir(exist_ok=True)
+        
+        entries = [
+            {
+                "batch_id": batch["batch_id"],
+                "units_count": batch["units_count"],
+                "status": batch["status"],
+                **({"touches_changes": batch["touches_changes"]} if "touches_changes" in batch else {})
+            }
+            for batch in (self.iter_batches() if batches is None else batches)
+        ]
         manifest = {
-            "total_batches": len(self.batches),
+            "total_batches": len(entries),
             "batch_size": self.batch_size,
+            "pack_mode": self.pack_mode,
             "total_units": len(self.story_data['data']),
             "created_at": datetime.now().isoformat(),
-            "batches": [
-                {
-                    "batch_id": batch["batch_id"],
-                    "units_count": batch["units_count"],
-                    "status": batch["status"]
-                }
-                for batch in self.batches
-            ]
+            "batches": entries
         }
         
         manifest_file = output_path / "manifest.json"
         with open(manifest_file, 'w', encoding='utf-8') as f:
             json.dump(manifest, f, indent=2)
         
-        print(f"✓ Created {len(self.batches)} batches")
-        print(f"✓ Saved to {output_dir}/")
+        print(f"✓ Created {len(entries)} batches")
+        return len(entries)
     
     def get_batch_prompt(self, batch_id: str) -> str:
         """Get the prompt for a specific batch"""
         for batch in self.batches:
             if batch["batch_id"] == batch_id:
                 return batch["prompt"]
+        for descriptor in self.iter_batches():
+            if descriptor["batch_id"] == batch_id:
+                return self.render_batch(descriptor)["prompt"]
         raise ValueError(f"Batch {batch_id} not found")
     
     def estimate_processing_stats(self):
         """Estimate processing statistics"""
-        total_units = len(self.story_data['data'])
-        total_batches = len(self.batches)
-        avg_words_per_unit = sum(u['metadata']['word_count'] for u in self.story_data['data']) / total_units
+        units = self.story_data['data']
+        total_units = len(units)
+        total_batches = self.count_batches()
+        avg_words_per_unit = sum(u['metadata']['word_count'] for u in units) / total_units
         
         print(f"\nProcessing Statistics:")
         print(f"- Total units to process: {total_units}")
-        print(f"- Batch size: {self.batch_size} units")
+        if self.pack_mode == "tokens":
+            print(f"- Packing: token budgets of {self.prompt_token_budget} prompt / "
+                  f"{self.output_token_budget} output tokens ({self.context_size}-token context)")
+            print(f"- Average units per batch: {total_units / max(total_batches, 1):.1f}")
+        else:
+            print(f"- Batch size: {self.batch_size} units")
         print(f"- Total batches: {total_batches}")
         print(f"- Average words per unit: {avg_words_per_unit:.1f}")
-        print(f"- Estimated tokens per batch: ~{self.batch_size * avg_words_per_unit * 1.5:.0f}")
+        if total_batches:
+            totals = [
+                self.prompt_overhead + sum(
+                    sum(unit_token_cost(unit, self.echo_text, self.uid_tokens)) for unit in units[start:end])
+                for start, end in self._ranges()
+            ]
+            print(f"- Estimated tokens per batch: ~{sum(totals) / len(totals):.0f} (max ~{max(totals)})")
 
 
 def main():
@@ -160,9 +420,10 @@ def main():
     # Create dispatcher
     dispatcher = ChunkDispatcher(story_file, batch_size)
     
-    # Create and save batches
-    dispatcher.create_batches()
-    dispatcher.save_all_batches(output_dir)
+    # Plan batches; prompts are rendered one at a time as each file is written
+    for descriptor in dispatcher.iter_batches():
+        dispatcher.render_batch(descriptor, output_dir)
+    dispatcher.save_manifest(output_dir)
     
     # Show statistics
     dispatcher.estimate_processing_stats()
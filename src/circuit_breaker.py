@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Circuit Breaker for Zero-Loss Mapping Workflow
+Stops calling an LLM backend that keeps failing, then probes it again after an exponentially growing cooldown
+"""
+
+import threading
+import time
+from typing import Dict, Any
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the LLM while the circuit is open"""
+
+
+class CircuitBreaker:
+    def __init__(self,
+                 failure_threshold: int = 3,
+                 cooldown: float = 5.0,
+                 max_cooldown: float = 300.0):
+        """
+        Initialize a closed breaker
+
+        Args:
+            failure_threshold: Consecutive failed calls that open the circuit
+            cooldown: Seconds the circuit stays open after its first trip
+            max_cooldown: Ceiling for the cooldown, which doubles each time a half-open probe fails
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.consecutive_trips = 0
+        self.opened_at = 0.0
+        self.current_cooldown = cooldown
+        self.probe_in_flight = False
+
+        self.stats = {
+            "trips": 0,
+            "rejected_calls": 0,
+            "probes": 0
+        }
+        self._lock = threading.Lock()
+
+    def before_call(self) -> bool:
+        """
+        Admit one call, or fail fast while the backend is considered down
+
+        After the cooldown a single probe call is let through (half-open);
+        every other call keeps failing fast until that probe reports back.
+        Returns whether the admitted call is that probe.
+
+        Raises:
+            CircuitOpenError: The circuit is open, or half-open with its probe outstanding
+        """
+        with self._lock:
+            if self.state == "closed":
+                return False
+
+            now = time.monotonic()
+            if self.state == "open" and now - self.opened_at >= self.current_cooldown:
+                self.state = "half_open"
+
+            if self.state == "half_open" and not self.probe_in_flight:
+                self.probe_in_flight = True
+                self.stats['probes'] += 1
+                return True
+
+            self.stats['rejected_calls'] += 1
+            retry_in = max(0.0, self.opened_at + self.current_cooldown - now)
+            raise CircuitOpenError(f"LLM circuit open after {self.consecutive_failures} consecutive failures "
+                                   f"(next probe in {retry_in:.1f}s)")
+
+    def record_success(self):
+        """A call succeeded: close the circuit and forget past trips"""
+        with self._lock:
+            if self.state != "closed":
+                print("✓ LLM backend answered again, circuit closed")
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self.consecutive_trips = 0
+            self.current_cooldown = self.cooldown
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        """A call failed: open the circuit at the threshold, or re-open it with a longer cooldown"""
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open":
+                self._trip()
+            elif self.state == "closed" and self.consecutive_failures >= self.failure_threshold:
+                self._trip()
+
+    def release_probe(self):
+        """
+        The half-open probe was cancelled before it said anything about the backend
+
+        The circuit goes back to open with its cooldown already served, so the
+        next call is admitted as a fresh probe instead of every call failing
+        fast behind a probe that will never report back.
+        """
+        with self._lock:
+            if self.state == "half_open" and self.probe_in_flight:
+                self.state = "open"
+                self.probe_in_flight = False
+
+    def _trip(self):
+        """Open the circuit, doubling the cooldown for every trip since it last closed (caller holds the lock)"""
+        self.current_cooldown = min(self.max_cooldown, self.cooldown * 2 ** self.consecutive_trips)
+        self.consecutive_trips += 1
+        self.stats['trips'] += 1
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.probe_in_flight = False
+        print(f"⚠ LLM circuit open after {self.consecutive_failures} consecutive failures; "
+              f"failing fast for {self.current_cooldown:.1f}s")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current breaker state for pipeline stats"""
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "cooldown_seconds": self.current_cooldown,
+                **self.stats
+            }
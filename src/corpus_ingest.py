@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Corpus Ingest for Zero-Loss Mapping Workflow
+Ingests many story files, or one huge file split at its chapter headers, across a process pool
+"""
+
+import argparse
+import io
+import json
+import mmap
+import os
+import re
+import shutil
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Sequence, Tuple
+
+from ingest import StoryIngestor, ABBREVIATIONS
+
+# Cheap pre-scan for split points: a newline followed by a chapter header. Every
+# match starts a header line to the sequential ingest too, so splitting a file
+# there never changes its units (a header after a lone \r is simply not a split
+# point). The leading literal newline lets the regex engine skip ahead quickly.
+HEADER_LINE = re.compile(rb'\nChapter [0-9]+:')
+
+# One ingest task: (book, path, start offset, end offset, chapters before it, language, output format)
+SegmentTask = Tuple[Optional[str], str, int, int, int, str, str]
+
+
+def corpus_files(inputs: Iterable[str]) -> List[Path]:
+    """Story files of a corpus in book order: files as given, directories as their sorted *.txt files"""
+    files = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            files.extend(sorted(path.glob("*.txt")))
+        else:
+            files.append(path)
+    return files
+
+
+def plan_segments(path: Path, target_bytes: int) -> List[Tuple[int, int]]:
+    """
+    Split a story file into [start, end) byte ranges of roughly target_bytes
+
+    Every range after the first starts at a chapter header line found by the
+    pre-scan, which reads the file through mmap without decoding it.
+    """
+    size = path.stat().st_size
+    if size <= target_bytes:
+        return [(0, size)]
+
+    bounds = [0]
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for match in HEADER_LINE.finditer(data):
+            line_start = match.start() + 1
+            if line_start - bounds[-1] >= target_bytes:
+                bounds.append(line_start)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def read_segment(path: str, start: int, end: int) -> io.TextIOWrapper:
+    """Lines of one byte range, decoded exactly as reading the whole file would"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return io.TextIOWrapper(io.BytesIO(data), encoding='utf-8')
+
+
+def count_chapters(task: SegmentTask) -> int:
+    """Chapters a segment adds (runs in a worker process)"""
+    _, path, start, end, *_ = task
+    return StoryIngestor.count_chapters(read_segment(path, start, end))
+
+
+def ingest_segment(task: SegmentTask) -> Tuple[str, int, int]:
+    """
+    Serialized units of one segment (runs in a worker process)
+
+    Returns the units as NDJSON lines, or as the indented entries of
+    story.json's "data" list, plus the segment's unit count and the number of
+    its book's last chapter.
+    """
+    book, path, start, end, first_chapter, language, output_format = task
+    ingestor = StoryIngestor(path, language=language, book=book)
+    units = ingestor.iter_units(read_segment(path, start, end), first_chapter)
+    if output_format == "jsonl":
+        text = "".join(json.dumps(unit, ensure_ascii=False) + "\n" for unit in units)
+    else:
+        # Same layout as json.dump(..., indent=2) gives the entries of "data"
+        text = ",\n".join("    " + json.dumps(unit, indent=2, ensure_ascii=False).replace("\n", "\n    ")
+                          for unit in units)
+    return text, ingestor.uid_count, ingestor.chapters
+
+
+def ordered_results(executor: Optional[Executor], fn: Callable, tasks: Sequence, window: int) -> Iterator:
+    """Results of fn over tasks in task order, with at most window tasks in flight"""
+    if executor is None:
+        yield from map(fn, tasks)
+        return
+    pending = deque()
+    for task in tasks:
+        pending.append(executor.submit(fn, task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class CorpusIngestor:
+    def __init__(self,
+                 inputs: Sequence[str],
+                 workers: Optional[int] = None,
+                 language: str = "en",
+                 segment_mb: float = 8.0,
+                 book_prefix: Optional[bool] = None):
+        """
+        Initialize a corpus ingest
+
+        Args:
+            inputs: Story files and directories of story files (their *.txt, sorted), in book order
+            workers: Worker processes (defaults to the number of CPUs; 1 ingests in this process)
+            language: Abbreviation table used when splitting sentences
+            segment_mb: Files larger than this are split at chapter headers into segments of about this size
+            book_prefix: Prefix UIDs with the book (B01-CH01-P001-S001); by default only when
+                there is more than one book, so a single file keeps the UIDs of a plain ingest
+        """
+        self.inputs = [str(item) for item in inputs]
+        self.files = corpus_files(self.inputs)
+        if not self.files:
+            raise ValueError(f"No story files found in {', '.join(self.inputs)}")
+
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.language = language
+        self.segment_bytes = max(1, int(segment_mb * 1024 * 1024))
+
+        use_prefix = len(self.files) > 1 if book_prefix is None else book_prefix
+        width = max(2, len(str(len(self.files))))
+        self.books = [(f"B{number:0{width}d}" if use_prefix else None, path)
+                      for number, path in enumerate(self.files, 1)]
+
+        self.uid_count = 0
+        self.book_stats: List[Dict[str, Any]] = []
+
+    def segments(self) -> List[Tuple[Optional[str], str, int, int]]:
+        """(book, path, start, end) of every segment in corpus order (whole files with a single worker)"""
+        if self.workers == 1:
+            return [(book, str(path), 0, path.stat().st_size) for book, path in self.books]
+        return [(book, str(path), start, end)
+                for book, path in self.books
+                for start, end in plan_segments(path, self.segment_bytes)]
+
+    def plan(self, segments: List[Tuple[Optional[str], str, int, int]], executor: Optional[Executor],
+             output_format: str) -> List[SegmentTask]:
+        """
+        Segment tasks in corpus order, with exact chapter offsets
+
+        Chapter numbers run on across the segments of a book, so every segment
+        followed by another of the same book first has its chapters counted
+        (in parallel); the counts give the chapter offset of the next segment.
+        """
+        counted = [i for i in range(len(segments) - 1) if segments[i + 1][2] > 0]
+        count_tasks = [(*segments[i], 0, self.language, output_format) for i in counted]
+        chapter_counts = dict(zip(counted, ordered_results(executor, count_chapters, count_tasks, len(count_tasks))))
+
+        tasks = []
+        first_chapter = 0
+        for i, (book, path, start, end) in enumerate(segments):
+            if start == 0:
+                first_chapter = 0
+            tasks.append((book, path, start, end, first_chapter, self.language, output_format))
+            first_chapter += chapter_counts.get(i, 0)
+        return tasks
+
+    def executor(self, tasks: int):
+        """Process pool for the segments, or none when they are ingested in this process"""
+        if self.workers == 1 or tasks <= 1:
+            return nullcontext()
+        return ProcessPoolExecutor(max_workers=min(self.workers, tasks))
+
+    def save(self, output_path: str = "story.json") -> int:
+        """
+        Ingest the corpus to story.json, or to NDJSON when output_path ends in .jsonl
+
+        Segments are ingested in parallel but written strictly in corpus order,
+        so the output is the same for any number of workers. Returns the number
+        of units written.
+        """
+        output_format = "jsonl" if Path(output_path).suffix == ".jsonl" else "json"
+        processing_date = str(Path(output_path).stat().st_mtime if Path(output_path).exists() else "new")
+        started = time.perf_counter()
+
+        segments = self.segments()
+        data_path = output_path if output_format == "jsonl" else output_path + ".data.tmp"
+        self.uid_count = 0
+        stats: Dict[Tuple[Optional[str], str], Dict[str, Any]] = {}
+
+        with self.executor(len(segments)) as executor:
+            tasks = self.plan(segments, executor, output_format)
+            with open(data_path, 'w', encoding='utf-8') as out:
+                written = False
+                results = ordered_results(executor, ingest_segment, tasks, 2 * self.workers)
+                for (book, path, *_), (text, units, chapters) in zip(tasks, results):
+                    if text:
+                        if written and output_format == "json":
+                            out.write(",\n")
+                        out.write(text)
+                        written = True
+                    self.uid_count += units
+                    book_stats = stats.setdefault((book, path), {"book": book, "source_file": path, "units": 0, "chapters": 0})
+                    book_stats["units"] += units
+                    book_stats["chapters"] = max(book_stats["chapters"], chapters)
+        self.book_stats = list(stats.values())
+
+        metadata = {
+            "total_units": self.uid_count,
+            "total_chapters": sum(book["chapters"] for book in self.book_stats),
+            "source_file": ", ".join(self.inputs) if len(self.files) > 1 else str(self.files[0]),
+            "processing_date": processing_date
+        }
+        if len(self.files) > 1:
+            metadata["books"] = self.book_stats
+
+        if output_format == "jsonl":
+            with open(output_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"metadata": metadata}, ensure_ascii=False) + "\n")
+        else:
+            self._assemble_json(output_path, data_path, metadata, written)
+
+        print(f"✓ Ingested {self.uid_count} text units from {len(self.files)} file(s) "
+              f"in {len(segments)} segment(s) with {min(self.workers, len(segments))} worker(s) "
+              f"({time.perf_counter() - started:.2f}s)")
+        print(f"✓ Saved to {output_path}")
+        return self.uid_count
+
+    @staticmethod
+    def _assemble_json(output_path: str, data_path: str, metadata: Dict[str, Any], has_units: bool):
+        """Write story.json byte-for-byte as json.dump(indent=2) would, with metadata ahead of the data"""
+        head = json.dumps({"metadata": metadata}, indent=2, ensure_ascii=False)[:-2]
+        with open(output_path, 'w', encoding='utf-8') as out:
+            if not has_units:
+                out.write(head + ',\n  "data": []\n}')
+            else:
+                out.write(head + ',\n  "data": [\n')
+                with open(data_path, 'r', encoding='utf-8') as data:
+                    shutil.copyfileobj(data, out, 1 << 20)
+                out.write('\n  ]\n}')
+        os.remove(data_path)
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Ingest a corpus of stories, or one huge story, in parallel")
+    parser.add_argument("inputs", nargs="+", help="Story files and/or directories of *.txt story files, in book order")
+    parser.add_argument("--output", default="story.json", help="Output file (.jsonl writes NDJSON)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--segment-mb", type=float, default=8.0,
+                        help="Split files larger than this at chapter headers into segments of about this size")
+    parser.add_argument("--language", choices=sorted(ABBREVIATIONS), default="en",
+                        help="Abbreviation table used when splitting sentences")
+    parser.add_argument("--book-prefix", action="store_true", default=None,
+                        help="Prefix UIDs with the book even for a single file")
+    args = parser.parse_args()
+
+    ingestor = CorpusIngestor(args.inputs, workers=args.workers, language=args.language,
+                              segment_mb=args.segment_mb, book_prefix=args.book_prefix)
+    ingestor.save(args.output)
+
+    if len(ingestor.book_stats) > 1:
+        print(f"\nCorpus Summary:")
+        for book in ingestor.book_stats:
+            print(f"- {book['book']}: {book['units']} units, {book['chapters']} chapters ({book['source_file']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Endpoint Pool for Zero-Loss Mapping Workflow
+Routes LLM calls across several Ollama servers with health probes and least-outstanding-requests balancing
+"""
+
+import json
+import threading
+import time
+import urllib.request
+from typing import Dict, Any, List, Optional
+
+import ollama
+
+
+class Endpoint:
+    def __init__(self, host: str, max_in_flight: int = 1, timeout: Optional[float] = None):
+        """
+        One Ollama server and its routing state
+
+        Args:
+            host: Base URL of the server, e.g. http://gpu-1:11434
+            max_in_flight: Requests this server may have outstanding at once
+            timeout: HTTP timeout in seconds for calls to this server (None waits forever)
+        """
+        self.host = host.rstrip('/')
+        self.client = ollama.Client(host=self.host, timeout=timeout)
+        self.max_in_flight = max(1, max_in_flight)
+        self.in_flight = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.stats = {
+            "requests": 0,
+            "failures": 0,
+            "ejections": 0,
+            "readmissions": 0,
+            "busy_seconds": 0.0,
+            "generated_tokens": 0
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Routing state and throughput of this server"""
+        busy = self.stats['busy_seconds']
+        return {
+            "host": self.host,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            **{k: (round(v, 3) if isinstance(v, float) else v) for k, v in self.stats.items()},
+            "tokens_per_second": round(self.stats['generated_tokens'] / busy, 2) if busy else None
+        }
+
+
+class EndpointPool:
+    def __init__(self,
+                 hosts: List[str],
+                 max_in_flight: int = 1,
+                 failure_threshold: int = 2,
+                 probe_interval: float = 10.0,
+                 probe_timeout: float = 3.0,
+                 acquire_timeout: Optional[float] = None,
+                 request_timeout: Optional[float] = None):
+        """
+        Initialize the pool
+
+        Args:
+            hosts: Ollama base URLs; "URL=N" gives that server its own in-flight limit
+            max_in_flight: Default in-flight limit for hosts without their own
+            failure_threshold: Consecutive failed calls after which a server is ejected
+            probe_interval: Seconds between health probes of every server
+            probe_timeout: Seconds a health probe may take before the server counts as down
+            acquire_timeout: Seconds to wait for a server to be readmitted when all are ejected
+                (defaults to two probe intervals)
+            request_timeout: HTTP timeout in seconds for LLM calls
+        """
+        if not hosts:
+            raise ValueError("EndpointPool needs at least one host")
+
+        self.endpoints: List[Endpoint] = []
+        for host in hosts:
+            host, _, limit = host.partition('=')
+            self.endpoints.append(Endpoint(host, int(limit) if limit else max_in_flight, request_timeout))
+
+        self.failure_threshold = max(1, failure_threshold)
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.acquire_timeout = acquire_timeout if acquire_timeout is not None else 2 * probe_interval
+        self._next = 0
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._prober: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the background health prober"""
+        if self._prober is None:
+            self._stop.clear()
+            self._prober = threading.Thread(target=self._probe_loop, name="endpoint-prober", daemon=True)
+            self._prober.start()
+
+    def close(self):
+        """Stop the background health prober"""
+        self._stop.set()
+        if self._prober is not None:
+            self._prober.join(timeout=self.probe_timeout + 1)
+            self._prober = None
+
+    def probe(self, endpoint: Endpoint) -> bool:
+        """Whether a server answers its version endpoint in time"""
+        try:
+            with urllib.request.urlopen(f"{endpoint.host}/api/version", timeout=self.probe_timeout) as response:
+                json.loads(response.read() or b"{}")
+                return response.status == 200
+        except Exception:
+            return False
+
+    def probe_all(self):
+        """Probe every server once, ejecting dead ones and readmitting recovered ones"""
+        for endpoint in self.endpoints:
+            alive = self.probe(endpoint)
+            with self._condition:
+                if alive and not endpoint.healthy:
+                    endpoint.healthy = True
+                    # On probation: one more failed call ejects it again
+                    endpoint.consecutive_failures = self.failure_threshold - 1
+                    endpoint.stats['readmissions'] += 1
+                    print(f"↻ Ollama endpoint {endpoint.host} is back, readmitted")
+                    self._condition.notify_all()
+                elif not alive and endpoint.healthy:
+                    self._eject(endpoint, "health probe failed")
+
+    def _probe_loop(self):
+        while not self._stop.wait(self.probe_interval):
+            self.probe_all()
+
+    def _eject(self, endpoint: Endpoint, reason: str):
+        """Stop routing to a server until a probe finds it healthy again (caller holds the lock)"""
+        endpoint.healthy = False
+        endpoint.stats['ejections'] += 1
+        print(f"⚠ Ollama endpoint {endpoint.host} ejected ({reason})")
+
+    def _pick(self) -> Optional[Endpoint]:
+        """Healthy server with spare capacity and the fewest outstanding requests"""
+        candidates = [e for e in self.endpoints if e.healthy and e.in_flight < e.max_in_flight]
+        if not candidates:
+            return None
+        # Rotate the starting point so ties don't always land on the first server
+        count = len(self.endpoints)
+        order = {id(e): (i - self._next) % count for i, e in enumerate(self.endpoints)}
+        best = min(candidates, key=lambda e: (e.in_flight / e.max_in_flight, order[id(e)]))
+        self._next = (self.endpoints.index(best) + 1) % count
+        return best
+
+    def acquire(self) -> Endpoint:
+        """
+        Reserve a server for one request, blocking while all healthy servers are busy
+
+        Raises:
+            RuntimeError: No server was healthy within acquire_timeout
+        """
+        deadline = None
+        with self._condition:
+            while True:
+                endpoint = self._pick()
+                if endpoint is not None:
+                    endpoint.in_flight += 1
+                    return endpoint
+
+                if any(e.healthy for e in self.endpoints):
+                    # Only busy - a release will wake us
+                    deadline = None
+                    self._condition.wait()
+                    continue
+
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + self.acquire_timeout
+                if now >= deadline:
+                    raise RuntimeError("No healthy Ollama endpoints")
+                self._condition.wait(deadline - now)
+
+    def release(self, endpoint: Endpoint, success: Optional[bool], seconds: float = 0.0,
+                generated_tokens: Optional[int] = None):
+        """Return a server after a request and feed back how it went (None: cancelled, no verdict)"""
+        with self._condition:
+            endpoint.in_flight -= 1
+            endpoint.stats['requests'] += 1
+            endpoint.stats['busy_seconds'] += seconds
+            if success:
+                endpoint.consecutive_failures = 0
+                endpoint.stats['generated_tokens'] += generated_tokens or 0
+            elif success is False:
+                endpoint.consecutive_failures += 1
+                endpoint.stats['failures'] += 1
+                if endpoint.healthy and endpoint.consecutive_failures >= self.failure_threshold:
+                    self._eject(endpoint, f"{endpoint.consecutive_failures} consecutive failures")
+            self._condition.notify_all()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Per-server state and throughput for pipeline stats"""
+        with self._condition:
+            return [endpoint.snapshot() for endpoint in self.endpoints]
@@ -6,27 +6,33 @@ Automatically surfaces gaps and omissions in story mapping
 
 import json
 from pathlib import Path
-from typing import Dict, List, Set
+from typing import Dict, List, Set, Optional
 from collections import defaultdict
 
+from story_index import StoryIndex, ChapterKey
+
 
 class GapDetector:
-    def __init__(self, story_json: str = "story.json", mapping_json: str = "mapping.json"):
+    def __init__(self, story_json: str = "story.json", mapping_json: str = "mapping.json",
+                 story_index: Optional[StoryIndex] = None):
         """
         Initialize gap detector
         
         Args:
             story_json: Path to original story data
             mapping_json: Path to generated mapping data
+            story_index: Shared index over story.json; loaded from story_json if omitted
         """
         self.story_json = Path(story_json)
         self.mapping_json = Path(mapping_json)
         
-        if self.story_json.exists():
-            with open(self.story_json) as f:
-                self.story_data = json.load(f)
+        if story_index is not None:
+            self.story_index = story_index
+        elif self.story_json.exists():
+            self.story_index = StoryIndex.load(str(self.story_json))
         else:
             raise FileNotFoundError(f"Story file not found: {story_json}")
+        self.story_data = self.story_index.story_data
             
         if self.mapping_json.exists():
             with open(self.mapping_json) as f:
@@ -41,7 +47,7 @@ class GapDetector:
     
     def detect_missing_uids(self) -> Dict[str, List[str]]:
         """Detect missing UIDs in the mapping"""
-        original_uids = {unit['uid'] for unit in self.story_data['data']}
+        original_uids = set(self.story_index.by_uid)
         mapped_uids = {unit['UID'] for unit in self.mapping_data if 'UID' in unit}
         
         missing_uids = original_uids - mapped_uids
@@ -52,19 +58,22 @@ class GapDetector:
             'extra_in_mapping': sorted(list(extra_uids))
         }
     
-    def detect_chapter_count_changes(self) -> Dict[int, Dict[str, int]]:
+    def detect_chapter_count_changes(self) -> Dict[ChapterKey, Dict[str, int]]:
         """Detect changes in chapter unit counts"""
         original_counts = defaultdict(int)
         mapped_counts = defaultdict(int)
         
         # Count original units per chapter
-        for unit in self.story_data['data']:
-            original_counts[unit['chapter']] += 1
+        for chapter, (start, end) in self.story_index.chapter_ranges.items():
+            original_counts[chapter] = end - start
         
         # Count mapped units per chapter
         for unit in self.mapping_data:
             if 'UID' in unit:
-                chapter = int(unit['UID'].split('-')[0].replace('CH', ''))
+                # UIDs kept by an incremental ingest may name the chapter the unit used to be in
+                original = self.story_index.get(unit['UID'])
+                chapter = (StoryIndex.chapter_key(original) if original is not None
+                           else StoryIndex.uid_chapter_key(unit['UID']))
                 mapped_counts[chapter] += 1
         
         changes = {}
@@ -85,10 +94,7 @@ class GapDetector:
         """Detect text mismatches between original and mapped content"""
         mismatches = []
         
-        # Create lookup for original text by UID
-        original_text = {}
-        for unit in self.story_data['data']:
-            original_text[unit['uid']] = unit['text']
+        original_units = self.story_index.by_uid
         
         # Check mapped text against original
         for unit in self.mapping_data:
@@ -96,8 +102,8 @@ class GapDetector:
                 uid = unit['UID']
                 mapped_text = unit['Raw Sentence']
                 
-                if uid in original_text:
-                    original = original_text[uid]
+                if uid in original_units:
+                    original = self.story_index.unit_text(original_units[uid])
                     if original != mapped_text:
                         mismatches.append({
                             'uid': uid,
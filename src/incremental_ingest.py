@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Incremental Ingest for Zero-Loss Mapping Workflow
+Re-ingests a revised story against the previous story.json, keeping the UIDs of unchanged text and recording what changed
+"""
+
+import argparse
+import difflib
+import json
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+from ingest import StoryIngestor, ABBREVIATIONS
+from corpus_ingest import CorpusIngestor
+from story_index import StoryIndex
+
+# UIDs as generate_uid writes them, with the book prefix of a corpus
+UID_PATTERN = re.compile(r'^(?:(?P<book>[^-]+)-)?CH(?P<chapter>\d+)-P(?P<paragraph>\d+)-S(?P<sentence>\d+)$')
+
+Paragraph = List[Dict[str, Any]]
+Chapter = List[Paragraph]
+
+
+def format_uid(book: Optional[str], chapter: int, paragraph: int, sentence: int) -> str:
+    """UID in the format of StoryIngestor.generate_uid"""
+    uid = f"CH{chapter:02d}-P{paragraph:03d}-S{sentence:03d}"
+    return f"{book}-{uid}" if book else uid
+
+
+def parse_uid(uid: str) -> Optional[Tuple[int, int, int]]:
+    """(chapter, paragraph, sentence) numbers of a UID, or None if it is not one"""
+    match = UID_PATTERN.match(uid)
+    if not match:
+        return None
+    return int(match['chapter']), int(match['paragraph']), int(match['sentence'])
+
+
+def group_chapters(units: Sequence[Dict[str, Any]]) -> Dict[Optional[str], List[Chapter]]:
+    """Units grouped into books -> chapters -> paragraphs, all in story order"""
+    books: Dict[Optional[str], List[Chapter]] = {}
+    previous = None
+    for unit in units:
+        book = unit.get('book')
+        chapters = books.setdefault(book, [])
+        position = (book, unit['chapter'], unit['paragraph'])
+        if previous is None or position[:2] != previous[:2]:
+            chapters.append([[unit]])
+        elif position != previous:
+            chapters[-1].append([unit])
+        else:
+            chapters[-1][-1].append(unit)
+        previous = position
+    return books
+
+
+def paragraph_hash(paragraph: Paragraph) -> str:
+    """Content hash of a paragraph, from the hashes of its units"""
+    return StoryIngestor.calculate_hash("\n".join(unit['hash'] for unit in paragraph))
+
+
+def chapter_hash(chapter: Chapter) -> str:
+    """
+    Content hash of a chapter's body
+
+    The header is left out, so chapters renumbered by an inserted chapter
+    ("Chapter 3:" becoming "Chapter 4:") still match their previous revision.
+    """
+    return StoryIngestor.calculate_hash("\n".join(paragraph_hash(paragraph) for paragraph in chapter
+                                                  if paragraph[0]['type'] != 'chapter_header'))
+
+
+def aligned(old: Sequence[str], new: Sequence[str]):
+    """
+    Pairs of (old index or None, new index or None) aligning two hash sequences
+
+    Equal runs are matched exactly; within a replaced run items are paired by
+    position, and the rest of the longer side is left unpaired.
+    """
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+    for _, i1, i2, j1, j2 in matcher.get_opcodes():
+        for k in range(max(i2 - i1, j2 - j1)):
+            yield (i1 + k if i1 + k < i2 else None), (j1 + k if j1 + k < j2 else None)
+
+
+class IncrementalIngestor:
+    def __init__(self, story_path: str, previous_json: str = "story.json", language: str = "en"):
+        """
+        Initialize an incremental re-ingest
+
+        Args:
+            story_path: Revised story file, or a directory of book files
+            previous_json: story.json of the previous revision, whose UIDs are kept
+            language: Abbreviation table used when splitting sentences
+        """
+        self.story_path = story_path
+        self.previous_json = Path(previous_json)
+        self.language = language
+        self.previous: Optional[StoryIndex] = None
+        self.changes: Dict[str, List[str]] = {"added": [], "removed": [], "modified": []}
+        self.unchanged = 0
+
+    def ingest_current(self, output_path: str) -> Dict[str, Any]:
+        """Plain ingest of the revised story to output_path, loaded back"""
+        if Path(self.story_path).is_dir():
+            CorpusIngestor([self.story_path], language=self.language).save(output_path)
+        else:
+            ingestor = StoryIngestor(self.story_path, language=self.language)
+            ingestor.process_story()
+            ingestor.save_to_json(output_path)
+        with open(output_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def reconcile(self, previous: StoryIndex, current: Sequence[Dict[str, Any]]):
+        """
+        Give current units the UIDs of the previous units they match, in place
+
+        Chapters of each book are aligned by content hash, then paragraphs
+        within paired chapters, then units within paired paragraphs. A matched
+        unit keeps its UID (counted as modified if its text changed); unmatched
+        units get fresh numbers above every number the previous revision used
+        in their chapter or paragraph, so a UID never means two texts at once.
+        """
+        self.previous = previous
+        old_books = group_chapters(previous.units)
+        for book, chapters in group_chapters(current).items():
+            self._reconcile_book(book, old_books.pop(book, []), chapters)
+        for chapters in old_books.values():
+            self._remove(unit for chapter in chapters for paragraph in chapter for unit in paragraph)
+
+    def _reconcile_book(self, book: Optional[str], old_chapters: List[Chapter], new_chapters: List[Chapter]):
+        next_chapter = 1 + max((parse_uid(chapter[0][0]['uid'])[0] for chapter in old_chapters), default=0)
+        for i, j in aligned([chapter_hash(c) for c in old_chapters], [chapter_hash(c) for c in new_chapters]):
+            if j is None:
+                self._remove(unit for paragraph in old_chapters[i] for unit in paragraph)
+            elif i is None:
+                # A new chapter: fresh chapter number, positions within it as ingested
+                for paragraph in new_chapters[j]:
+                    for unit in paragraph:
+                        self._add(unit, format_uid(book, next_chapter, unit['paragraph'], unit['sentence']))
+                next_chapter += 1
+            else:
+                self._reconcile_chapter(book, old_chapters[i], new_chapters[j])
+
+    def _reconcile_chapter(self, book: Optional[str], old: Chapter, new: Chapter):
+        chapter_number = parse_uid(old[0][0]['uid'])[0]
+        next_paragraph = 1 + max(parse_uid(paragraph[0]['uid'])[1] for paragraph in old)
+        for i, j in aligned([paragraph_hash(p) for p in old], [paragraph_hash(p) for p in new]):
+            if j is None:
+                self._remove(old[i])
+            elif i is None:
+                for unit in new[j]:
+                    self._add(unit, format_uid(book, chapter_number, next_paragraph, unit['sentence']))
+                next_paragraph += 1
+            else:
+                self._reconcile_paragraph(book, old[i], new[j])
+
+    def _reconcile_paragraph(self, book: Optional[str], old: Paragraph, new: Paragraph):
+        chapter_number, paragraph_number, _ = parse_uid(old[0]['uid'])
+        next_sentence = 1 + max(parse_uid(unit['uid'])[2] for unit in old)
+        for i, j in aligned([unit['hash'] for unit in old], [unit['hash'] for unit in new]):
+            if j is None:
+                self._remove([old[i]])
+            elif i is None:
+                self._add(new[j], format_uid(book, chapter_number, paragraph_number, next_sentence))
+                next_sentence += 1
+            else:
+                old_unit, unit = old[i], new[j]
+                unit['uid'] = old_unit['uid']
+                if (self.previous.unit_text(old_unit), old_unit['type']) != (unit['text'], unit['type']):
+                    self.changes['modified'].append(unit['uid'])
+                else:
+                    self.unchanged += 1
+
+    def _add(self, unit: Dict[str, Any], uid: str):
+        unit['uid'] = uid
+        self.changes['added'].append(uid)
+
+    def _remove(self, units):
+        self.changes['removed'].extend(unit['uid'] for unit in units)
+
+    def save(self, output_path: str = "story.json", changes_path: str = "story_changes.json") -> Dict[str, Any]:
+        """
+        Re-ingest the story to output_path and write the change set to changes_path
+
+        Without a usable previous story.json every unit counts as added and
+        keeps the UID a plain ingest gives it. Returns the change set.
+        """
+        previous = None
+        if self.previous_json.exists():
+            # Loaded through an index, so a previous story.json with a text store works too
+            previous = StoryIndex.load(str(self.previous_json))
+            if not all(parse_uid(unit['uid']) for unit in previous.units):
+                print(f"⚠ {self.previous_json} has UIDs this ingest did not produce; ingesting from scratch")
+                previous = None
+
+        tmp_path = output_path + ".new"
+        story_data = self.ingest_current(tmp_path)
+        self.changes = {"added": [], "removed": [], "modified": []}
+        self.unchanged = 0
+        if previous is None:
+            self.changes['added'] = [unit['uid'] for unit in story_data['data']]
+        else:
+            self.reconcile(previous, story_data['data'])
+
+        uids = [unit['uid'] for unit in story_data['data']]
+        if len(set(uids)) != len(uids):
+            raise ValueError("Incremental ingest produced duplicate UIDs")
+
+        story_data['metadata']['changes'] = {name: len(uids) for name, uids in self.changes.items()}
+        story_data['metadata']['changes']['unchanged'] = self.unchanged
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(story_data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, output_path)
+
+        change_set = {
+            "generated_at": datetime.now().isoformat(),
+            "story": output_path,
+            "base_units": len(previous) if previous is not None else 0,
+            "unchanged": self.unchanged,
+            **self.changes
+        }
+        with open(changes_path, 'w', encoding='utf-8') as f:
+            json.dump(change_set, f, indent=2)
+
+        print(f"✓ Kept {self.unchanged} unchanged UIDs: {len(self.changes['added'])} added, "
+              f"{len(self.changes['removed'])} removed, {len(self.changes['modified'])} modified")
+        print(f"✓ Saved change set to {changes_path}")
+        return change_set
+
+
+def load_changed_uids(changes_path: str = "story_changes.json") -> Optional[set]:
+    """UIDs a change set marks as added or modified, or None if there is no change set"""
+    try:
+        with open(changes_path, 'r', encoding='utf-8') as f:
+            change_set = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return set(change_set.get('added', [])) | set(change_set.get('modified', []))
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Re-ingest a revised story, keeping the UIDs of unchanged text")
+    parser.add_argument("story", help="Revised story file, or a directory of book files")
+    parser.add_argument("--previous", default="story.json", help="story.json of the previous revision")
+    parser.add_argument("--output", default="story.json", help="Output file")
+    parser.add_argument("--changes", default="story_changes.json", help="Change set output file")
+    parser.add_argument("--language", choices=sorted(ABBREVIATIONS), default="en",
+                        help="Abbreviation table used when splitting sentences")
+    args = parser.parse_args()
+
+    IncrementalIngestor(args.story, args.previous, language=args.language).save(args.output, args.changes)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,141 +4,322 @@ Ingest script for Zero-Loss Mapping Workflow
 Fragments story text into Chapter → Paragraph → Sentence tree with stable UIDs
 """
 
+import argparse
 import json
 import re
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 import hashlib
 
+# A line starting like this begins a new chapter
+CHAPTER_HEADER = re.compile(r'Chapter \d+:')
+
+# Abbreviations whose trailing period never ends a sentence, per language (without that period)
+ABBREVIATIONS = {
+    "en": ("Dr", "Mr", "Mrs", "Ms", "Prof", "Sr", "Jr", "Inc", "Ltd", "Corp", "Co", "etc", "vs", "e.g", "i.e"),
+    "de": ("Dr", "Hr", "Fr", "Prof", "Nr", "Str", "bzw", "ca", "usw", "vgl", "z.B", "d.h", "u.a"),
+    "fr": ("M", "Mme", "Mlle", "Dr", "Pr", "St", "Ste", "etc", "cf", "p.ex")
+}
+
+
+class SentenceSegmenter:
+    """Splits paragraphs into sentences in one regex pass over the text"""
+    
+    _patterns: Dict[Tuple[str, ...], "re.Pattern"] = {}
+    
+    # Whitespace after a period that ends a sentence
+    _boundary_after = re.compile(r'\s+(?=[A-Z])')
+    
+    def __init__(self, abbreviations: Iterable[str] = ABBREVIATIONS["en"]):
+        """
+        Compile (once per abbreviation table) the pattern that finds both
+        abbreviations and sentence boundaries
+        
+        The pattern starts at the punctuation mark, so the regex engine skips
+        ahead to the next [.!?] instead of trying every abbreviation at every
+        character; fixed-width lookbehinds, one per abbreviation length, tell
+        an abbreviation's period apart from a sentence end.
+        
+        Args:
+            abbreviations: Words whose trailing period doesn't end a sentence, without that period
+        """
+        self.words = tuple(sorted(set(abbreviations), key=lambda word: (-len(word), word)))
+        self.longest = len(self.words[0]) if self.words else 0
+        if self.words not in self._patterns:
+            by_length: Dict[int, List[str]] = {}
+            for word in self.words:
+                by_length.setdefault(len(word), []).append(re.escape(word))
+            lookbehinds = "|".join(rf"(?<=\b(?:{'|'.join(words)})\.)" for words in by_length.values())
+            abbreviation = rf"(?P<abbr>{lookbehinds})\s*|" if lookbehinds else ""
+            self._patterns[self.words] = re.compile(rf"[.!?](?:{abbreviation}\s+(?=[A-Z]))")
+        self.pattern = self._patterns[self.words]
+    
+    @classmethod
+    def for_language(cls, language: str) -> "SentenceSegmenter":
+        if language not in ABBREVIATIONS:
+            raise ValueError(f"No abbreviation table for language: {language}")
+        return cls(ABBREVIATIONS[language])
+    
+    def _starts_after(self, text: str, period: int, limit: int) -> bool:
+        """Whether an abbreviation ending at this period starts at or after limit"""
+        for word in self.words:
+            start = period - len(word)
+            if (start >= limit and text.startswith(word, start)
+                    and (start == 0 or not (text[start - 1].isalnum() or text[start - 1] == '_'))):
+                return True
+        return False
+    
+    def split(self, text: str) -> List[str]:
+        """Stripped, non-empty sentences of a paragraph"""
+        sentences = []
+        parts = []
+        pos = 0
+        abbreviation_end = 0
+        for match in self.pattern.finditer(text):
+            period = match.start()
+            end = match.end()
+            if match.lastgroup == 'abbr':
+                # An abbreviation can't reuse the period of the one before it (as in "i.e.g.")
+                if period - self.longest >= abbreviation_end or self._starts_after(text, period, abbreviation_end):
+                    # Keep the period and normalize the whitespace after it to one space
+                    parts.append(text[pos:period + 1])
+                    parts.append(' ')
+                    pos = abbreviation_end = end
+                    continue
+                boundary = self._boundary_after.match(text, period + 1)
+                if boundary is None:
+                    continue
+                end = boundary.end()
+            
+            parts.append(text[pos:period + 1])
+            sentences.append(''.join(parts))
+            parts = []
+            pos = end
+        parts.append(text[pos:])
+        sentences.append(''.join(parts))
+        
+        if '<PERIOD>' in text:
+            # The old multi-pass splitter turned this placeholder into a period wherever it occurred
+            sentences = [sentence.replace('<PERIOD>', '.') for sentence in sentences]
+        return [sentence.strip() for sentence in sentences if sentence.strip()]
+
 
 class StoryIngestor:
-    def __init__(self, story_path: str):
+    def __init__(self, story_path: str, language: str = "en", abbreviations: Optional[Iterable[str]] = None,
+                 book: Optional[str] = None):
+        """
+        Args:
+            story_path: Path to the story text file
+            language: Selects the abbreviation table used to split sentences
+            abbreviations: Custom abbreviation table, overriding the language's
+            book: Book prefix for UIDs (e.g. "B01" gives B01-CH01-P001-S001) when
+                ingesting one book of a corpus; each unit then also carries a "book" field
+        """
         self.story_path = Path(story_path)
+        self.book = book
         self.data = []
         self.uid_count = 0
+        self.chapters = 0
+        self.segmenter = (SentenceSegmenter(abbreviations) if abbreviations is not None
+                          else SentenceSegmenter.for_language(language))
         
     def generate_uid(self, chapter_idx: int, para_idx: int, sent_idx: int) -> str:
         """Generate stable UID for each sentence"""
-        return f"CH{chapter_idx:02d}-P{para_idx:03d}-S{sent_idx:03d}"
+        uid = f"CH{chapter_idx:02d}-P{para_idx:03d}-S{sent_idx:03d}"
+        return f"{self.book}-{uid}" if self.book else uid
     
-    def calculate_hash(self, text: str) -> str:
+    @staticmethod
+    def calculate_hash(text: str) -> str:
         """Calculate hash of text for verification purposes"""
         return hashlib.md5(text.encode()).hexdigest()[:8]
     
     def split_into_sentences(self, text: str) -> List[str]:
-        """Split text into sentences, handling various edge cases"""
-        # Handle abbreviations and special cases
-        text = re.sub(r'\b(Dr|Mr|Mrs|Ms|Prof|Sr|Jr)\.\s*', r'\1<PERIOD> ', text)
-        text = re.sub(r'\b(Inc|Ltd|Corp|Co)\.\s*', r'\1<PERIOD> ', text)
-        text = re.sub(r'\b(etc|vs|e\.g|i\.e)\.\s*', r'\1<PERIOD> ', text)
+        """Split text into sentences, handling abbreviations and various edge cases"""
+        return self.segmenter.split(text)
+    
+    def clean_text(self, text: str) -> str:
+        """Clean text while preserving structure (whitespace runs become single spaces)"""
+        return ' '.join(text.split())
+    
+    def header_unit(self, chapter: int, text: str) -> Dict[str, Any]:
+        """Unit for a chapter header (headers don't count towards uid_count)"""
+        return {
+            "uid": self.generate_uid(chapter, 0, 0),
+            "type": "chapter_header",
+            "chapter": chapter,
+            "paragraph": 0,
+            "sentence": 0,
+            "text": self.clean_text(text),
+            "hash": self.calculate_hash(text),
+            "metadata": {
+                "is_header": True,
+                "word_count": len(text.split())
+            }
+        }
+    
+    def paragraph_units(self, chapter: int, para_idx: int, paragraph: str) -> Iterator[Dict[str, Any]]:
+        """Units of one stripped, non-empty paragraph"""
+        # Check if this is a special paragraph (lists, headers, etc.)
+        is_list = paragraph.startswith(('•', '-', '*', '1.', 'BOSS:', 'THE '))
         
-        # Split on sentence boundaries
-        sentences = re.split(r'(?<=[.!?])\s+(?=[A-Z])', text)
+        if is_list or ':' in paragraph.split('\n')[0]:
+            # Handle structured content (lists, definitions)
+            lines = paragraph.split('\n')
+            for sent_idx, line in enumerate(lines, 1):
+                line = line.strip()
+                if line:
+                    self.uid_count += 1
+                    yield {
+                        "uid": self.generate_uid(chapter, para_idx, sent_idx),
+                        "type": "structured",
+                        "chapter": chapter,
+                        "paragraph": para_idx,
+                        "sentence": sent_idx,
+                        "text": self.clean_text(line),
+                        "hash": self.calculate_hash(line),
+                        "metadata": {
+                            "is_list_item": line.startswith(('•', '-', '*')),
+                            "is_definition": ':' in line,
+                            "word_count": len(line.split())
+                        }
+                    }
+        else:
+            # Handle regular paragraphs
+            sentences = self.split_into_sentences(paragraph)
+            for sent_idx, sentence in enumerate(sentences, 1):
+                if sentence:
+                    self.uid_count += 1
+                    yield {
+                        "uid": self.generate_uid(chapter, para_idx, sent_idx),
+                        "type": "sentence",
+                        "chapter": chapter,
+                        "paragraph": para_idx,
+                        "sentence": sent_idx,
+                        "text": self.clean_text(sentence),
+                        "hash": self.calculate_hash(sentence),
+                        "metadata": {
+                            "word_count": len(sentence.split()),
+                            "has_dialogue": '"' in sentence or '"' in sentence or '"' in sentence
+                        }
+                    }
+    
+    def read_lines(self) -> Iterator[str]:
+        """Lines of the story file, read lazily"""
+        with open(self.story_path, 'r', encoding='utf-8') as f:
+            yield from f
+    
+    def iter_units(self, lines: Optional[Iterable[str]] = None, first_chapter: int = 0) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the story's units in order while reading it line by line
         
-        # Restore periods
-        sentences = [s.replace('<PERIOD>', '.') for s in sentences]
+        Only the current paragraph is held in memory. Chapters and paragraphs
+        are numbered exactly as splitting the whole text would: a header line
+        starts a chapter, content before the first header is chapter 1, and a
+        run of k empty lines advances the paragraph index by (k + 1) // 2, as
+        many paragraph separators as it contains.
         
-        # Filter out empty sentences
-        return [s.strip() for s in sentences if s.strip()]
+        Args:
+            lines: Text to ingest instead of the story file, e.g. one slice of it
+                that starts at a chapter header
+            first_chapter: Chapters before the given lines; their headers are
+                numbered from first_chapter + 1
+        """
+        units = self._scan(self.read_lines() if lines is None else lines, first_chapter)
+        if not self.book:
+            return units
+        return self._tag_book(units)
     
-    def clean_text(self, text: str) -> str:
-        """Clean text while preserving structure"""
-        # Normalize whitespace
-        text = re.sub(r'\s+', ' ', text)
-        # Remove leading/trailing whitespace
-        return text.strip()
+    def _tag_book(self, units: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for unit in units:
+            unit["book"] = self.book
+            yield unit
     
-    def process_story(self) -> List[Dict[str, Any]]:
-        """Process the entire story into structured data"""
-        # Read the story file
-        story_text = self.story_path.read_text(encoding='utf-8')
+    def _scan(self, lines: Iterable[str], first_chapter: int) -> Iterator[Dict[str, Any]]:
+        """The line-by-line state machine behind iter_units (sets self.chapters when done)"""
+        chapter = first_chapter
+        started = False       # Current chapter has non-blank content
+        header_like = None    # Lines of a chapter whose text itself starts like a header
+        para_idx = 0
+        para_lines: List[str] = []
+        blank_run = 0
         
-        # Split into chapters
-        # Handle both "Chapter N:" and content without explicit chapter markers
-        chapter_splits = re.split(r'^(Chapter \d+:.*?)$', story_text, flags=re.MULTILINE)
+        def end_chapter():
+            nonlocal chapter
+            if header_like is not None:
+                # The chapter text is taken as one (indented) header, as before
+                chapter += 1
+                yield self.header_unit(chapter, "\n".join(header_like).strip())
+            else:
+                yield from paragraph()
+        
+        def paragraph():
+            text = "\n".join(para_lines).strip()
+            if text:
+                yield from self.paragraph_units(chapter, para_idx, text)
         
-        # Process chapters
-        current_chapter = 0
-        for i in range(len(chapter_splits)):
-            text = chapter_splits[i].strip()
-            if not text:
+        for line in lines:
+            if line.endswith('\n'):
+                line = line[:-1]
+            
+            if CHAPTER_HEADER.match(line):
+                yield from end_chapter()
+                started, header_like, para_lines, blank_run = False, None, [], 0
+                chapter += 1
+                yield self.header_unit(chapter, line.strip())
                 continue
-                
-            # Check if this is a chapter header
-            if re.match(r'^Chapter \d+:', text):
-                current_chapter += 1
-                # Add chapter header as first sentence
-                self.data.append({
-                    "uid": self.generate_uid(current_chapter, 0, 0),
-                    "type": "chapter_header",
-                    "chapter": current_chapter,
-                    "paragraph": 0,
-                    "sentence": 0,
-                    "text": self.clean_text(text),
-                    "hash": self.calculate_hash(text),
-                    "metadata": {
-                        "is_header": True,
-                        "word_count": len(text.split())
-                    }
-                })
-            else:
-                # Process chapter content
-                if current_chapter == 0:
+            
+            if not started:
+                # Leading blank lines of a chapter are stripped away
+                if not line.strip():
+                    continue
+                started = True
+                if CHAPTER_HEADER.match(line.strip()):
+                    header_like = [line]
+                    continue
+                if chapter == 0:
                     # Handle content before first chapter marker
-                    current_chapter = 1
-                
-                # Split into paragraphs
-                paragraphs = text.split('\n\n')
-                
-                for para_idx, paragraph in enumerate(paragraphs, 1):
-                    paragraph = paragraph.strip()
-                    if not paragraph:
-                        continue
-                    
-                    # Check if this is a special paragraph (lists, headers, etc.)
-                    is_list = paragraph.startswith(('•', '-', '*', '1.', 'BOSS:', 'THE '))
-                    
-                    if is_list or ':' in paragraph.split('\n')[0]:
-                        # Handle structured content (lists, definitions)
-                        lines = paragraph.split('\n')
-                        for sent_idx, line in enumerate(lines, 1):
-                            line = line.strip()
-                            if line:
-                                self.uid_count += 1
-                                self.data.append({
-                                    "uid": self.generate_uid(current_chapter, para_idx, sent_idx),
-                                    "type": "structured",
-                                    "chapter": current_chapter,
-                                    "paragraph": para_idx,
-                                    "sentence": sent_idx,
-                                    "text": self.clean_text(line),
-                                    "hash": self.calculate_hash(line),
-                                    "metadata": {
-                                        "is_list_item": line.startswith(('•', '-', '*')),
-                                        "is_definition": ':' in line,
-                                        "word_count": len(line.split())
-                                    }
-                                })
-                    else:
-                        # Handle regular paragraphs
-                        sentences = self.split_into_sentences(paragraph)
-                        for sent_idx, sentence in enumerate(sentences, 1):
-                            if sentence:
-                                self.uid_count += 1
-                                self.data.append({
-                                    "uid": self.generate_uid(current_chapter, para_idx, sent_idx),
-                                    "type": "sentence",
-                                    "chapter": current_chapter,
-                                    "paragraph": para_idx,
-                                    "sentence": sent_idx,
-                                    "text": self.clean_text(sentence),
-                                    "hash": self.calculate_hash(sentence),
-                                    "metadata": {
-                                        "word_count": len(sentence.split()),
-                                        "has_dialogue": '"' in sentence or '"' in sentence or '"' in sentence
-                                    }
-                                })
+                    chapter = 1
+                para_idx, para_lines = 1, [line]
+                continue
+            
+            if header_like is not None:
+                header_like.append(line)
+            elif line == "":
+                blank_run += 1
+            else:
+                if blank_run:
+                    yield from paragraph()
+                    para_idx += (blank_run + 1) // 2
+                    para_lines, blank_run = [], 0
+                para_lines.append(line)
         
+        yield from end_chapter()
+        self.chapters = chapter
+    
+    @staticmethod
+    def count_chapters(lines: Iterable[str]) -> int:
+        """
+        Number of chapters iter_units would find in these lines, without building units
+
+        Mirrors the chapter numbering of _scan: a header line, a chapter whose
+        text starts like a header, and content before the first header each
+        count as one chapter.
+        """
+        chapters = 0
+        started = False
+        for line in lines:
+            if CHAPTER_HEADER.match(line):
+                chapters += 1
+                started = False
+            elif not started and line.strip():
+                started = True
+                if CHAPTER_HEADER.match(line.strip()) or chapters == 0:
+                    chapters += 1
+        return chapters
+
+    def process_story(self) -> List[Dict[str, Any]]:
+        """Process the entire story into structured data"""
+        self.data = list(self.iter_units())
         return self.data
     
     def save_to_json(self, output_path: str):
@@ -159,15 +340,54 @@ class StoryIngestor:
         print(f"✓ Ingested {self.uid_count} text units")
         print(f"✓ Saved to {output_path}")
 
+    
+    def save_to_jsonl(self, output_path: str = "story.jsonl") -> int:
+        """
+        Stream the story to an NDJSON file without keeping its units in memory
+        
+        Each line holds one unit, identical to the entries of story.json's
+        "data"; the last line holds {"metadata": ...}, which is only known once
+        every unit has been read. Returns the number of units written.
+        """
+        total_chapters = 0
+        processing_date = str(Path(output_path).stat().st_mtime if Path(output_path).exists() else "new")
+        with open(output_path, 'w', encoding='utf-8') as f:
+            for unit in self.iter_units():
+                f.write(json.dumps(unit, ensure_ascii=False) + "\n")
+                total_chapters = max(total_chapters, unit["chapter"])
+            
+            f.write(json.dumps({
+                "metadata": {
+                    "total_units": self.uid_count,
+                    "total_chapters": total_chapters,
+                    "source_file": str(self.story_path),
+                    "processing_date": processing_date
+                }
+            }, ensure_ascii=False) + "\n")
+        
+        print(f"✓ Ingested {self.uid_count} text units")
+        print(f"✓ Saved to {output_path}")
+        return self.uid_count
+
 
 def main():
     """Main entry point"""
-    # Configure paths
-    story_file = "zombie_story.txt"
-    output_file = "story.json"
+    parser = argparse.ArgumentParser(description="Fragment a story into units with stable UIDs")
+    parser.add_argument("story", nargs="?", default="zombie_story.txt", help="Path to story file")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read the story line by line and write NDJSON to story.jsonl with bounded memory")
+    parser.add_argument("--output", default=None, help="Output file (default: story.json, or story.jsonl with --stream)")
+    parser.add_argument("--language", choices=sorted(ABBREVIATIONS), default="en",
+                        help="Abbreviation table used when splitting sentences")
+    args = parser.parse_args()
+    
+    ingestor = StoryIngestor(args.story, language=args.language)
+    if args.stream:
+        ingestor.save_to_jsonl(args.output or "story.jsonl")
+        return
     
     # Process the story
-    ingestor = StoryIngestor(story_file)
+    output_file = args.output or "story.json"
     ingestor.process_story()
     ingestor.save_to_json(output_file)
     
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+LLM Response Cache for Zero-Loss Mapping Workflow
+Content-addressed on-disk cache of model responses with size-based LRU eviction
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Union
+from datetime import datetime
+
+
+# Eviction trims the cache to this fraction of max_bytes, so a full cache is rescanned only
+# once every tenth of its budget rather than on every write
+LOW_WATER_FRACTION = 0.9
+
+
+class ResponseCache:
+    def __init__(self, cache_dir: str = ".llm_cache", max_bytes: int = 512 * 1024 * 1024):
+        """
+        Initialize cache rooted at cache_dir
+
+        Args:
+            cache_dir: Directory holding cached responses
+            max_bytes: Total size above which least recently used entries are evicted,
+                down to LOW_WATER_FRACTION of it
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.low_water_bytes = int(max_bytes * LOW_WATER_FRACTION)
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "evictions": 0
+        }
+        self._lock = threading.Lock()
+        self._total_bytes = sum(entry.stat().st_size for entry in self._entries())
+
+    @staticmethod
+    def make_key(model: str, options: Dict[str, Any], prompt: Union[str, List[Dict[str, str]]]) -> str:
+        """Hash everything that determines the model's output"""
+        material = json.dumps(
+            {"model": model, "options": options, "prompt": prompt},
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _entries(self):
+        return self.cache_dir.glob("*/*.json")
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            # Bump mtime so eviction treats this entry as recently used
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.stats['misses'] += 1
+            return None
+
+        with self._lock:
+            self.stats['hits'] += 1
+        return entry['response']
+
+    def put(self, key: str, response: str, model: str = ""):
+        """Store a response and evict old entries if the cache is over budget"""
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        entry = {
+            "key": key,
+            "model": model,
+            "created_at": datetime.now().isoformat(),
+            "response": response
+        }
+
+        # Write to a temp file first so a crash never leaves a truncated entry
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        previous_size = path.stat().st_size if path.exists() else 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.stats['writes'] += 1
+            self._total_bytes += path.stat().st_size - previous_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def invalidate(self, key: str):
+        """Drop an entry, e.g. when its response failed verification"""
+        path = self._path(key)
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return
+        with self._lock:
+            self._total_bytes -= size
+
+    def _evict(self):
+        """Delete least recently used entries until the cache is back under its low-water mark"""
+        entries = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+        entries.sort()
+
+        self._total_bytes = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if self._total_bytes <= self.low_water_bytes:
+                break
+            try:
+                entry.unlink()
+            except OSError:
+                continue
+            self._total_bytes -= size
+            self.stats['evictions'] += 1
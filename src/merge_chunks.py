@@ -7,24 +7,33 @@ Aggregates verified chunks into master mapping file
 import json
 import os
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 from datetime import datetime
 import csv
 
+from story_index import StoryIndex
+
 
 class ChunkMerger:
-    def __init__(self, results_dir: str = "results", story_json: str = "story.json"):
+    def __init__(self, results_dir: str = "results", story_json: str = "story.json",
+                 story_index: Optional[StoryIndex] = None):
         """
         Initialize merger with results directory
         
         Args:
             results_dir: Directory containing processed batch results
             story_json: Path to original story.json for reference
+            story_index: Shared index over story.json; loaded from story_json if omitted
         """
         self.results_dir = Path(results_dir)
         self.story_json = Path(story_json)
-        self.story_data = self._load_story_data()
+        self.story_index = story_index or StoryIndex.load(str(self.story_json))
+        self.story_data = self.story_index.story_data
         self.merged_data = []
+        # Rows added during a run are sorted into story order once, when they are written out
+        self.in_story_order = True
+        self.covered_uids = set()
+        self.covered_count = 0
         self.merge_stats = {
             "total_units": 0,
             "batches_processed": 0,
@@ -32,32 +41,38 @@ class ChunkMerger:
             "warnings": []
         }
         
-    def _load_story_data(self) -> Dict[str, Any]:
-        """Load original story data for reference"""
-        with open(self.story_json, 'r', encoding='utf-8') as f:
-            return json.load(f)
+    def accepted_rows(self, data: Dict[str, Any], name: str) -> Optional[List[Dict[str, str]]]:
+        """Rows of a batch result if it was verified and accepted; otherwise note why it was skipped"""
+        if data.get('verification', {}).get('recommendation', '').startswith(('ACCEPT', 'ACCEPT_WITH_WARNINGS')):
+            return data.get('parsed_rows', [])
+        self.merge_stats['warnings'].append(f"Skipped {name}: {data.get('verification', {}).get('recommendation', 'No verification')}")
+        return None
     
     def load_batch_result(self, result_file: Path) -> Optional[List[Dict[str, str]]]:
         """Load a single batch result file"""
         try:
             with open(result_file, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-                
-            # Check if this result was verified and accepted
-            if data.get('verification', {}).get('recommendation', '').startswith(('ACCEPT', 'ACCEPT_WITH_WARNINGS')):
-                return data.get('parsed_rows', [])
-            else:
-                self.merge_stats['warnings'].append(f"Skipped {result_file.name}: {data.get('verification', {}).get('recommendation', 'No verification')}")
-                return None
+            return self.accepted_rows(data, result_file.name)
                 
         except Exception as e:
             self.merge_stats['errors'].append(f"Error loading {result_file.name}: {str(e)}")
             return None
     
-    def merge_all_results(self):
-        """Merge all batch results into unified dataset"""
+    def merge_all_results(self, batch_ids: Optional[Iterable[str]] = None):
+        """
+        Merge all batch results into unified dataset
+        
+        Args:
+            batch_ids: Only merge these batches, e.g. those of the current batching;
+                results left over from a run with more batches are ignored
+        """
         # Get all result files sorted by batch number
-        result_files = sorted(self.results_dir.glob("BATCH_*.json"))
+        if batch_ids is None:
+            result_files = sorted(self.results_dir.glob("BATCH_*.json"))
+        else:
+            result_files = [path for path in (self.results_dir / f"{batch_id}.json" for batch_id in batch_ids)
+                            if path.exists()]
         
         if not result_files:
             raise ValueError(f"No batch result files found in {self.results_dir}")
@@ -71,19 +86,72 @@ class ChunkMerger:
                 self.merge_stats['batches_processed'] += 1
                 self.merge_stats['total_units'] += len(batch_rows)
         
-        # Sort by UID to maintain order
-        self.merged_data.sort(key=lambda x: x.get('UID', ''))
+        self.in_story_order = False
+        self.sort_rows()
+        self.cover(self.merged_data)
+    
+    def sort_rows(self):
+        """Sort the merged rows into story order (UIDs kept by an incremental ingest are not positional)"""
+        if not self.in_story_order:
+            self.merged_data.sort(key=self.story_order)
+            self.in_story_order = True
+    
+    def cover(self, rows: Iterable[Dict[str, Any]]):
+        """Count the story units these rows cover for the first time"""
+        for row in rows:
+            uid = row.get('UID', '')
+            if uid not in self.covered_uids:
+                self.covered_uids.add(uid)
+                if uid in self.story_index:
+                    self.covered_count += 1
+    
+    def story_order(self, row: Dict[str, Any]) -> Tuple[int, str]:
+        """Sort key placing rows in story order; rows for UIDs not in the story go last"""
+        uid = row.get('UID', '')
+        return self.story_index.ordinals.get(uid, len(self.story_index)), uid
+    
+    def add_result(self, result: Dict[str, Any]) -> int:
+        """
+        Merge one batch result as soon as it is available
+        
+        Rows are enriched on arrival, so the merged data can be saved at any
+        point during a run. Returns the number of rows added.
+        """
+        batch_rows = self.accepted_rows(result, f"{result.get('batch_id', 'batch')}.json")
+        if not batch_rows:
+            return 0
+        
+        self.enrich_rows(batch_rows)
+        self.merged_data.extend(batch_rows)
+        self.merge_stats['batches_processed'] += 1
+        self.merge_stats['total_units'] += len(batch_rows)
+        self.cover(batch_rows)
+        # Results arrive in completion order; sort_rows() restores story order before output
+        self.in_story_order = False
+        return len(batch_rows)
+    
+    def coverage(self) -> Tuple[int, int]:
+        """(story units with a merged row, total story units)"""
+        return self.covered_count, len(self.story_index)
     
     def enrich_with_metadata(self):
-        """Add metadata from original story to merged data"""
-        # Create lookup for original data
-        uid_to_meta = {unit['uid']: unit for unit in self.story_data['data']}
+        """Add metadata (and Raw Sentence, if the model wasn't asked to echo it) from the original story"""
+        self.enrich_rows(self.merged_data)
+    
+    def enrich_rows(self, rows: List[Dict[str, Any]]):
+        """Add story metadata to the given rows in place"""
+        uid_to_meta = self.story_index.by_uid
         
-        for row in self.merged_data:
+        for row in rows:
             uid = row.get('UID', '')
             if uid in uid_to_meta:
                 meta = uid_to_meta[uid]
+                if not row.get('Raw Sentence'):
+                    # Annotate-by-UID responses carry no text; take it from the story
+                    row['Raw Sentence'] = self.story_index.unit_text(meta)
                 row['chapter'] = meta.get('chapter', 0)
+                if meta.get('book'):
+                    row['book'] = meta['book']
                 row['paragraph'] = meta.get('paragraph', 0)
                 row['sentence'] = meta.get('sentence', 0)
                 row['type'] = meta.get('type', 'unknown')
@@ -91,6 +159,7 @@ class ChunkMerger:
     
     def generate_markdown_mapping(self) -> str:
         """Generate the master mapping in Markdown format"""
+        self.sort_rows()
         markdown = "# Zombie Infection Chaos - Complete Story Mapping\n\n"
         markdown += f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
         markdown += f"Total Units: {len(self.merged_data)}\n\n"
@@ -99,27 +168,28 @@ class ChunkMerger:
         current_chapter = None
         
         markdown += "## Table of Contents\n\n"
-        chapters = sorted(set(row.get('chapter', 0) for row in self.merged_data))
+        # Chapter numbers restart in every book of a corpus, so group by chapter key
+        chapters = list(dict.fromkeys(StoryIndex.chapter_key(row) for row in self.merged_data
+                                      if row.get('chapter', 0) > 0))
         for ch in chapters:
-            if ch > 0:
-                ch_rows = [r for r in self.merged_data if r.get('chapter', 0) == ch]
-                ch_title = next((r['Raw Sentence'] for r in ch_rows if r.get('type') == 'chapter_header'), f"Chapter {ch}")
-                markdown += f"- [{ch_title}](#chapter-{ch})\n"
+            ch_rows = [r for r in self.merged_data if StoryIndex.chapter_key(r) == ch]
+            ch_title = next((r['Raw Sentence'] for r in ch_rows if r.get('type') == 'chapter_header'), f"Chapter {ch}")
+            markdown += f"- [{ch_title}](#chapter-{str(ch).lower()})\n"
         
         markdown += "\n---\n\n"
         
         # Main content table
         for row in self.merged_data:
-            chapter = row.get('chapter', 0)
+            chapter = StoryIndex.chapter_key(row)
             
             # Add chapter header
             if chapter != current_chapter:
                 current_chapter = chapter
-                if chapter > 0:
+                if row.get('chapter', 0) > 0:
                     markdown += f"\n## Chapter {chapter}\n\n"
                     # Find chapter title
                     ch_title = next((r['Raw Sentence'] for r in self.merged_data 
-                                   if r.get('chapter') == chapter and r.get('type') == 'chapter_header'), '')
+                                   if StoryIndex.chapter_key(r) == chapter and r.get('type') == 'chapter_header'), '')
                     if ch_title:
                         markdown += f"**{ch_title}**\n\n"
                     
@@ -146,6 +216,7 @@ class ChunkMerger:
     
     def generate_csv_mapping(self) -> str:
         """Generate the master mapping in CSV format"""
+        self.sort_rows()
         output = []
         
         # Headers
@@ -173,23 +244,33 @@ class ChunkMerger:
         
         return headers, output
     
-    def save_mappings(self, output_prefix: str = "mapping"):
-        """Save mappings in multiple formats"""
+    def save_mappings(self, output_prefix: str = "mapping", verbose: bool = True):
+        """
+        Save mappings in multiple formats
+        
+        Each file is written to a temporary name and renamed into place, so
+        readers never see a half-written mapping while a run updates it.
+        """
+        self.sort_rows()
         # Save as Markdown
         markdown_content = self.generate_markdown_mapping()
         markdown_file = f"{output_prefix}.md"
-        with open(markdown_file, 'w', encoding='utf-8') as f:
+        with open(f"{markdown_file}.tmp", 'w', encoding='utf-8') as f:
             f.write(markdown_content)
-        print(f"✓ Saved Markdown mapping to {markdown_file}")
+        os.replace(f"{markdown_file}.tmp", markdown_file)
+        if verbose:
+            print(f"✓ Saved Markdown mapping to {markdown_file}")
         
         # Save as CSV
         headers, csv_data = self.generate_csv_mapping()
         csv_file = f"{output_prefix}.csv"
-        with open(csv_file, 'w', encoding='utf-8', newline='') as f:
+        with open(f"{csv_file}.tmp", 'w', encoding='utf-8', newline='') as f:
             writer = csv.writer(f)
             writer.writerow(headers)
             writer.writerows(csv_data)
-        print(f"✓ Saved CSV mapping to {csv_file}")
+        os.replace(f"{csv_file}.tmp", csv_file)
+        if verbose:
+            print(f"✓ Saved CSV mapping to {csv_file}")
         
         # Save as JSON (structured data)
         json_file = f"{output_prefix}.json"
@@ -203,9 +284,11 @@ class ChunkMerger:
             "mapping": self.merged_data,
             "statistics": self.generate_statistics()
         }
-        with open(json_file, 'w', encoding='utf-8') as f:
+        with open(f"{json_file}.tmp", 'w', encoding='utf-8') as f:
             json.dump(json_data, f, indent=2, ensure_ascii=False)
-        print(f"✓ Saved JSON mapping to {json_file}")
+        os.replace(f"{json_file}.tmp", json_file)
+        if verbose:
+            print(f"✓ Saved JSON mapping to {json_file}")
     
     def generate_statistics(self) -> Dict[str, Any]:
         """Generate mapping statistics"""
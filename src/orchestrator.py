@@ -6,10 +6,13 @@ Coordinates the entire pipeline from ingestion to final mapping
 
 import json
 import os
+import queue
 import sys
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterable, List, Optional, Callable
 from datetime import datetime
 import subprocess
 import argparse
@@ -17,17 +20,108 @@ import ollama
 
 # Import our modules
 from ingest import StoryIngestor
-from chunk_dispatcher import ChunkDispatcher
-from verifier import MappingVerifier
+from corpus_ingest import CorpusIngestor, corpus_files
+from incremental_ingest import IncrementalIngestor, load_changed_uids
+from story_store import StoryStore
+from chunk_dispatcher import (ChunkDispatcher, mapping_instructions, estimate_tokens, prompt_overhead_tokens,
+                              batch_aliases, DEFAULT_CONTEXT_SIZE)
+from verifier import MappingVerifier, StreamingTableParser
 from merge_chunks import ChunkMerger
+from rate_limiter import AdaptiveRateLimiter
+from endpoint_pool import EndpointPool
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from llm_cache import ResponseCache
+from run_journal import RunJournal, batch_units_digest
+from run_metrics import RunMetrics, ollama_counters
+from story_index import StoryIndex
+from stage_fingerprints import StageFingerprints, code_digest, file_digest
+
+
+# Extraction guidance appended to the mapping instructions in the system message
+ANALYSIS_REQUIREMENTS = """CRITICAL ANALYSIS REQUIREMENTS:
+- Characters: Only extract actual character names (people, beings, entities with names)
+- Locations: Only extract specific place names, buildings, geographic locations
+- Key Items/Concepts: Extract important objects, abilities, technologies, abstract concepts
+- Narrative Purpose: Be concise but specific about the story function
+- Links: Reference UIDs that are thematically or narratively connected
+
+EXAMPLES OF GOOD EXTRACTION:
+- Characters: "Jake", "Maya", "Zeldina", "Dr. Sarah" (NOT "Steam", "Chapter", "Complete")
+- Locations: "Nexus Prime Factory", "Sewers", "Crystal Falls" (NOT random words)
+- Key Items: "Reality Orbs", "Frostbane Cannon", "The Cube", "Portal"
+
+Be accurate and only extract meaningful story elements."""
+
+
+# Tokens a chat template may wrap around the system message (role markers, BOS, separators)
+CHAT_TEMPLATE_TOKENS = 64
+
+
+def pinned_prefix_tokens(system_prompt: str) -> int:
+    """
+    Padded token count of the system message for Ollama's num_keep
+    
+    estimate_tokens() counts words, which undercounts Markdown headers and
+    dash separators; three characters per token covers those, and the chat
+    template's own tokens are added on top. Pinning a few tokens of the user
+    message too is harmless, pinning too few lets the prefix shift out.
+    """
+    return max(estimate_tokens(system_prompt), -(-len(system_prompt) // 3)) + CHAT_TEMPLATE_TOKENS
+
+
+class LLMCallInterrupted(RuntimeError):
+    """An in-flight LLM call was stopped because the run was cancelled or a deadline passed"""
+    
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason  # "cancelled" or "timed_out"
 
 
 class MappingOrchestrator:
+    # Sampling options sent with every Ollama request
+    llm_options = {
+        'temperature': 0.1,  # Low temperature for consistent extraction
+        'top_p': 0.9,
+        'repeat_penalty': 1.1
+    }
+    
     def __init__(self, 
                  story_file: str = "zombie_story.txt",
                  batch_size: int = 15,
                  use_mock_llm: bool = False,
-                 model_name: str = "qwen2.5:72b"):
+                 model_name: str = "qwen2.5:72b",
+                 concurrency: int = 1,
+                 initial_rate: float = 2.0,
+                 max_rate: float = 20.0,
+                 use_cache: bool = True,
+                 cache_dir: str = ".llm_cache",
+                 cache_size_mb: int = 512,
+                 resume: bool = False,
+                 repair_retries: int = 2,
+                 stream: bool = False,
+                 on_row: Optional[Callable] = None,
+                 story_index: Optional[StoryIndex] = None,
+                 pack_mode: str = "units",
+                 context_size: Optional[int] = None,
+                 respect_chapters: bool = False,
+                 keep_alive: Optional[str] = None,
+                 pin_prefix: bool = False,
+                 output_format: str = "markdown",
+                 prompt_mode: str = "echo",
+                 uid_aliases: bool = False,
+                 ollama_hosts: Optional[List[str]] = None,
+                 max_in_flight: int = 1,
+                 probe_interval: float = 10.0,
+                 failure_threshold: int = 3,
+                 circuit_cooldown: float = 5.0,
+                 mock_fallback: bool = False,
+                 cascade_models: Optional[List[str]] = None,
+                 request_timeout: Optional[float] = None,
+                 run_timeout: Optional[float] = None,
+                 partial_interval: float = 30.0,
+                 skip_unchanged: bool = True,
+                 incremental: bool = False,
+                 text_store: bool = False):
         """
         Initialize the orchestrator
         
@@ -36,94 +130,406 @@ class MappingOrchestrator:
             batch_size: Number of sentences per batch
             use_mock_llm: Use mock LLM for testing (False by default)
             model_name: Ollama model to use for analysis
+            concurrency: Number of batches kept in flight at once (1 = sequential)
+            initial_rate: Starting LLM request rate (requests/sec) for the adaptive limiter
+            max_rate: Ceiling for the adaptive request rate
+            use_cache: Reuse responses for identical (model, options, prompt) requests
+            cache_dir: Directory of the on-disk response cache
+            cache_size_mb: Cache size above which least recently used responses are evicted
+            resume: Skip batches whose existing result is accepted and matches the current units
+            repair_retries: Re-prompts allowed per rejected batch for just its failed UIDs (0 disables)
+            stream: Stream responses, parsing rows as they arrive and stopping off-script generations
+            on_row: Called as on_row(batch_id, row) for each streamed row as soon as it is parsed
+            story_index: Shared index over story.json; loaded on first use if omitted
+            pack_mode: "units" for fixed-size batches, "tokens" to fill batches up to token budgets
+            context_size: Model context window in tokens; sets Ollama's num_ctx and the packing budgets
+                (8192 when pack_mode is "tokens" and none is given)
+            respect_chapters: Never let a batch span two chapters
+            keep_alive: How long Ollama keeps the model (and its prompt cache) loaded between calls, e.g. "30m"
+            pin_prefix: Keep the system prompt's tokens (num_keep, a padded estimate) when Ollama shifts a full context
+            output_format: "markdown" table responses, or "json" rows constrained by Ollama's schema `format`
+            prompt_mode: "echo" has the model copy each sentence into Raw Sentence; "uid" asks only
+                for annotations per UID and the text is filled in from story.json at merge time
+            uid_aliases: Label units with short per-batch aliases (1, 2, ...) instead of full UIDs
+            ollama_hosts: Ollama servers to balance calls across ("URL" or "URL=max in flight");
+                the default host of the ollama package when omitted
+            max_in_flight: Requests each server may have outstanding unless its URL sets its own
+            probe_interval: Seconds between health probes that eject and readmit servers
+            failure_threshold: Consecutive failed LLM calls that open the circuit breaker
+            circuit_cooldown: Seconds batches fail fast after the first trip before the LLM is probed
+                again (doubles after every failed probe)
+            mock_fallback: Answer failed LLM calls with mock rows instead of failing the batch
+            cascade_models: Models ordered fastest first; each batch goes to the first one and only
+                rejected or warning-level batches move on to the next (replaces model_name)
+            request_timeout: Seconds one LLM call may take before it is dropped and its batch marked timed out
+            run_timeout: Seconds the batch processing stage may take; in-flight calls are dropped when it passes
+            partial_interval: Seconds between rewrites of the partial mapping.* outputs during a run (0 disables)
+            skip_unchanged: Skip pipeline stages whose inputs and settings match their last completed run
+            incremental: Re-ingest a revised story against the previous story.json, keeping the UIDs
+                of unchanged text, and reuse earlier rows for batches that don't touch the change set
+            text_store: Move unit texts out of story.json into the memory-mapped story.text, so
+                story.json and batch files hold only offsets into it
         """
+        if output_format not in ("markdown", "json"):
+            raise ValueError(f"Unknown output format: {output_format}")
+        if prompt_mode not in ("echo", "uid"):
+            raise ValueError(f"Unknown prompt mode: {prompt_mode}")
+        
         self.story_file = story_file
         self.batch_size = batch_size
         self.use_mock_llm = use_mock_llm
-        self.model_name = model_name
+        # A single model is a one-step cascade
+        self.models = list(cascade_models) if cascade_models else [model_name]
+        self.model_name = self.models[-1]
+        self.concurrency = max(1, concurrency)
+        self.rate_limiter = AdaptiveRateLimiter(
+            initial_rate=initial_rate,
+            max_rate=max_rate,
+            burst=self.concurrency
+        )
+        # Held for the length of every LLM call, repairs and escalations from the
+        # verify workers included, so no more than `concurrency` calls run at once
+        self._call_slots = threading.Semaphore(self.concurrency)
+        self.request_timeout = request_timeout
+        self.run_timeout = run_timeout
+        self.partial_interval = partial_interval
+        self._run_deadline: Optional[float] = None
+        self._cancel_event = threading.Event()
+        self._cancel_reason = "cancelled"
+        # The module-level client has no timeout, so a hung server would block forever
+        self.ollama_client = ollama.Client(timeout=request_timeout) if request_timeout else None
+        self.endpoint_pool = None
+        if ollama_hosts and not use_mock_llm:
+            self.endpoint_pool = EndpointPool(ollama_hosts, max_in_flight=max_in_flight,
+                                              probe_interval=probe_interval, request_timeout=request_timeout)
+        self.circuit_breaker = CircuitBreaker(failure_threshold=failure_threshold, cooldown=circuit_cooldown)
+        self.mock_fallback = mock_fallback
+        self.response_cache = (ResponseCache(cache_dir, cache_size_mb * 1024 * 1024)
+                               if use_cache and not use_mock_llm else None)
         self.results_dir = Path("results")
         self.results_dir.mkdir(exist_ok=True)
+        self.resume = resume
+        self.repair_retries = max(0, repair_retries)
+        self.output_format = output_format
+        self.echo_text = prompt_mode == "echo"
+        self.response_columns = MappingVerifier.row_columns(self.echo_text)
+        self.uid_aliases = uid_aliases
+        # Identical for every batch, so Ollama can reuse its evaluated KV cache
+        # for this prefix while the model stays loaded
+        self.system_prompt = (f"You are an expert literary analyst. "
+                              f"{mapping_instructions(output_format, self.echo_text)}\n\n{ANALYSIS_REQUIREMENTS}")
+        self.response_format = None
+        if output_format == "json":
+            self.response_format = MappingVerifier.json_schema(self.echo_text)
+            if stream:
+                print("⚠ Streaming row parsing needs Markdown output; --stream is ignored with --format json")
+                stream = False
+        self.stream = stream
+        self.on_row = on_row
+        # Per-thread details of the most recent LLM call, read back by process_batch
+        self._call_info = threading.local()
+        self.metrics = RunMetrics()
+        self._story_index = story_index
+        self._story_index_lock = threading.Lock()
+        self.pack_mode = pack_mode
+        if pack_mode == "tokens" and not context_size:
+            # Batches are packed to a window, so Ollama must be given that window too
+            context_size = DEFAULT_CONTEXT_SIZE
+        self.context_size = context_size
+        # What the packer reserves per request for the system prompt and prompt framing
+        self.prompt_overhead = prompt_overhead_tokens(self.system_prompt)
+        self.respect_chapters = respect_chapters
+        if context_size:
+            # Without num_ctx Ollama silently truncates prompts to its default window
+            self.llm_options = {**self.llm_options, 'num_ctx': context_size}
+        self.keep_alive = keep_alive
+        if pin_prefix:
+            self.llm_options = {**self.llm_options, 'num_keep': pinned_prefix_tokens(self.system_prompt)}
+        self.journal = RunJournal(str(self.results_dir / "journal.jsonl"))
+        self.skip_unchanged = skip_unchanged
+        self.stage_state = StageFingerprints("pipeline_state.json")
+        self.incremental = incremental
+        self.text_store = text_store
+        # Accepted rows of earlier runs by UID, reused for batches outside the change set
+        self.prior_rows: Dict[str, Dict[str, Any]] = {}
+        self.process_settings: Optional[str] = None
+        self._journal_events: Dict[str, Dict[str, Any]] = {}
         
         self.stats = {
             "start_time": datetime.now(),
             "batches_total": 0,
             "batches_processed": 0,
             "batches_failed": 0,
+            "batches_resumed": 0,
+            "batches_reused": 0,
+            "batches_unavailable": 0,
+            "batches_cancelled": 0,
+            "batches_timed_out": 0,
+            "batches_repaired": 0,
+            "units_repaired": 0,
+            "streams_aborted": 0,
             "total_units": 0,
-            "units_verified": 0
+            "units_verified": 0,
+            "units_covered": 0,
+            "stages_skipped": [],
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "rate_limit": self.rate_limiter.snapshot(),
+            "endpoints": self.endpoint_pool.snapshot() if self.endpoint_pool else [],
+            "circuit": self.circuit_breaker.snapshot(),
+            "cascade": {model: {"batches": 0, "accepted": 0, "wall_seconds": 0.0} for model in self.models}
         }
+        # process_batch may run on several worker threads at once
+        self._stats_lock = threading.Lock()
+    
+    @property
+    def story_index(self) -> StoryIndex:
+        """Index over story.json, parsed once and shared by every batch"""
+        if self._story_index is None:
+            with self._story_index_lock:
+                if self._story_index is None:
+                    self._story_index = StoryIndex.load("story.json")
+        return self._story_index
+    
+    @story_index.setter
+    def story_index(self, index: StoryIndex):
+        self._story_index = index
+    
+    def build_llm_messages(self, batch: Dict[str, Any]) -> List[Dict[str, str]]:
+        """Chat messages sent to Ollama for a batch: the fixed system prompt, then the batch's units"""
+        return [
+            {
+                'role': 'system',
+                'content': self.system_prompt
+            },
+            {
+                'role': 'user',
+                'content': batch['prompt']
+            }
+        ]
     
-    def real_llm_process(self, batch: Dict[str, Any]) -> str:
+    def llm_cache_key(self, batch: Dict[str, Any], model: Optional[str] = None) -> str:
+        """Cache key identifying the exact request real_llm_process sends for a batch"""
+        return ResponseCache.make_key(model or self.model_name, self.llm_options, self.build_llm_messages(batch))
+    
+    def record_ollama_counters(self, response: Dict[str, Any]):
+        """Keep Ollama's timing and token counters for the current call"""
+        self._call_info.counters = ollama_counters(response)
+    
+    def cancel(self, reason: str = "cancelled"):
+        """Stop scheduling batches and drop in-flight LLM calls at their next streamed chunk"""
+        self._cancel_reason = reason
+        self._cancel_event.set()
+    
+    @property
+    def cancelled(self) -> bool:
+        """Whether the run was cancelled or its deadline has passed"""
+        if self._run_deadline is not None and time.monotonic() >= self._run_deadline:
+            self.cancel("timed_out")
+        return self._cancel_event.is_set()
+    
+    def check_interrupted(self, deadline: Optional[float] = None):
+        """Raise LLMCallInterrupted if the run was cancelled or the call's deadline has passed"""
+        if self.cancelled:
+            message = "run deadline passed" if self._cancel_reason == "timed_out" else "run cancelled"
+            raise LLMCallInterrupted(self._cancel_reason, message)
+        if deadline is not None and time.monotonic() >= deadline:
+            raise LLMCallInterrupted("timed_out", f"no complete response within {self.request_timeout}s")
+    
+    def real_llm_process(self, batch: Dict[str, Any], model: Optional[str] = None) -> str:
         """Process batch using real LLM (Ollama)"""
-        # Create the prompt
-        prompt = batch['prompt']
+        model = model or self.model_name
+        messages = self.build_llm_messages(batch)
         
-        # Add specific instructions for better analysis
-        enhanced_prompt = f"""You are an expert literary analyst. {prompt}
-
-CRITICAL ANALYSIS REQUIREMENTS:
-- Characters: Only extract actual character names (people, beings, entities with names)
-- Locations: Only extract specific place names, buildings, geographic locations
-- Key Items/Concepts: Extract important objects, abilities, technologies, abstract concepts
-- Narrative Purpose: Be concise but specific about the story function
-- Links: Reference UIDs that are thematically or narratively connected
-
-EXAMPLES OF GOOD EXTRACTION:
-- Characters: "Jake", "Maya", "Zeldina", "Dr. Sarah" (NOT "Steam", "Chapter", "Complete")
-- Locations: "Nexus Prime Factory", "Sewers", "Crystal Falls" (NOT random words)
-- Key Items: "Reality Orbs", "Frostbane Cannon", "The Cube", "Portal"
-
-Be accurate and only extract meaningful story elements."""
-
+        cache_key = None
+        if self.response_cache:
+            cache_key = ResponseCache.make_key(model, self.llm_options, messages)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                self._call_info.source = 'cache'
+                return cached
+        
+        # Fails fast without touching the rate limiter while the backend is down
+        try:
+            probe = self.circuit_breaker.before_call()
+        except CircuitOpenError:
+            if not self.mock_fallback:
+                raise
+            self._call_info.source = 'fallback'
+            return self.mock_llm_process(batch)
+        self._call_info.queued = self.rate_limiter.acquire()
+        endpoint = None
+        call_start = time.monotonic()
         try:
+            chat = self.ollama_client.chat if self.ollama_client else ollama.chat
+            if self.endpoint_pool:
+                # Waiting for a free server is queueing too, not model latency
+                endpoint = self.endpoint_pool.acquire()
+                self._call_info.endpoint = endpoint.host
+                self._call_info.queued += time.monotonic() - call_start
+                call_start = time.monotonic()
+                chat = endpoint.client.chat
+            
             # Call Ollama
-            response = ollama.chat(
-                model=self.model_name,
-                messages=[
-                    {
-                        'role': 'user',
-                        'content': enhanced_prompt
-                    }
-                ],
-                options={
-                    'temperature': 0.1,  # Low temperature for consistent extraction
-                    'top_p': 0.9,
-                    'repeat_penalty': 1.1
-                }
-            )
+            deadline = call_start + self.request_timeout if self.request_timeout else None
+            self.check_interrupted(deadline)
+            if self.stream:
+                content = self.stream_llm_response(batch, messages, chat, model, deadline)
+            else:
+                content = self.collect_llm_response(messages, chat, model, deadline)
+            latency = time.monotonic() - call_start
+            self.rate_limiter.record_success(latency)
+            self.circuit_breaker.record_success()
+            if endpoint:
+                counters = self._call_info.counters or {}
+                self.endpoint_pool.release(endpoint, True, latency, counters.get('eval_count'))
             
-            return response['message']['content']
+            if cache_key:
+                self.response_cache.put(cache_key, content, model)
+            return content
             
+        except LLMCallInterrupted as e:
+            if e.reason == "timed_out":
+                self.rate_limiter.record_failure(timed_out=True)
+                self.circuit_breaker.record_failure()
+            elif probe:
+                # Nothing learned about the backend; let the next call probe it instead
+                self.circuit_breaker.release_probe()
+            if endpoint:
+                # A cancelled call says nothing about the server's health
+                self.endpoint_pool.release(endpoint, False if e.reason == "timed_out" else None,
+                                           time.monotonic() - call_start)
+            raise
+        
         except Exception as e:
+            timed_out = 'timeout' in type(e).__name__.lower() or 'timed out' in str(e).lower()
+            self.rate_limiter.record_failure(timed_out=timed_out)
+            self.circuit_breaker.record_failure()
+            if endpoint:
+                self.endpoint_pool.release(endpoint, False, time.monotonic() - call_start)
             print(f"Error calling Ollama: {e}")
-            # Fallback to mock if LLM fails
+            if timed_out:
+                raise LLMCallInterrupted("timed_out", str(e)) from e
+            if not self.mock_fallback:
+                raise
+            # Mock rows only when explicitly asked for; they would otherwise be accepted as real mappings
+            self._call_info.source = 'fallback'
             return self.mock_llm_process(batch)
     
-    def mock_llm_process(self, batch: Dict[str, Any]) -> str:
-        """Mock LLM processor for testing"""
-        # Generate a realistic-looking response
-        response = "| UID | Raw Sentence | Narrative Purpose | Characters | Locations | Key Items/Concepts | Links |\n"
-        response += "|-----|--------------|-------------------|------------|-----------|--------------------|---------|\n"
+    def collect_llm_response(self, messages: List[Dict[str, str]], chat: Callable,
+                             model: str, deadline: Optional[float] = None) -> str:
+        """
+        Full response text of a chat completion
+        
+        The response is read as a stream so that cancellation and deadlines
+        are noticed between chunks; closing the stream drops the connection
+        and Ollama stops generating.
+        """
+        parts = []
+        stream = chat(
+            model=model,
+            messages=messages,
+            options=self.llm_options,
+            keep_alive=self.keep_alive,
+            format=self.response_format,
+            stream=True
+        )
+        try:
+            for chunk in stream:
+                self.check_interrupted(deadline)
+                parts.append(chunk['message']['content'])
+                if chunk.get('done'):
+                    # Only the final chunk carries the evaluation counters
+                    self.record_ollama_counters(chunk)
+        finally:
+            stream.close()
+        return ''.join(parts)
+    
+    def stream_llm_response(self, batch: Dict[str, Any], messages: List[Dict[str, str]],
+                            chat: Optional[Callable] = None, model: Optional[str] = None,
+                            deadline: Optional[float] = None) -> str:
+        """
+        Stream a chat completion, parsing table rows as they arrive
+        
+        Generation is stopped as soon as the parser sees the model go
+        off-script (unknown, repeated or backwards UIDs, runaway text).
+        Closing the stream drops the HTTP connection, which makes Ollama stop
+        generating. Once every UID has a row only trailing text is left; it is
+        read but not kept, since the final chunk carries the token counters.
+        """
+        parser = StreamingTableParser(batch['units'], aliases=batch.get('uid_aliases'), story_index=self.story_index)
+        parts = []
+        start = time.monotonic()
+        first_row_seconds = None
+        
+        def emit(rows):
+            nonlocal first_row_seconds
+            for row in rows:
+                if first_row_seconds is None:
+                    first_row_seconds = time.monotonic() - start
+                if self.on_row:
+                    self.on_row(batch['batch_id'], row)
+        
+        stream = (chat or ollama.chat)(
+            model=model or self.model_name,
+            messages=messages,
+            options=self.llm_options,
+            keep_alive=self.keep_alive,
+            stream=True
+        )
+        try:
+            for chunk in stream:
+                self.check_interrupted(deadline)
+                if chunk.get('done'):
+                    # Only the final chunk carries the evaluation counters
+                    self.record_ollama_counters(chunk)
+                if parser.complete:
+                    continue
+                text = chunk['message']['content']
+                parts.append(text)
+                emit(parser.feed(text))
+                if parser.abort_reason:
+                    break
+        finally:
+            stream.close()
         
+        if not parser.abort_reason:
+            emit(parser.close())
+        else:
+            print(f"⚠ {batch['batch_id']}: stopped generation early ({parser.abort_reason})")
+            with self._stats_lock:
+                self.stats['streams_aborted'] += 1
+        
+        self._call_info.stream = {
+            "rows": len(parser.rows),
+            "first_row_seconds": round(first_row_seconds, 3) if first_row_seconds is not None else None,
+            "total_seconds": round(time.monotonic() - start, 3),
+            "stopped_complete": parser.complete,
+            "abort_reason": parser.abort_reason,
+            "mismatched_uids": parser.mismatched_uids
+        }
+        return ''.join(parts)
+    
+    def mock_rows(self, batch: Dict[str, Any]) -> List[Dict[str, str]]:
+        """Realistic-looking mapping rows for a batch, without calling a model"""
+        rows = []
         for unit in batch['units']:
-            uid = unit['uid']
-            text = unit['text'].replace('|', '\\|')
-            
+            text = self.story_index.unit_text(unit)
             # Simple analysis
             purpose = "Establishes setting" if unit['paragraph'] == 1 else "Develops narrative"
             
             # Extract characters (simple name detection)
             characters = []
-            for word in unit['text'].split():
+            for word in text.split():
                 if word[0].isupper() and len(word) > 2 and word not in ['The', 'This', 'That', 'These']:
                     characters.append(word.strip('.,!?'))
             chars = ', '.join(set(characters)) if characters else 'N/A'
             
             # Extract locations
             locations = []
-            if 'factory' in unit['text'].lower():
+            if 'factory' in text.lower():
                 locations.append('Factory')
-            if 'city' in unit['text'].lower():
+            if 'city' in text.lower():
                 locations.append('City')
             locs = ', '.join(locations) if locations else 'N/A'
             
@@ -131,62 +537,635 @@ Be accurate and only extract meaningful story elements."""
             items = []
             keywords = ['zombie', 'orb', 'void', 'crystal', 'weapon', 'shield']
             for kw in keywords:
-                if kw in unit['text'].lower():
+                if kw in text.lower():
                     items.append(kw.capitalize())
             items_str = ', '.join(items) if items else 'N/A'
             
             # Links (simple - link to next UID if sequential)
             links = 'N/A'
             
-            response += f"| {uid} | {text} | {purpose} | {chars} | {locs} | {items_str} | {links} |\n"
+            rows.append({
+                "UID": unit['uid'],
+                "Raw Sentence": text,
+                "Narrative Purpose": purpose,
+                "Characters": chars,
+                "Locations": locs,
+                "Key Items/Concepts": items_str,
+                "Links": links
+            })
+        return rows
+    
+    def mock_llm_process(self, batch: Dict[str, Any]) -> str:
+        """Mock LLM processor for testing"""
+        rows = self.mock_rows(batch)
+        # Answer with the labels the prompt used, like a real model would
+        uid_to_alias = {uid: alias for alias, uid in (batch.get('uid_aliases') or {}).items()}
+        for row in rows:
+            row['UID'] = uid_to_alias.get(row['UID'], row['UID'])
+            if not self.echo_text:
+                del row['Raw Sentence']
+        if self.output_format == "json":
+            return json.dumps({"rows": rows}, ensure_ascii=False)
+        
+        # Generate a realistic-looking response
+        response = "| " + " | ".join(self.response_columns) + " |\n"
+        response += "|" + "|".join("-" * (len(column) + 2) for column in self.response_columns) + "|\n"
+        
+        for row in rows:
+            cells = [row[column].replace('|', '\\|') for column in self.response_columns]
+            response += "| " + " | ".join(cells) + " |\n"
         
         return response
-
+    
+    def parse_llm_response(self, verifier: MappingVerifier, response: str) -> List[Dict[str, str]]:
+        """Rows of an LLM response in the configured output format"""
+        if self.output_format == "json":
+            return verifier.parse_json_rows(response)
+        return verifier.parse_markdown_table(response)
+    
+    @staticmethod
+    def confidence(recommendation: str) -> int:
+        """Rank of a verification recommendation: 2 accept, 1 accept with warnings, 0 reject"""
+        if recommendation.startswith('ACCEPT_WITH_WARNINGS'):
+            return 1
+        return 2 if recommendation.startswith('ACCEPT') else 0
+    
+    def run_model(self, batch: Dict[str, Any], model: str,
+                  first_call: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Send a batch to one model, verify the response and repair its failed rows
+        
+        Args:
+            first_call: Response already fetched from this model by start_batch, if any
+        """
+        start = time.monotonic()
+        if first_call is not None:
+            llm_response = first_call['llm_response']
+            stream_info = first_call['llm_stream']
+            start -= first_call['wall_seconds']
+        else:
+            llm_response = self.call_llm(batch, model=model)
+            stream_info = getattr(self._call_info, 'stream', None)
+        
+        # Verify the response
+        verifier = MappingVerifier(batch_data=batch, story_index=self.story_index,
+                                   echo_text=self.echo_text)
+        parsed_rows = self.parse_llm_response(verifier, llm_response)
+        verification_report = verifier.generate_report(parsed_rows, llm_response)
+        
+        # Regenerate only the rows that failed instead of discarding the batch
+        repair = None
+        if not verification_report['recommendation'].startswith('ACCEPT') and self.repair_retries:
+            parsed_rows, verification_report, repair = self.repair_batch(
+                batch, verifier, parsed_rows, verification_report, model)
+        
+        return {
+            "model": model,
+            "llm_response": llm_response,
+            "parsed_rows": parsed_rows,
+            "verification": verification_report,
+            "repair": repair,
+            "llm_stream": stream_info,
+            "wall_seconds": time.monotonic() - start
+        }
+    
     def process_batch(self, batch: Dict[str, Any]) -> Dict[str, Any]:
         """Process a single batch through LLM and verification"""
-        batch_id = batch['batch_id']
-        print(f"\nProcessing {batch_id}...")
+        return self.finish_batch(self.start_batch(batch))
+    
+    def start_batch(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        First stage of a batch: journal it and fetch the first model's response
+        
+        Returns:
+            Pending batch for finish_batch, carrying the response (or the error) and call telemetry
+        """
+        units_digest = batch_units_digest(batch['units'])
+        print(f"\nProcessing {batch['batch_id']}...")
+        
+        self.journal.record("started", batch['batch_id'], units_digest)
+        self._call_info.calls = []
+        pending = {
+            "batch": batch,
+            "units_digest": units_digest,
+            "calls": self._call_info.calls,
+            "first_call": None,
+            "error": None
+        }
+        start = time.monotonic()
+        try:
+            llm_response = self.call_llm(batch, model=self.models[0])
+            pending['first_call'] = {
+                "llm_response": llm_response,
+                "llm_stream": getattr(self._call_info, 'stream', None),
+                "wall_seconds": time.monotonic() - start
+            }
+        except Exception as e:
+            pending['error'] = e
+        return pending
+    
+    def finish_batch(self, pending: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Second stage of a batch: verify, repair or escalate, then write and journal the result
         
+        May run on a different thread than start_batch; repair and cascade
+        calls are recorded with the calls the first stage made.
+        """
+        batch = pending['batch']
+        batch_id = batch['batch_id']
+        units_digest = pending['units_digest']
+        self._call_info.calls = pending['calls']
         try:
-            # Get LLM response
-            if self.use_mock_llm:
-                llm_response = self.mock_llm_process(batch)
-            else:
-                llm_response = self.real_llm_process(batch)
+            if pending['error'] is not None:
+                raise pending['error']
             
-            # Verify the response
-            batch_file = Path("batches") / f"{batch_id}.json"
-            verifier = MappingVerifier(str(batch_file))
-            parsed_rows = verifier.parse_markdown_table(llm_response)
-            verification_report = verifier.generate_report(parsed_rows, llm_response)
+            # Cascade: stop at the first model whose rows pass cleanly, otherwise
+            # keep the most confident attempt of all models tried
+            best = None
+            attempts = []
+            for tier, model in enumerate(self.models):
+                attempt = self.run_model(batch, model, pending['first_call'] if tier == 0 else None)
+                recommendation = attempt['verification']['recommendation']
+                confidence = self.confidence(recommendation)
+                attempts.append({
+                    "model": model,
+                    "recommendation": recommendation,
+                    "wall_seconds": round(attempt['wall_seconds'], 4)
+                })
+                with self._stats_lock:
+                    tier_stats = self.stats['cascade'][model]
+                    tier_stats['batches'] += 1
+                    tier_stats['wall_seconds'] += attempt['wall_seconds']
+                    if confidence == 2:
+                        tier_stats['accepted'] += 1
+                
+                if best is None or confidence > self.confidence(best['verification']['recommendation']):
+                    best = attempt
+                if confidence == 2:
+                    break
+                if tier + 1 < len(self.models):
+                    print(f"↻ {batch_id}: {model} gave {recommendation.split(':')[0]}, "
+                          f"escalating to {self.models[tier + 1]}")
+                    # Don't replay this model's answer next run either
+                    if self.response_cache:
+                        self.response_cache.invalidate(self.llm_cache_key(batch, model))
+            
+            llm_response = best['llm_response']
+            parsed_rows = best['parsed_rows']
+            verification_report = best['verification']
             
             # Save result
             result = {
                 "batch_id": batch_id,
                 "processed_at": datetime.now().isoformat(),
+                "model": best['model'],
                 "llm_response": llm_response,
                 "parsed_rows": parsed_rows,
-                "verification": verification_report
+                "verification": verification_report,
+                "repair": best['repair'],
+                "llm_stream": best['llm_stream'],
+                "cascade": attempts if len(self.models) > 1 else None,
+                "llm_telemetry": {
+                    "calls": self._call_info.calls,
+                    "retries": sum(1 for call in self._call_info.calls if call['retry']),
+                    "wall_seconds": round(sum(call['wall_seconds'] for call in self._call_info.calls), 4)
+                },
+                "units_digest": units_digest,
+                "unit_hashes": {unit['uid']: unit['hash'] for unit in batch['units']},
+                "process_settings": self.process_settings
             }
             
-            result_file = self.results_dir / f"{batch_id}.json"
-            with open(result_file, 'w', encoding='utf-8') as f:
-                json.dump(result, f, indent=2, ensure_ascii=False)
+            self._write_result(batch_id, result)
+            self.journal.record("completed", batch_id, units_digest,
+                                recommendation=verification_report['recommendation'])
             
             # Update stats
             if verification_report['recommendation'].startswith('ACCEPT'):
-                self.stats['units_verified'] += len(parsed_rows)
+                with self._stats_lock:
+                    self.stats['units_verified'] += len(parsed_rows)
                 print(f"✓ {batch_id} processed successfully ({len(parsed_rows)} units)")
             else:
-                self.stats['batches_failed'] += 1
+                with self._stats_lock:
+                    self.stats['batches_failed'] += 1
                 print(f"✗ {batch_id} failed verification: {verification_report['recommendation']}")
+                # Don't replay a rejected response on the next run
+                if self.response_cache:
+                    self.response_cache.invalidate(self.llm_cache_key(batch, best['model']))
             
             return result
             
+        except LLMCallInterrupted as e:
+            print(f"✗ {batch_id} {e.reason.replace('_', ' ')}: {e}")
+            # Leave a marker result: the merger skips it and a resumed run redoes the batch
+            self._write_result(batch_id, {
+                "batch_id": batch_id,
+                "processed_at": datetime.now().isoformat(),
+                "status": e.reason,
+                "parsed_rows": [],
+                "verification": {"recommendation": f"{e.reason.upper()}: {e}"},
+                "llm_telemetry": {
+                    "calls": self._call_info.calls,
+                    "retries": sum(1 for call in self._call_info.calls if call['retry']),
+                    "wall_seconds": round(sum(call['wall_seconds'] for call in self._call_info.calls), 4)
+                },
+                "units_digest": units_digest,
+                "unit_hashes": {unit['uid']: unit['hash'] for unit in batch['units']}
+            })
+            self.journal.record(e.reason, batch_id, units_digest, error=str(e))
+            with self._stats_lock:
+                self.stats['batches_failed'] += 1
+                self.stats[f'batches_{e.reason}'] += 1
+            return None
+            
         except Exception as e:
             print(f"✗ Error processing {batch_id}: {str(e)}")
-            self.stats['batches_failed'] += 1
+            self.journal.record("failed", batch_id, units_digest, error=str(e),
+                                circuit_open=isinstance(e, CircuitOpenError))
+            with self._stats_lock:
+                self.stats['batches_failed'] += 1
+                if isinstance(e, CircuitOpenError):
+                    self.stats['batches_unavailable'] += 1
+            return None
+    
+    def call_llm(self, batch: Dict[str, Any], retry: bool = False, model: Optional[str] = None) -> str:
+        """Send a batch to the configured LLM (or the given cascade model) and record the call's telemetry"""
+        self._call_info.stream = None
+        self._call_info.counters = None
+        self._call_info.source = 'mock' if self.use_mock_llm else 'ollama'
+        self._call_info.queued = 0.0
+        self._call_info.endpoint = None
+        self._call_info.model = model or self.model_name
+        
+        start = time.monotonic()
+        while not self._call_slots.acquire(timeout=0.1):
+            self.check_interrupted()
+        # Waiting for a call slot is client-side queueing, like the rate limiter
+        slot_wait = time.monotonic() - start
+        try:
+            if self.use_mock_llm:
+                response = self.mock_llm_process(batch)
+            else:
+                response = self.real_llm_process(batch, model)
+        except CircuitOpenError:
+            self._call_info.source = 'circuit_open'
+            raise
+        except LLMCallInterrupted as e:
+            self._call_info.source = e.reason
+            raise
+        except Exception:
+            self._call_info.source = 'error'
+            raise
+        finally:
+            self._call_slots.release()
+            self._call_info.queued += slot_wait
+            self._record_call(batch, retry, start)
+        return response
+    
+    def _record_call(self, batch: Dict[str, Any], retry: bool, start: float):
+        """Record the telemetry of the call call_llm just made, whether or not it succeeded"""
+        # Time spent waiting on the rate limiter is client-side queueing, not model latency
+        queued = self._call_info.queued
+        call = {
+            "request_id": batch['batch_id'],
+            "model": self._call_info.model,
+            "source": self._call_info.source,
+            "retry": retry,
+            "wall_seconds": round(time.monotonic() - start - queued, 4),
+            "queued_seconds": round(queued, 4),
+            "endpoint": self._call_info.endpoint,
+            **(self._call_info.counters or {})
+        }
+        self.metrics.record(call)
+        # process_batch collects the calls made for its batch, repairs included
+        batch_calls = getattr(self._call_info, 'calls', None)
+        if batch_calls is not None:
+            batch_calls.append(call)
+    
+    def repair_batch(self,
+                     batch: Dict[str, Any],
+                     verifier: MappingVerifier,
+                     parsed_rows: List[Dict[str, str]],
+                     verification_report: Dict[str, Any],
+                     model: Optional[str] = None):
+        """
+        Re-prompt only the UIDs of a rejected batch that failed verification
+        
+        Rows that verify on their own are kept; a smaller prompt holding just
+        the failed UIDs is sent up to `self.repair_retries` times and the new
+        rows are spliced back in before the whole batch is verified again.
+        
+        Returns:
+            (parsed rows, verification report, repair summary)
+        """
+        batch_id = batch['batch_id']
+        units_by_uid = {unit['uid']: unit for unit in batch['units']}
+        repair = {"attempts": 0, "repaired_uids": [], "responses": []}
+        
+        for attempt in range(1, self.repair_retries + 1):
+            kept_rows, failed_uids = verifier.split_verified_rows(parsed_rows)
+            if not failed_uids:
+                break
+            
+            repair_units = [units_by_uid[uid] for uid in failed_uids]
+            repair_request = {
+                "batch_id": f"{batch_id}_REPAIR{attempt}",
+                "units": repair_units,
+                "prompt": ChunkDispatcher.generate_prompt(repair_units, self.uid_aliases,
+                                                          [self.story_index.unit_text(unit) for unit in repair_units],
+                                                          self.echo_text)
+            }
+            if self.uid_aliases:
+                # The repair prompt numbers its own units, so its rows map back through its own table
+                repair_request["uid_aliases"] = batch_aliases(repair_units)
+            repair_verifier = MappingVerifier(batch_data=repair_request, story_index=self.story_index,
+                                              echo_text=self.echo_text)
+            print(f"↻ {batch_id}: re-prompting {len(failed_uids)} failed UIDs "
+                  f"(attempt {attempt}/{self.repair_retries})")
+            
+            repair_response = self.call_llm(repair_request, retry=True, model=model)
+            repair['attempts'] = attempt
+            repair['responses'].append(repair_response)
+            
+            # Splice retried rows in, keeping the first row the model gave for each failed UID
+            rows_by_uid = {row['UID']: row for row in kept_rows}
+            for row in self.parse_llm_response(repair_verifier, repair_response):
+                uid = row.get('UID', '')
+                if uid in failed_uids and uid not in rows_by_uid:
+                    rows_by_uid[uid] = row
+            parsed_rows = [rows_by_uid[unit['uid']] for unit in batch['units'] if unit['uid'] in rows_by_uid]
+            
+            verifier = MappingVerifier(batch_data=batch, story_index=self.story_index,
+                                       echo_text=self.echo_text)
+            verification_report = verifier.generate_report(parsed_rows, repair_response)
+            if verification_report['recommendation'].startswith('ACCEPT'):
+                repair['repaired_uids'] = failed_uids
+                with self._stats_lock:
+                    self.stats['batches_repaired'] += 1
+                    self.stats['units_repaired'] += len(failed_uids)
+                break
+            
+            # Don't let the next attempt replay the same rejected rows
+            if self.response_cache:
+                self.response_cache.invalidate(self.llm_cache_key(repair_request, model))
+        
+        return parsed_rows, verification_report, repair
+    
+    def _write_result(self, batch_id: str, result: Dict[str, Any]):
+        """Write a batch result atomically so a crash never leaves a half-written file"""
+        result_file = self.results_dir / f"{batch_id}.json"
+        tmp_file = self.results_dir / f".{batch_id}.json.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, result_file)
+    
+    def load_accepted_result(self, batch: Dict[str, Any],
+                             journal_events: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Return the existing result for a batch if a resumed run may keep it
+        
+        A result is kept only when the journal's last event for the batch is a
+        completion, the verification accepted it, and its unit hashes still
+        match the batch being processed now.
+        """
+        batch_id = batch['batch_id']
+        event = journal_events.get(batch_id)
+        if event is not None and event['event'] != 'completed':
+            # Started but never finished (crash) or failed - redo it
+            return None
+        
+        result_file = self.results_dir / f"{batch_id}.json"
+        try:
+            with open(result_file, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        if not result.get('verification', {}).get('recommendation', '').startswith('ACCEPT'):
+            return None
+        current_hashes = {unit['uid']: unit['hash'] for unit in batch['units']}
+        if result.get('unit_hashes') != current_hashes:
+            return None
+        return result
+    
+    def _resumed_result(self, batch: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Accepted result a resumed run keeps for this batch, counted in the stats, or None"""
+        if not self.resume:
+            return None
+        kept = self.load_accepted_result(batch, self._journal_events)
+        if kept is not None:
+            with self._stats_lock:
+                self.stats['batches_resumed'] += 1
+                self.stats['batches_processed'] += 1
+                self.stats['units_verified'] += len(kept['parsed_rows'])
+        return kept
+    
+    def load_prior_rows(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Accepted rows of the existing results, by UID, for an incremental run to reuse
+        
+        Only rows produced with the current processing settings are kept, each
+        with the hash its unit had, so a row is never reused for changed text.
+        """
+        prior_rows = {}
+        for result_file in sorted(self.results_dir.glob("BATCH_*.json")):
+            try:
+                with open(result_file, 'r', encoding='utf-8') as f:
+                    result = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if (result.get('process_settings') != self.process_settings
+                    or not result.get('verification', {}).get('recommendation', '').startswith('ACCEPT')):
+                continue
+            unit_hashes = result.get('unit_hashes', {})
+            for row in result.get('parsed_rows', []):
+                uid = row.get('UID', '')
+                if uid in unit_hashes:
+                    prior_rows[uid] = {"row": row, "hash": unit_hashes[uid], "model": result.get('model')}
+        return prior_rows
+    
+    def _reused_result(self, batch: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Result built from earlier rows for a batch outside the change set, or None
+        
+        The rows are verified against the batch like a fresh response, and the
+        result is written and journaled as if the batch had been processed.
+        """
+        if not self.prior_rows or batch.get('touches_changes', True):
+            return None
+        prior = [self.prior_rows.get(unit['uid']) for unit in batch['units']]
+        if any(entry is None or entry['hash'] != unit['hash'] for entry, unit in zip(prior, batch['units'])):
             return None
+        
+        parsed_rows = [dict(entry['row']) for entry in prior]
+        verifier = MappingVerifier(batch_data=batch, story_index=self.story_index, echo_text=self.echo_text)
+        verification_report = verifier.generate_report(parsed_rows, "")
+        if not verification_report['recommendation'].startswith('ACCEPT'):
+            return None
+        
+        units_digest = batch_units_digest(batch['units'])
+        result = {
+            "batch_id": batch['batch_id'],
+            "processed_at": datetime.now().isoformat(),
+            "model": prior[0]['model'],
+            "llm_response": None,
+            "parsed_rows": parsed_rows,
+            "verification": verification_report,
+            "reused_rows": True,
+            "units_digest": units_digest,
+            "unit_hashes": {unit['uid']: unit['hash'] for unit in batch['units']},
+            "process_settings": self.process_settings
+        }
+        self._write_result(batch['batch_id'], result)
+        self.journal.record("completed", batch['batch_id'], units_digest,
+                            recommendation=verification_report['recommendation'])
+        with self._stats_lock:
+            self.stats['batches_reused'] += 1
+            self.stats['batches_processed'] += 1
+            self.stats['units_verified'] += len(parsed_rows)
+        print(f"↻ {batch['batch_id']} untouched by the revision, reused {len(parsed_rows)} rows")
+        return result
+    
+    def _count_processed(self):
+        """Record a finished batch and refresh the stats of the shared LLM machinery"""
+        with self._stats_lock:
+            self.stats['batches_processed'] += 1
+            self.stats['rate_limit'] = self.rate_limiter.snapshot()
+            self.stats['circuit'] = self.circuit_breaker.snapshot()
+            if self.endpoint_pool:
+                self.stats['endpoints'] = self.endpoint_pool.snapshot()
+            if self.response_cache:
+                self.stats['cache_hits'] = self.response_cache.stats['hits']
+                self.stats['cache_misses'] = self.response_cache.stats['misses']
+    
+    def process_batches(self,
+                        batches: Iterable[Dict[str, Any]],
+                        on_result: Optional[Callable] = None,
+                        should_cancel: Optional[Callable] = None,
+                        render: Optional[Callable] = None,
+                        total: Optional[int] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        Process batches in two overlapping stages joined by bounded queues
+        
+        Up to `self.concurrency` LLM workers render batches and fetch their
+        first responses (start_batch). Verification workers check those
+        responses, repair or escalate rejected ones and write the results
+        (finish_batch) while the LLM workers are already on the next batches.
+        Finished batches are handed back to the calling thread, which runs
+        `on_result` - e.g. an incremental merge - alongside both stages.
+        Batches are pulled from the iterable only as LLM slots free up, so a
+        generator of descriptors is never materialized as a list.
+        
+        Args:
+            batches: Batches, or descriptors when `render` is given
+            on_result: Called as on_result(batch, result, completed, total) in completion order
+            should_cancel: Polled before each submission; stops scheduling new batches when True
+                (cancel() also interrupts the batches already in flight)
+            render: Turns a descriptor into a full batch on the worker that processes it
+            total: Number of batches, for iterables without a length
+            
+        Returns:
+            Batch results in completion order (None for batches that errored)
+        """
+        if total is None:
+            total = len(batches)
+        if self.resume:
+            self._journal_events = self.journal.latest_events()
+        if self.run_timeout:
+            self._run_deadline = time.monotonic() + self.run_timeout
+        results = []
+        if self.endpoint_pool:
+            # Probed only while batches are processed; close() stops the prober again
+            self.endpoint_pool.start()
+        
+        # Full queues hold the stage before them back instead of piling up responses
+        verify_queue = queue.Queue(maxsize=self.concurrency)
+        done_queue = queue.Queue(maxsize=2 * self.concurrency)
+        llm_slots = threading.Semaphore(self.concurrency)
+        
+        def stop_scheduling() -> bool:
+            return self.cancelled or bool(should_cancel and should_cancel())
+        
+        def llm_stage(batch):
+            try:
+                if render:
+                    batch = render(batch)
+                kept = self._resumed_result(batch) or self._reused_result(batch)
+                if kept is not None:
+                    done_queue.put((batch, kept))
+                else:
+                    verify_queue.put(self.start_batch(batch))
+            except Exception as e:
+                print(f"✗ Error preparing {batch.get('batch_id', 'batch')}: {e}")
+                done_queue.put((batch, None))
+            finally:
+                llm_slots.release()
+        
+        def verify_stage():
+            while True:
+                pending = verify_queue.get()
+                if pending is None:
+                    return
+                try:
+                    result = self.finish_batch(pending)
+                except Exception as e:
+                    print(f"✗ Error verifying {pending['batch']['batch_id']}: {e}")
+                    result = None
+                self._count_processed()
+                done_queue.put((pending['batch'], result))
+        
+        def drain(block: bool):
+            """Pass finished batches to on_result, waiting briefly for one if block is set"""
+            while True:
+                try:
+                    batch, result = done_queue.get(block=block, timeout=0.1 if block else None)
+                except queue.Empty:
+                    return
+                results.append(result)
+                if on_result:
+                    on_result(batch, result, len(results), total)
+                block = False
+        
+        # Enough verifiers that repairs and escalations never stall the LLM stage
+        verifiers = [threading.Thread(target=verify_stage, name=f"verify-{i}", daemon=True)
+                     for i in range(self.concurrency)]
+        for verifier in verifiers:
+            verifier.start()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="llm")
+        submitted = 0
+        try:
+            try:
+                for batch in batches:
+                    if stop_scheduling():
+                        break
+                    while not llm_slots.acquire(timeout=0.1):
+                        drain(block=False)
+                    executor.submit(llm_stage, batch)
+                    submitted += 1
+                    drain(block=False)
+                
+                while len(results) < submitted:
+                    drain(block=True)
+            
+            except KeyboardInterrupt:
+                # Drop the calls still in flight instead of waiting for their generations to finish
+                self.cancel()
+                while len(results) < submitted:
+                    drain(block=True)
+                raise
+        finally:
+            executor.shutdown(wait=True)
+            for _ in verifiers:
+                verify_queue.put(None)
+            self.close()
+        
+        return results
+    
+    def close(self):
+        """Stop background work, i.e. the endpoint pool's health prober"""
+        if self.endpoint_pool:
+            self.endpoint_pool.close()
     
     def run_pipeline(self):
         """Run the complete pipeline"""
@@ -194,57 +1173,245 @@ Be accurate and only extract meaningful story elements."""
         print("ZERO-LOSS MAPPING PIPELINE")
         print("="*60)
         
+        fingerprints = self.stage_fingerprints()
+        
         # Step 1: Ingest
         print("\n[1/5] Ingesting story...")
-        if not Path("story.json").exists():
-            ingestor = StoryIngestor(self.story_file)
-            ingestor.process_story()
-            ingestor.save_to_json("story.json")
+        if self.stage_needs_run("ingest", fingerprints['ingest']):
+            self.ingest_story()
+            self.stage_state.record("ingest", fingerprints['ingest'], self.ingest_outputs())
         else:
-            print("✓ Using existing story.json")
+            self.stats['stages_skipped'].append("ingest")
+            print("✓ Story unchanged, using existing story.json")
         
         # Step 2: Create batches
         print("\n[2/5] Creating batches...")
-        dispatcher = ChunkDispatcher("story.json", self.batch_size)
-        batches = dispatcher.create_batches()
-        dispatcher.save_all_batches("batches")
+        self.story_index = StoryIndex.load("story.json")
+        dispatcher = self.create_dispatcher()
+        if self.stage_needs_run("dispatch", fingerprints['dispatch']):
+            total_batches = dispatcher.save_manifest("batches")
+            self.stage_state.record("dispatch", fingerprints['dispatch'], ["batches/manifest.json"])
+        else:
+            self.stats['stages_skipped'].append("dispatch")
+            total_batches = dispatcher.count_batches()
+            print(f"✓ Batching unchanged, using batches/manifest.json ({total_batches} batches)")
         
-        self.stats['batches_total'] = len(batches)
+        self.stats['batches_total'] = total_batches
         self.stats['total_units'] = len(dispatcher.story_data['data'])
         
         # Step 3: Process batches
-        print(f"\n[3/5] Processing {len(batches)} batches...")
-        progress_bar_width = 50
-        
-        for i, batch in enumerate(batches):
-            # Update progress
-            progress = (i + 1) / len(batches)
-            filled = int(progress_bar_width * progress)
-            bar = "█" * filled + "░" * (progress_bar_width - filled)
-            print(f"\rProgress: [{bar}] {i+1}/{len(batches)}", end="", flush=True)
+        merger = None
+        if self.stage_needs_run("process", fingerprints['process']):
+            if self.resume:
+                print("\nResuming: batches already accepted will be kept")
             
-            # Process batch
-            self.process_batch(batch)
-            self.stats['batches_processed'] += 1
+            if self.incremental:
+                self.prior_rows = self.load_prior_rows()
+                print(f"\nIncremental: {len(self.prior_rows)} earlier rows available for batches outside the change set")
             
-            # Small delay to simulate API rate limiting
-            if not self.use_mock_llm:
-                time.sleep(0.5)
-        
-        print()  # New line after progress bar
+            print(f"\n[3/5] Processing {total_batches} batches...")
+            progress_bar_width = 50
+            # Results are merged as they land, so the merge costs no time after the last batch
+            merger = ChunkMerger("results", "story.json", story_index=self.story_index)
+            last_partial_save = time.monotonic()
+            
+            def on_result(batch, result, completed, total):
+                nonlocal last_partial_save
+                if result:
+                    merger.add_result(result)
+                covered, total_units = merger.coverage()
+                self.stats['units_covered'] = covered
+                
+                progress = completed / total
+                filled = int(progress_bar_width * progress)
+                bar = "█" * filled + "░" * (progress_bar_width - filled)
+                print(f"\rProgress: [{bar}] {completed}/{total} | coverage {covered}/{total_units} "
+                      f"({covered / total_units * 100:.1f}%)", end="", flush=True)
+                
+                if (self.partial_interval and completed < total
+                        and time.monotonic() - last_partial_save >= self.partial_interval):
+                    merger.save_mappings("mapping", verbose=False)
+                    last_partial_save = time.monotonic()
+            
+            if self.concurrency > 1:
+                print(f"Running with {self.concurrency} batches in flight")
+            results = self.process_batches(dispatcher.iter_batches(), on_result=on_result,
+                                           render=lambda descriptor: dispatcher.render_batch(descriptor, "batches"),
+                                           total=total_batches)
+            
+            print()  # New line after progress bar
+            # Only a run that got every batch accepted may be skipped next time
+            if self.processing_complete(results, total_batches):
+                self.stage_state.record("process", fingerprints['process'], ["results"])
+        else:
+            self.stats['stages_skipped'].append("process")
+            print("\n[3/5] Batches and model settings unchanged, keeping results/")
         
         # Step 4: Merge results
         print("\n[4/5] Merging results...")
-        merger = ChunkMerger("results", "story.json")
-        merger.merge_all_results()
-        merger.enrich_with_metadata()
-        merger.save_mappings("mapping")
-        merger.print_summary()
+        if self.stage_needs_run("merge", fingerprints['merge']):
+            if merger is None:
+                merger = ChunkMerger("results", "story.json", story_index=self.story_index)
+                merger.merge_all_results(batch['batch_id'] for batch in dispatcher.iter_batches())
+                merger.enrich_with_metadata()
+            if merger.merge_stats['batches_processed']:
+                merger.save_mappings("mapping")
+                merger.print_summary()
+                self.stage_state.record("merge", fingerprints['merge'], ["mapping.json", "mapping.md", "mapping.csv"])
+            else:
+                print("✗ No batch produced an accepted result; nothing to merge")
+        else:
+            self.stats['stages_skipped'].append("merge")
+            print("✓ Results unchanged, keeping mapping.json, mapping.md and mapping.csv")
         
         # Step 5: Final report
         print("\n[5/5] Pipeline complete!")
+        self.metrics.save("run_metrics.json", cascade=self.cascade_summary(),
+                          stages_skipped=self.stats['stages_skipped'] or None)
         self.print_final_report()
     
+    def cascade_summary(self) -> Optional[Dict[str, Any]]:
+        """Per-model accept rates of a cascade run and the time saved over sending every batch to the last model"""
+        if len(self.models) == 1:
+            return None
+        with self._stats_lock:
+            tiers = {model: dict(self.stats['cascade'][model]) for model in self.models}
+        
+        models = {}
+        for model, tier in tiers.items():
+            models[model] = {
+                "batches": tier['batches'],
+                "accepted": tier['accepted'],
+                "accept_rate": round(tier['accepted'] / tier['batches'], 4) if tier['batches'] else None,
+                "wall_seconds": round(tier['wall_seconds'], 3)
+            }
+        
+        # Estimate: every batch would have cost the largest model that actually ran its observed
+        # mean batch time (the last model only sees the hard batches, so this is conservative)
+        reference = next((model for model in reversed(self.models) if tiers[model]['batches']), None)
+        time_saved = None
+        if reference:
+            per_batch = tiers[reference]['wall_seconds'] / tiers[reference]['batches']
+            baseline = tiers[self.models[0]]['batches'] * per_batch
+            spent = sum(tier['wall_seconds'] for tier in tiers.values())
+            time_saved = round(baseline - spent, 3)
+        
+        return {"models": models, "reference_model": reference, "estimated_time_saved_seconds": time_saved}
+    
+    def ingest_story(self) -> int:
+        """
+        Ingest the story file (or corpus directory) into story.json; returns the number of units
+        
+        Every front end ingests through here, so a story is read the same way
+        whichever of them runs the pipeline.
+        """
+        if self.incremental and Path("story.json").exists():
+            # Keep the UIDs of unchanged text so their earlier rows stay usable
+            change_set = IncrementalIngestor(self.story_file, "story.json").save("story.json", "story_changes.json")
+            units = change_set['unchanged'] + len(change_set['added']) + len(change_set['modified'])
+        else:
+            # A change set describes the story.json it came with; a fresh ingest makes it stale
+            Path("story_changes.json").unlink(missing_ok=True)
+            if Path(self.story_file).is_dir():
+                # A directory is a corpus: one book per story file, ingested in parallel
+                units = CorpusIngestor([self.story_file]).save("story.json")
+            else:
+                ingestor = StoryIngestor(self.story_file)
+                ingestor.process_story()
+                ingestor.save_to_json("story.json")
+                units = ingestor.uid_count
+        if self.text_store:
+            sizes = StoryStore.pack("story.json", "story.text")
+            print(f"✓ Moved unit texts to story.text ({sizes['text_store'] / 1024:.1f} KB; "
+                  f"story.json now {sizes['story_json'] / 1024:.1f} KB)")
+        return units
+    
+    def ingest_outputs(self) -> List[str]:
+        """Files the ingest stage writes"""
+        return ["story.json", "story.text"] if self.text_store else ["story.json"]
+    
+    def create_dispatcher(self) -> ChunkDispatcher:
+        """Dispatcher configured with this run's batching options"""
+        return ChunkDispatcher(
+            "story.json",
+            self.batch_size,
+            story_index=self.story_index,
+            pack_mode=self.pack_mode,
+            context_size=self.context_size or DEFAULT_CONTEXT_SIZE,
+            respect_chapters=self.respect_chapters,
+            echo_text=self.echo_text,
+            uid_aliases=self.uid_aliases,
+            changed_uids=load_changed_uids("story_changes.json") if self.incremental else None,
+            prompt_overhead=self.prompt_overhead
+        )
+    
+    def story_digest(self) -> Any:
+        """Digest of the story file, or of every book file when the story is a corpus directory"""
+        if Path(self.story_file).is_dir():
+            return {str(path): file_digest(str(path)) for path in corpus_files([self.story_file])}
+        return file_digest(self.story_file)
+    
+    def stage_fingerprints(self) -> Dict[str, str]:
+        """
+        Fingerprint of every pipeline stage for this run's story file and settings
+        
+        A stage covers the settings that change its output and the code of the
+        modules producing it; settings that only affect speed (concurrency,
+        endpoints, caching, streaming) are left out.
+        """
+        params = self.stage_params()
+        # Stored with every result, so a later incremental run can tell whose rows it may reuse
+        self.process_settings = StageFingerprints.fingerprint(None, params['process'])
+        return StageFingerprints.chain(params)
+    
+    def stage_params(self) -> Dict[str, Dict[str, Any]]:
+        """Inputs and settings of every stage, as fingerprinted by stage_fingerprints"""
+        return {
+            "ingest": {
+                "story": self.story_digest(),
+                "incremental": self.incremental,
+                "text_store": self.text_store,
+                "code": code_digest("ingest", "corpus_ingest", "incremental_ingest", "story_store")
+            },
+            "dispatch": {
+                "batch_size": self.batch_size,
+                "pack_mode": self.pack_mode,
+                "context_size": self.context_size,
+                "prompt_overhead": self.prompt_overhead,
+                "respect_chapters": self.respect_chapters,
+                "echo_text": self.echo_text,
+                "uid_aliases": self.uid_aliases,
+                "code": code_digest("chunk_dispatcher", "story_index")
+            },
+            "process": {
+                "models": self.models,
+                "mock": self.use_mock_llm,
+                "mock_fallback": self.mock_fallback,
+                "llm_options": self.llm_options,
+                "system_prompt": self.system_prompt,
+                "response_format": self.response_format,
+                "repair_retries": self.repair_retries,
+                "code": code_digest("verifier", "orchestrator")
+            },
+            "merge": {"code": code_digest("merge_chunks")},
+            "post_process": {"code": code_digest("post_processor")},
+            "gap_detection": {"code": code_digest("gap_detector")}
+        }
+    
+    def stage_needs_run(self, stage: str, fingerprint: str) -> bool:
+        """
+        Whether a stage has to run; if so its recorded state, and that of every later stage, is dropped
+        """
+        if self.skip_unchanged and self.stage_state.is_current(stage, fingerprint):
+            return False
+        self.stage_state.invalidate(stage)
+        return True
+    
+    def processing_complete(self, results: List[Optional[Dict[str, Any]]], total: int) -> bool:
+        """Whether every batch ended with an accepted result, so the processing stage may be recorded"""
+        return (not self.cancelled and len(results) == total and all(results)
+                and self.stats['batches_failed'] == 0)
+    
     def print_final_report(self):
         """Print final pipeline report"""
         duration = (datetime.now() - self.stats['start_time']).total_seconds()
@@ -253,25 +1420,133 @@ Be accurate and only extract meaningful story elements."""
         print("PIPELINE SUMMARY")
         print("="*60)
         print(f"Total time: {duration:.1f} seconds")
+        if self.stats['stages_skipped']:
+            print(f"Stages skipped (unchanged since last run): {', '.join(self.stats['stages_skipped'])}")
         print(f"Total units: {self.stats['total_units']}")
-        print(f"Units verified: {self.stats['units_verified']}")
-        print(f"Verification rate: {self.stats['units_verified']/self.stats['total_units']*100:.1f}%")
-        print(f"Batches processed: {self.stats['batches_processed']}/{self.stats['batches_total']}")
-        print(f"Batches failed: {self.stats['batches_failed']}")
+        if "process" not in self.stats['stages_skipped']:
+            print(f"Units verified: {self.stats['units_verified']}")
+            print(f"Verification rate: {self.stats['units_verified']/self.stats['total_units']*100:.1f}%")
+            print(f"Batches processed: {self.stats['batches_processed']}/{self.stats['batches_total']}")
+            print(f"Batches failed: {self.stats['batches_failed']}")
+        if self.stats['batches_repaired']:
+            print(f"Batches repaired: {self.stats['batches_repaired']} "
+                  f"({self.stats['units_repaired']} units re-prompted)")
+        if self.stats['batches_cancelled'] or self.stats['batches_timed_out']:
+            print(f"Batches interrupted: {self.stats['batches_cancelled']} cancelled, "
+                  f"{self.stats['batches_timed_out']} timed out (rerun with --resume to finish them)")
+        if self.stats['streams_aborted']:
+            print(f"Streams stopped off-script: {self.stats['streams_aborted']}")
+        if self.resume:
+            print(f"Batches reused from previous run: {self.stats['batches_resumed']}")
+        if self.incremental and "process" not in self.stats['stages_skipped']:
+            print(f"Batches outside the change set, rows reused: {self.stats['batches_reused']}")
+        if self.response_cache:
+            print(f"Response cache: {self.stats['cache_hits']} hits, {self.stats['cache_misses']} misses")
+        metrics = self.metrics.summary()
+        latency = metrics['latency_seconds']
+        if latency['p50'] is not None:
+            print(f"LLM latency: p50 {latency['p50']:.2f}s, p95 {latency['p95']:.2f}s, p99 {latency['p99']:.2f}s")
+        if metrics['tokens']['prompt']:
+            throughput = metrics['tokens_per_second']
+            print(f"Tokens: {metrics['tokens']['prompt']} prompt ({throughput['prompt_eval']}/s), "
+                  f"{metrics['tokens']['generated']} generated ({throughput['generation']}/s)")
+        if metrics['model_load']['stalls']:
+            print(f"⚠ Model load stalls: {metrics['model_load']['stalls']} "
+                  f"(max {metrics['model_load']['max_seconds']:.1f}s)")
+        if not self.use_mock_llm:
+            rate_limit = self.stats['rate_limit']
+            print(f"Request rate: {rate_limit['current_rate']:.2f}/s "
+                  f"({rate_limit['decreases']} backoffs, {rate_limit['time_waiting']:.1f}s waiting)")
+        cascade = self.cascade_summary()
+        if cascade:
+            print("Model cascade:")
+            for model, tier in cascade['models'].items():
+                rate = f"{tier['accept_rate']*100:.0f}%" if tier['accept_rate'] is not None else "-"
+                print(f"  {model}: {tier['accepted']}/{tier['batches']} batches accepted ({rate}), "
+                      f"{tier['wall_seconds']:.1f}s")
+            if cascade['estimated_time_saved_seconds'] is not None:
+                print(f"Cascade time saved vs. {cascade['reference_model']} alone: "
+                      f"~{cascade['estimated_time_saved_seconds']:.1f}s (estimated)")
+        circuit = self.stats['circuit']
+        if circuit['trips']:
+            print(f"⚠ LLM circuit breaker tripped {circuit['trips']} times (now {circuit['state']})")
+        if self.stats['batches_unavailable']:
+            print(f"✗ {self.stats['batches_unavailable']} batches failed fast while the LLM was unavailable; "
+                  f"rerun with --resume to process them")
+        for endpoint in self.stats['endpoints']:
+            throughput = f", {endpoint['tokens_per_second']} tok/s" if endpoint['tokens_per_second'] else ""
+            state = "" if endpoint['healthy'] else " [ejected]"
+            print(f"  {endpoint['host']}: {endpoint['requests']} requests, {endpoint['failures']} failed, "
+                  f"{endpoint['ejections']} ejections{throughput}{state}")
         print("\nOutput files:")
         print("  - mapping.md (Markdown format)")
         print("  - mapping.csv (Spreadsheet format)")
         print("  - mapping.json (Structured data)")
+        print("  - run_metrics.json (LLM latency and throughput)")
         print("="*60)
 
 
 def main():
     """Main entry point"""
     parser = argparse.ArgumentParser(description="Zero-Loss Story Mapping Pipeline")
-    parser.add_argument("--story", default="../examples/sample_story.txt", help="Path to story file")
+    parser.add_argument("--story", default="../examples/sample_story.txt",
+                        help="Path to story file, or a directory of *.txt books ingested as one corpus")
     parser.add_argument("--batch-size", type=int, default=15, help="Sentences per batch")
+    parser.add_argument("--pack", choices=["units", "tokens"], default="units",
+                        help="Cut batches by unit count or fill them up to token budgets")
+    parser.add_argument("--context-size", type=int, default=None,
+                        help="Model context window in tokens (sets num_ctx and token packing budgets; "
+                             "--pack tokens defaults to 8192)")
+    parser.add_argument("--respect-chapters", action="store_true", help="Never let a batch span two chapters")
     parser.add_argument("--mock-llm", action="store_true", help="Use mock LLM instead of real Ollama model")
     parser.add_argument("--model", default="qwen2.5:72b", help="Ollama model to use")
+    parser.add_argument("--cascade", default=None, metavar="MODEL,MODEL,...",
+                        help="Models fastest first; only batches a model fails to pass cleanly go to the next")
+    parser.add_argument("--concurrency", type=int, default=1, help="Number of batches to keep in flight at once")
+    parser.add_argument("--initial-rate", type=float, default=2.0, help="Starting LLM request rate (requests/sec)")
+    parser.add_argument("--max-rate", type=float, default=20.0, help="Maximum adaptive LLM request rate (requests/sec)")
+    parser.add_argument("--repair-retries", type=int, default=2, help="Re-prompts per rejected batch for only its failed UIDs")
+    parser.add_argument("--stream", action="store_true", help="Stream LLM responses and stop generations that go off-script")
+    parser.add_argument("--resume", action="store_true", help="Only process batches without an accepted, up-to-date result")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the LLM, ignoring cached responses")
+    parser.add_argument("--cache-dir", default=".llm_cache", help="Directory for cached LLM responses")
+    parser.add_argument("--cache-size-mb", type=int, default=512, help="Maximum response cache size in MB")
+    parser.add_argument("--keep-alive", default=None,
+                        help="How long Ollama keeps the model and its prompt cache loaded between calls (e.g. 30m)")
+    parser.add_argument("--format", choices=["markdown", "json"], default="markdown", dest="output_format",
+                        help="Ask for Markdown tables or schema-constrained JSON rows")
+    parser.add_argument("--prompt-mode", choices=["echo", "uid"], default="echo",
+                        help="'uid' asks only for annotations per UID instead of echoing every sentence")
+    parser.add_argument("--uid-aliases", action="store_true",
+                        help="Label units in prompts with short per-batch aliases instead of full UIDs")
+    parser.add_argument("--pin-prefix", action="store_true",
+                        help="Keep the shared system prompt when Ollama shifts a full context window "
+                             "(num_keep is a padded estimate: ~3 characters per token plus the chat template)")
+    parser.add_argument("--ollama-host", action="append", dest="ollama_hosts", metavar="URL[=N]",
+                        help="Ollama server to balance calls across (repeatable; =N caps its requests in flight)")
+    parser.add_argument("--max-in-flight", type=int, default=1,
+                        help="Requests each Ollama server may have outstanding at once")
+    parser.add_argument("--probe-interval", type=float, default=10.0,
+                        help="Seconds between health probes of the Ollama servers")
+    parser.add_argument("--failure-threshold", type=int, default=3,
+                        help="Consecutive failed LLM calls before batches fail fast instead of calling it")
+    parser.add_argument("--circuit-cooldown", type=float, default=5.0,
+                        help="Seconds to fail fast before probing a failing LLM again (doubles per failed probe)")
+    parser.add_argument("--request-timeout", type=float, default=None,
+                        help="Seconds one LLM call may take before its batch is marked timed out")
+    parser.add_argument("--run-timeout", type=float, default=None,
+                        help="Seconds batch processing may take before in-flight calls are dropped")
+    parser.add_argument("--partial-interval", type=float, default=30.0,
+                        help="Seconds between partial mapping.* updates while batches run (0 disables)")
+    parser.add_argument("--mock-fallback", action="store_true",
+                        help="Fill in mock rows when an LLM call fails instead of failing the batch")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-run every stage, even those whose inputs and settings are unchanged")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Keep UIDs of unchanged text when re-ingesting a revised story and only "
+                             "reprocess batches that touch what changed")
+    parser.add_argument("--text-store", action="store_true",
+                        help="Keep unit texts in a memory-mapped story.text and only offsets in story.json and batches")
     
     args = parser.parse_args()
     
@@ -285,7 +1560,37 @@ def main():
         story_file=args.story,
         batch_size=args.batch_size,
         use_mock_llm=args.mock_llm,
-        model_name=args.model
+        model_name=args.model,
+        concurrency=args.concurrency,
+        initial_rate=args.initial_rate,
+        max_rate=args.max_rate,
+        use_cache=not args.no_cache,
+        cache_dir=args.cache_dir,
+        cache_size_mb=args.cache_size_mb,
+        resume=args.resume,
+        repair_retries=args.repair_retries,
+        stream=args.stream,
+        pack_mode=args.pack,
+        context_size=args.context_size,
+        respect_chapters=args.respect_chapters,
+        keep_alive=args.keep_alive,
+        pin_prefix=args.pin_prefix,
+        output_format=args.output_format,
+        prompt_mode=args.prompt_mode,
+        uid_aliases=args.uid_aliases,
+        ollama_hosts=args.ollama_hosts,
+        max_in_flight=args.max_in_flight,
+        probe_interval=args.probe_interval,
+        failure_threshold=args.failure_threshold,
+        circuit_cooldown=args.circuit_cooldown,
+        mock_fallback=args.mock_fallback,
+        cascade_models=args.cascade.split(",") if args.cascade else None,
+        request_timeout=args.request_timeout,
+        run_timeout=args.run_timeout,
+        partial_interval=args.partial_interval,
+        skip_unchanged=not args.force,
+        incremental=args.incremental,
+        text_store=args.text_store
     )
     
     try:
@@ -11,6 +11,8 @@ from datetime import datetime
 import networkx as nx
 import matplotlib.pyplot as plt
 
+from story_index import StoryIndex
+
 
 class PostProcessor:
     def __init__(self, mapping_file: str = "mapping.json"):
@@ -263,9 +265,9 @@ class PostProcessor:
         chapters = {}
         narrative_arcs = []
         
-        # Group by chapters
+        # Group by chapters (per book in a corpus)
         for unit in self.mapping_data['mapping']:
-            chapter = unit.get('chapter', 0)
+            chapter = StoryIndex.chapter_key(unit)
             if chapter not in chapters:
                 chapters[chapter] = {
                     'units': [],
@@ -456,7 +458,7 @@ Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 ### Chapter Summary:
 """
         for ch_num, ch_data in sorted(views['narrative_flow']['chapters'].items()):
-            if ch_num > 0:  # Skip chapter 0 (pre-chapter content)
+            if ch_num != 0:  # Skip chapter 0 (pre-chapter content)
                 report += f"- **Chapter {ch_num}**: {ch_data['unit_count']} units, {ch_data['word_count']:,} words\n"
         
         # Save report
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Adaptive Rate Limiter for Zero-Loss Mapping Workflow
+Token bucket whose refill rate follows AIMD feedback from observed LLM latency and errors
+"""
+
+import threading
+import time
+from typing import Dict, Any, Optional
+
+
+class AdaptiveRateLimiter:
+    def __init__(self,
+                 initial_rate: float = 2.0,
+                 min_rate: float = 0.05,
+                 max_rate: float = 20.0,
+                 burst: int = 1,
+                 additive_increase: float = 0.25,
+                 multiplicative_decrease: float = 0.5,
+                 latency_tolerance: float = 2.0):
+        """
+        Initialize the limiter
+
+        Args:
+            initial_rate: Starting request rate in requests per second
+            min_rate: Lowest rate the limiter will back off to
+            max_rate: Highest rate the limiter will ramp up to
+            burst: Bucket capacity (requests that may start back to back)
+            additive_increase: Requests/sec added after each healthy call
+            multiplicative_decrease: Factor applied to the rate on congestion or failure
+            latency_tolerance: Smoothed latency above this multiple of the baseline counts as congestion
+        """
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = max(1, burst)
+        self.additive_increase = additive_increase
+        self.multiplicative_decrease = multiplicative_decrease
+        self.latency_tolerance = latency_tolerance
+
+        self.rate = min(max(initial_rate, min_rate), max_rate)
+        self.tokens = float(self.burst)
+        self.last_refill = time.monotonic()
+        self.last_decrease = 0.0
+        self.smoothed_latency: Optional[float] = None
+        self.baseline_latency: Optional[float] = None
+
+        self.stats = {
+            "calls": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "increases": 0,
+            "decreases": 0,
+            "time_waiting": 0.0
+        }
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        """Add tokens for the time elapsed since the last refill"""
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self) -> float:
+        """Block until a request may be sent; returns the seconds spent waiting"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.stats['time_waiting'] += waited
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+
+            time.sleep(delay)
+            waited += delay
+
+    def _decrease(self, now: float):
+        """Multiplicative decrease, at most once per observed round trip"""
+        window = self.smoothed_latency or 0.0
+        if now - self.last_decrease < window:
+            return
+        self.rate = max(self.min_rate, self.rate * self.multiplicative_decrease)
+        self.last_decrease = now
+        self.stats['decreases'] += 1
+
+    def record_success(self, latency: float):
+        """Feed back the latency of a successful call"""
+        with self._lock:
+            self.stats['calls'] += 1
+            now = time.monotonic()
+
+            if self.smoothed_latency is None:
+                self.smoothed_latency = latency
+            else:
+                self.smoothed_latency = 0.8 * self.smoothed_latency + 0.2 * latency
+            if self.baseline_latency is None or self.smoothed_latency < self.baseline_latency:
+                self.baseline_latency = self.smoothed_latency
+
+            if self.smoothed_latency > self.baseline_latency * self.latency_tolerance:
+                # Server is queueing our requests - back off before it starts swapping,
+                # then judge further slowdowns against the latency we just backed off at
+                self._decrease(now)
+                self.baseline_latency = self.smoothed_latency
+            else:
+                self.rate = min(self.max_rate, self.rate + self.additive_increase)
+                self.stats['increases'] += 1
+
+    def record_failure(self, timed_out: bool = False):
+        """Feed back a failed or timed-out call"""
+        with self._lock:
+            self.stats['calls'] += 1
+            self.stats['failures'] += 1
+            if timed_out:
+                self.stats['timeouts'] += 1
+            self._decrease(time.monotonic())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current limiter state for pipeline stats"""
+        with self._lock:
+            return {
+                "current_rate": round(self.rate, 3),
+                "smoothed_latency": round(self.smoothed_latency, 3) if self.smoothed_latency is not None else None,
+                "baseline_latency": round(self.baseline_latency, 3) if self.baseline_latency is not None else None,
+                **{k: (round(v, 3) if isinstance(v, float) else v) for k, v in self.stats.items()}
+            }
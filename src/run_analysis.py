@@ -5,7 +5,6 @@ A comprehensive CLI script for running narrative analysis with progress tracking
 """
 
 import json
-import os
 import sys
 import time
 import argparse
@@ -19,12 +18,11 @@ init()
 
 # Import our modules
 from orchestrator import MappingOrchestrator
-from ingest import StoryIngestor
-from chunk_dispatcher import ChunkDispatcher
 from verifier import MappingVerifier
 from merge_chunks import ChunkMerger
 from post_processor import PostProcessor
 from gap_detector import GapDetector
+from story_index import StoryIndex
 
 class ProgressTracker:
     """Track and display progress with optional verbose output"""
@@ -133,13 +131,37 @@ class NarrativeAnalyzer:
     """Main analyzer class"""
     
     def __init__(self, story_file, model_name="qwen2.5:32b", batch_size=10, 
-                 use_mock=False, verbose=False):
+                 use_mock=False, verbose=False, concurrency=1, use_cache=True,
+                 pack_mode="units", context_size=None, respect_chapters=False, output_format="markdown",
+                 prompt_mode="echo", uid_aliases=False, ollama_hosts=None, max_in_flight=1,
+                 mock_fallback=False, cascade_models=None, request_timeout=None, run_timeout=None,
+                 skip_unchanged=True):
         self.story_file = story_file
         self.model_name = model_name
         self.batch_size = batch_size
         self.use_mock = use_mock
+        self.concurrency = concurrency
+        self.use_cache = use_cache
+        self.pack_mode = pack_mode
+        self.context_size = context_size
+        self.respect_chapters = respect_chapters
+        self.output_format = output_format
+        self.prompt_mode = prompt_mode
+        self.uid_aliases = uid_aliases
+        self.ollama_hosts = ollama_hosts
+        self.max_in_flight = max_in_flight
+        self.mock_fallback = mock_fallback
+        self.cascade_models = cascade_models
+        self.request_timeout = request_timeout
+        self.run_timeout = run_timeout
+        self.skip_unchanged = skip_unchanged
+        self.pipeline = None
+        self.fingerprints = {}
+        self.orchestrator = None
         self.progress = ProgressTracker(verbose)
         self.cancelled = False
+        self.story_index = None
+        self.dispatcher = None
         
         # Register signal handler for Ctrl+C
         signal.signal(signal.SIGINT, self._signal_handler)
@@ -148,6 +170,10 @@ class NarrativeAnalyzer:
         """Handle Ctrl+C gracefully"""
         self.cancelled = True
         self.progress.cancel()
+        if self.orchestrator is not None:
+            # Drop the in-flight LLM calls; their batches are marked cancelled in results/
+            self.orchestrator.cancel()
+            return
         sys.exit(0)
         
     def run(self):
@@ -155,23 +181,28 @@ class NarrativeAnalyzer:
         self.progress.start()
         
         try:
+            # The orchestrator knows every setting that changes a stage's output
+            self.pipeline = self._create_orchestrator()
+            self.fingerprints = self.pipeline.stage_fingerprints()
+            
             # Step 1: Ingest story
             self.progress.step(1, "Ingesting story")
-            story_data = self._ingest_story()
+            self._ingest_story()
             
             if self.cancelled:
                 return
                 
             # Step 2: Create batches
             self.progress.step(2, "Creating batches")
-            batches = self._create_batches()
+            total_batches = self._create_batches()
             
             if self.cancelled:
                 return
                 
             # Step 3: Process with LLM
-            self.progress.step(3, f"Processing {len(batches)} batches with {self.model_name}")
-            self._process_batches(batches)
+            models = " → ".join(self.cascade_models) if self.cascade_models else self.model_name
+            self.progress.step(3, f"Processing {total_batches} batches with {models}")
+            self._process_batches(total_batches)
             
             if self.cancelled:
                 return
@@ -202,73 +233,100 @@ class NarrativeAnalyzer:
             self.progress.error(f"Fatal error: {str(e)}")
             raise
             
+    def _stage_needs_run(self, stage):
+        """Whether a stage has to run, or can keep its outputs from the last run"""
+        if self.pipeline.stage_needs_run(stage, self.fingerprints[stage]):
+            return True
+        self.progress.success("Inputs and settings unchanged since the last run, skipped")
+        return False
+        
+    def _record_stage(self, stage, outputs):
+        """Remember that a stage completed for the current inputs and settings"""
+        self.pipeline.stage_state.record(stage, self.fingerprints[stage], outputs)
+        
     def _ingest_story(self):
         """Ingest the story file"""
-        if Path("story.json").exists():
+        if not self._stage_needs_run("ingest"):
             with open("story.json", 'r') as f:
                 story_data = json.load(f)
-            
-            # Check if it's from the same file
-            existing_source = story_data.get("metadata", {}).get("source_file", "unknown")
-            current_file = os.path.basename(self.story_file)
-            
-            if existing_source != current_file:
-                self.progress.warning(f"Found cached data from different file: {existing_source}")
-                self.progress.warning(f"Current file: {current_file}")
-                self.progress.warning("Use --clean flag to start fresh: python run_analysis.py <file> --clean")
-                self.progress.info("Loading cached data anyway...")
-            else:
-                self.progress.info("Found existing story.json, loading...")
-                
-            self.progress.success(f"Loaded {len(story_data['data'])} text units")
-            return story_data
-        else:
-            self.progress.info(f"Processing {self.story_file}...")
-            ingestor = StoryIngestor(self.story_file)
-            ingestor.process_story()
-            ingestor.save_to_json("story.json")
-            self.progress.success(f"Ingested {len(ingestor.data)} text units")
-            # Return in same format as loaded JSON
-            return {"data": ingestor.data}
+            self.progress.success(f"Loaded {len(story_data['data'])} text units from story.json")
+            return
+        
+        self.progress.info(f"Processing {self.story_file}...")
+        # Same ingest as the orchestrator's, so corpus directories work here too
+        units = self.pipeline.ingest_story()
+        self._record_stage("ingest", self.pipeline.ingest_outputs())
+        self.progress.success(f"Ingested {units} text units")
             
     def _create_batches(self):
         """Create processing batches"""
-        dispatcher = ChunkDispatcher("story.json", self.batch_size)
-        batches = dispatcher.create_batches()
-        dispatcher.save_all_batches("batches")
+        self.story_index = StoryIndex.load("story.json")
+        self.pipeline.story_index = self.story_index
+        # Same batching, token budgets and prompt overhead as the orchestrator that processes them
+        self.dispatcher = self.pipeline.create_dispatcher()
+        if self._stage_needs_run("dispatch"):
+            total_batches = self.dispatcher.save_manifest("batches")
+            self._record_stage("dispatch", ["batches/manifest.json"])
+        else:
+            total_batches = self.dispatcher.count_batches()
         
-        self.progress.success(f"Created {len(batches)} batches of {self.batch_size} units each")
+        if self.pack_mode == "tokens":
+            self.progress.success(f"Created {total_batches} token-packed batches "
+                                  f"(~{len(self.story_index) / max(total_batches, 1):.1f} units each)")
+        else:
+            self.progress.success(f"Created {total_batches} batches of {self.batch_size} units each")
         
         # Show estimated processing time
         if not self.use_mock:
             # Estimate ~10-20 seconds per batch for real LLM
-            estimated_minutes = (len(batches) * 15) / 60
+            estimated_minutes = (total_batches * 15) / 60 / self.concurrency
             self.progress.info(f"Estimated processing time: {estimated_minutes:.1f} minutes")
             
-        return batches
+        return total_batches
         
-    def _process_batches(self, batches):
-        """Process batches with LLM"""
-        orchestrator = MappingOrchestrator(
+    def _create_orchestrator(self):
+        """Orchestrator configured with this run's model and batching settings"""
+        return MappingOrchestrator(
             story_file=self.story_file,
             batch_size=self.batch_size,
             use_mock_llm=self.use_mock,
-            model_name=self.model_name
+            model_name=self.model_name,
+            concurrency=self.concurrency,
+            use_cache=self.use_cache,
+            context_size=self.context_size,
+            pack_mode=self.pack_mode,
+            respect_chapters=self.respect_chapters,
+            output_format=self.output_format,
+            prompt_mode=self.prompt_mode,
+            uid_aliases=self.uid_aliases,
+            ollama_hosts=self.ollama_hosts,
+            max_in_flight=self.max_in_flight,
+            mock_fallback=self.mock_fallback,
+            cascade_models=self.cascade_models,
+            request_timeout=self.request_timeout,
+            run_timeout=self.run_timeout,
+            skip_unchanged=self.skip_unchanged
         )
         
-        self.progress.substep_init(len(batches))
+    def _process_batches(self, total_batches):
+        """Process batches with LLM"""
+        if not self._stage_needs_run("process"):
+            return
+        
+        orchestrator = self.pipeline
+        orchestrator.story_index = self.story_index
+        self.orchestrator = orchestrator
+        
+        self.progress.substep_init(total_batches)
+        if self.concurrency > 1:
+            self.progress.info(f"Keeping {self.concurrency} batches in flight")
         
         success_count = 0
         failed_count = 0
         
-        for i, batch in enumerate(batches):
-            if self.cancelled:
-                return
-                
+        def on_result(batch, result, completed, total):
+            nonlocal success_count, failed_count
             batch_id = batch['batch_id']
-            self.progress.debug(f"Processing {batch_id}...")
-            
-            result = orchestrator.process_batch(batch)
             
             if result:
                 success_count += 1
@@ -277,7 +335,22 @@ class NarrativeAnalyzer:
                 failed_count += 1
                 self.progress.warning(f"Failed to process {batch_id}")
                 
-            self.progress.substep_update(i + 1, f"{batch_id}")
+            self.progress.substep_update(completed, f"{batch_id}")
+        
+        dispatcher = self.dispatcher
+        results = orchestrator.process_batches(dispatcher.iter_batches(), on_result=on_result,
+                                               should_cancel=lambda: self.cancelled,
+                                               render=lambda descriptor: dispatcher.render_batch(descriptor, "batches"),
+                                               total=total_batches)
+        self.orchestrator = None
+        if orchestrator.processing_complete(results, total_batches):
+            self._record_stage("process", ["results"])
+        orchestrator.metrics.save("run_metrics.json", cascade=orchestrator.cascade_summary())
+        if self.cancelled:
+            return
+        interrupted = orchestrator.stats['batches_cancelled'] + orchestrator.stats['batches_timed_out']
+        if interrupted:
+            self.progress.warning(f"{interrupted} batches cancelled or timed out (marked in results/)")
             
         self.progress.success(f"Processed {success_count} batches successfully")
         if failed_count > 0:
@@ -285,14 +358,18 @@ class NarrativeAnalyzer:
             
     def _merge_results(self):
         """Merge all batch results"""
+        if not self._stage_needs_run("merge"):
+            return None
+        
         self.progress.info("Loading and merging batch results...")
         
-        merger = ChunkMerger("results")
-        merger.merge_all_results()
+        merger = ChunkMerger("results", story_index=self.story_index)
+        merger.merge_all_results(batch['batch_id'] for batch in self.dispatcher.iter_batches())
         merger.enrich_with_metadata()
         
         # Save outputs
         merger.save_mappings("mapping")
+        self._record_stage("merge", ["mapping.json", "mapping.md", "mapping.csv"])
         
         stats = merger.merge_stats
         self.progress.success(f"Merged {stats['total_units']} units from {stats['batches_processed']} batches")
@@ -301,16 +378,23 @@ class NarrativeAnalyzer:
         
     def _generate_outputs(self):
         """Generate visualizations and derived views"""
+        if not self._stage_needs_run("post_process"):
+            return
+        
         self.progress.info("Creating visualizations...")
         
         processor = PostProcessor("mapping.json")
         processor.save_all_views("derived_views")
+        self._record_stage("post_process", ["derived_views"])
         
         self.progress.success("Generated character atlas, location gazetteer, and visualizations")
             
     def _verify_integrity(self):
         """Verify data integrity and check for gaps"""
-        detector = GapDetector("story.json", "mapping.json")
+        if not self._stage_needs_run("gap_detection"):
+            return
+        
+        detector = GapDetector("story.json", "mapping.json", story_index=self.story_index)
         missing_uids = detector.detect_missing_uids()
         
         if missing_uids:
@@ -326,6 +410,7 @@ class NarrativeAnalyzer:
         gap_report = detector.generate_gap_report()
         with open("gap_report.json", 'w', encoding='utf-8') as f:
             json.dump(gap_report, f, indent=2)
+        self._record_stage("gap_detection", ["gap_report.json"])
         
     def _print_summary(self):
         """Print analysis summary"""
@@ -369,41 +454,57 @@ Examples:
   # Use specific model with custom batch size
   python run_analysis.py story.txt --model llama3.1:8b --batch-size 5
   
+  # Keep 4 batches in flight against the Ollama server
+  python run_analysis.py story.txt --concurrency 4
+  
   # Enable verbose output
   python run_analysis.py story.txt --verbose
         """
     )
     
-    parser.add_argument('story_file', help='Path to the story text file')
+    parser.add_argument('story_file', help='Path to the story text file, or a directory of book files')
     parser.add_argument('--model', dest='model_name', default='qwen2.5:32b',
                         help='Ollama model to use (default: qwen2.5:32b)')
+    parser.add_argument('--cascade', default=None, metavar='MODEL,MODEL,...',
+                        help='Models fastest first; only batches a model fails to pass cleanly go to the next')
     parser.add_argument('--batch-size', type=int, default=10,
                         help='Number of sentences per batch (default: 10)')
+    parser.add_argument('--pack', choices=['units', 'tokens'], default='units',
+                        help='Cut batches by unit count or fill them up to token budgets (default: units)')
+    parser.add_argument('--context-size', type=int, default=None,
+                        help='Model context window in tokens, used for num_ctx and token packing '
+                             '(--pack tokens defaults to 8192)')
+    parser.add_argument('--respect-chapters', action='store_true',
+                        help='Never let a batch span two chapters')
+    parser.add_argument('--format', choices=['markdown', 'json'], default='markdown', dest='output_format',
+                        help='Ask the model for Markdown tables or schema-constrained JSON rows (default: markdown)')
+    parser.add_argument('--prompt-mode', choices=['echo', 'uid'], default='echo',
+                        help="'uid' asks only for annotations per UID instead of echoing every sentence (default: echo)")
+    parser.add_argument('--uid-aliases', action='store_true',
+                        help='Label units in prompts with short per-batch aliases instead of full UIDs')
+    parser.add_argument('--ollama-host', action='append', dest='ollama_hosts', metavar='URL[=N]',
+                        help='Ollama server to balance calls across; repeat for several (=N caps its requests in flight)')
+    parser.add_argument('--max-in-flight', type=int, default=1,
+                        help='Requests each Ollama server may have outstanding at once (default: 1)')
     parser.add_argument('--mock', action='store_true',
                         help='Use mock LLM for testing (fast but basic)')
+    parser.add_argument('--request-timeout', type=float, default=None,
+                        help='Seconds one LLM call may take before its batch is marked timed out')
+    parser.add_argument('--run-timeout', type=float, default=None,
+                        help='Seconds batch processing may take before in-flight LLM calls are dropped')
+    parser.add_argument('--mock-fallback', action='store_true',
+                        help='Fill in mock rows when an LLM call fails instead of failing the batch')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='Number of batches to keep in flight at once (default: 1)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Ignore cached LLM responses and call the model for every batch')
     parser.add_argument('-v', '--verbose', action='store_true',
                         help='Enable verbose output')
-    parser.add_argument('--clean', action='store_true',
-                        help='Clean all cached data before running')
-    
+    parser.add_argument('--force', action='store_true',
+                        help='Re-run every stage, even those whose inputs and settings are unchanged')
+
     args = parser.parse_args()
-    
-    # Clean cached data if requested
-    if args.clean:
-        print(f"{Fore.YELLOW}Cleaning cached data...{Style.RESET_ALL}")
-        import shutil
-        paths_to_clean = ['story.json', 'batches/', 'results/', 'output/', 
-                         'mapping.md', 'mapping.csv', 'mapping.json', 
-                         'derived_views/', 'gap_report.json']
-        for path in paths_to_clean:
-            if Path(path).exists():
-                if Path(path).is_dir():
-                    shutil.rmtree(path)
-                else:
-                    Path(path).unlink()
-                print(f"  {Fore.GREEN}✓{Style.RESET_ALL} Removed {path}")
-        print()
-    
+
     # Verify story file exists
     if not Path(args.story_file).exists():
         print(f"{Fore.RED}Error: Story file '{args.story_file}' not found{Style.RESET_ALL}")
@@ -415,7 +516,22 @@ Examples:
         model_name=args.model_name,
         batch_size=args.batch_size,
         use_mock=args.mock,
-        verbose=args.verbose
+        verbose=args.verbose,
+        concurrency=args.concurrency,
+        use_cache=not args.no_cache,
+        pack_mode=args.pack,
+        context_size=args.context_size,
+        respect_chapters=args.respect_chapters,
+        output_format=args.output_format,
+        prompt_mode=args.prompt_mode,
+        uid_aliases=args.uid_aliases,
+        ollama_hosts=args.ollama_hosts,
+        max_in_flight=args.max_in_flight,
+        mock_fallback=args.mock_fallback,
+        cascade_models=args.cascade.split(',') if args.cascade else None,
+        request_timeout=args.request_timeout,
+        run_timeout=args.run_timeout,
+        skip_unchanged=not args.force
     )
     
     analyzer.run()
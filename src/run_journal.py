@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Run Journal for Zero-Loss Mapping Workflow
+Append-only record of batch starts and completions used to resume interrupted runs
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Any, List
+from datetime import datetime
+
+
+def batch_units_digest(units: List[Dict[str, Any]]) -> str:
+    """Digest of a batch's UIDs and content hashes; changes whenever its units do"""
+    material = "\n".join(f"{unit['uid']}:{unit['hash']}" for unit in units)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()[:16]
+
+
+class RunJournal:
+    def __init__(self, journal_file: str = "results/journal.jsonl"):
+        """
+        Initialize journal
+
+        Args:
+            journal_file: Path of the append-only JSON-lines journal
+        """
+        self.journal_file = Path(journal_file)
+        self.journal_file.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._terminate_torn_line()
+
+    def _terminate_torn_line(self):
+        """Close off a partial last line left by a crash so new events start on their own line"""
+        if not self.journal_file.exists() or self.journal_file.stat().st_size == 0:
+            return
+        with open(self.journal_file, 'rb+') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+    def record(self, event: str, batch_id: str, units_digest: str, **details):
+        """Append one event and flush it to disk before returning"""
+        entry = {
+            "event": event,
+            "batch_id": batch_id,
+            "units_digest": units_digest,
+            "time": datetime.now().isoformat(),
+            **details
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.journal_file, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def latest_events(self) -> Dict[str, Dict[str, Any]]:
+        """Last recorded event per batch; a torn final line from a crash is ignored"""
+        latest = {}
+        if not self.journal_file.exists():
+            return latest
+
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                latest[entry['batch_id']] = entry
+        return latest
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Run Metrics for Zero-Loss Mapping Workflow
+Collects per-call LLM telemetry and rolls it up into latency percentiles and token throughput
+"""
+
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from datetime import datetime
+
+# Counters Ollama returns with every completed chat response (durations in nanoseconds)
+OLLAMA_COUNTERS = ("total_duration", "load_duration", "prompt_eval_count",
+                   "prompt_eval_duration", "eval_count", "eval_duration")
+
+# A model load longer than this means the server had to (re)load weights for the call
+LOAD_STALL_SECONDS = 1.0
+
+
+def ollama_counters(response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Timing and token counters of an Ollama response, or None if it carries none"""
+    counters = {name: response.get(name) for name in OLLAMA_COUNTERS}
+    if all(value is None for value in counters.values()):
+        return None
+    return counters
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """q-th percentile (0-100) with linear interpolation between closest ranks"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class RunMetrics:
+    def __init__(self):
+        """Initialize an empty collection of call records"""
+        self.calls: List[Dict[str, Any]] = []
+        self.started_at = datetime.now()
+        self._lock = threading.Lock()
+
+    def record(self, call: Dict[str, Any]):
+        """Add the telemetry of one LLM call"""
+        with self._lock:
+            self.calls.append(call)
+
+    def summary(self) -> Dict[str, Any]:
+        """Latency percentiles, token throughput and model-load stalls over the recorded calls"""
+        with self._lock:
+            calls = list(self.calls)
+
+        sources = {}
+        for call in calls:
+            sources[call['source']] = sources.get(call['source'], 0) + 1
+
+        # Latency is only meaningful for calls that reached the model
+        served = [call for call in calls if call['source'] == 'ollama'] or \
+                 [call for call in calls if call['source'] == 'mock']
+        latencies = [call['wall_seconds'] for call in served]
+
+        def total(name: str) -> int:
+            return sum(call.get(name) or 0 for call in served)
+
+        def per_second(count: str, duration: str) -> Optional[float]:
+            seconds = total(duration) / 1e9
+            return round(total(count) / seconds, 2) if seconds else None
+
+        loads = [(call.get('load_duration') or 0) / 1e9 for call in served]
+        wall_total = sum(latencies)
+
+        # Calls balanced across several servers are broken down per server
+        endpoints = {}
+        for call in calls:
+            if call.get('endpoint'):
+                endpoints.setdefault(call['endpoint'], []).append(call)
+        per_endpoint = {}
+        for host, host_calls in endpoints.items():
+            ok = [call for call in host_calls if call['source'] == 'ollama']
+            host_wall = sum(call['wall_seconds'] for call in ok)
+            generated = sum(call.get('eval_count') or 0 for call in ok)
+            per_endpoint[host] = {
+                "calls": len(host_calls),
+                "failed": len(host_calls) - len(ok),
+                "latency_p50": round(percentile([call['wall_seconds'] for call in ok], 50), 4) if ok else None,
+                "generated_tokens": generated,
+                "tokens_per_second": round(generated / host_wall, 2) if host_wall else None
+            }
+
+        return {
+            "generated_at": datetime.now().isoformat(),
+            "run_started_at": self.started_at.isoformat(),
+            "calls": len(calls),
+            "calls_by_source": sources,
+            "retries": sum(1 for call in calls if call.get('retry')),
+            "latency_seconds": {
+                "mean": round(wall_total / len(latencies), 4) if latencies else None,
+                "p50": round(percentile(latencies, 50), 4) if latencies else None,
+                "p95": round(percentile(latencies, 95), 4) if latencies else None,
+                "p99": round(percentile(latencies, 99), 4) if latencies else None,
+                "max": round(max(latencies), 4) if latencies else None
+            },
+            "tokens": {
+                "prompt": total('prompt_eval_count'),
+                "generated": total('eval_count')
+            },
+            "tokens_per_second": {
+                "prompt_eval": per_second('prompt_eval_count', 'prompt_eval_duration'),
+                "generation": per_second('eval_count', 'eval_duration'),
+                "end_to_end": round(total('eval_count') / wall_total, 2) if wall_total else None
+            },
+            "model_load": {
+                "total_seconds": round(sum(loads), 3),
+                "max_seconds": round(max(loads), 3) if loads else None,
+                "stalls": sum(1 for seconds in loads if seconds > LOAD_STALL_SECONDS)
+            },
+            "endpoints": per_endpoint
+        }
+
+    def save(self, output_file: str = "run_metrics.json", **sections) -> Dict[str, Any]:
+        """Write the summary, plus any extra named sections that are set, to output_file and return it"""
+        summary = self.summary()
+        summary.update({name: value for name, value in sections.items() if value is not None})
+        with open(Path(output_file), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        return summary
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Stage Fingerprints for Zero-Loss Mapping Workflow
+Records a fingerprint of each pipeline stage's inputs and parameters so unchanged stages are skipped on the next run
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Any, Iterable, Optional
+
+# Pipeline stages in dependency order; each stage's fingerprint includes the one before it
+STAGES = ("ingest", "dispatch", "process", "merge", "post_process", "gap_detection")
+
+SOURCE_DIR = Path(__file__).resolve().parent
+
+
+def file_digest(path: str) -> Optional[str]:
+    """SHA-256 of a file's bytes, or None if it does not exist"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def code_digest(*modules: str) -> Dict[str, Optional[str]]:
+    """Digests of pipeline modules, so editing a stage's code re-runs it"""
+    return {module: file_digest(str(SOURCE_DIR / f"{module}.py")) for module in modules}
+
+
+class StageFingerprints:
+    def __init__(self, state_file: str = "pipeline_state.json"):
+        """
+        Load the fingerprints recorded by earlier runs
+
+        Args:
+            state_file: JSON file holding the fingerprint and outputs of every completed stage
+        """
+        self.state_file = Path(state_file)
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        if self.state_file.exists():
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    self.stages = json.load(f).get("stages", {})
+            except (json.JSONDecodeError, OSError):
+                # A damaged state file only costs a full re-run
+                self.stages = {}
+
+    @staticmethod
+    def fingerprint(upstream: Optional[str], params: Dict[str, Any]) -> str:
+        """
+        Fingerprint of a stage from its upstream fingerprint and its own inputs
+
+        Args:
+            upstream: Fingerprint of the stage this one reads from (None for the first stage)
+            params: JSON-serializable parameters and input digests of this stage
+        """
+        payload = json.dumps({"upstream": upstream, "params": params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def chain(cls, params: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+        """Fingerprints of all STAGES, each folding in the fingerprint of the stage before it"""
+        fingerprints = {}
+        upstream = None
+        for stage in STAGES:
+            upstream = fingerprints[stage] = cls.fingerprint(upstream, params.get(stage, {}))
+        return fingerprints
+
+    def is_current(self, stage: str, fingerprint: str) -> bool:
+        """Whether a stage last completed with this fingerprint and its outputs are still on disk"""
+        recorded = self.stages.get(stage)
+        if not recorded or recorded.get("fingerprint") != fingerprint:
+            return False
+        return all(Path(output).exists() for output in recorded.get("outputs", []))
+
+    def record(self, stage: str, fingerprint: str, outputs: Iterable[str] = ()):
+        """Mark a stage as completed with this fingerprint and persist the state"""
+        self.stages[stage] = {"fingerprint": fingerprint, "outputs": list(outputs)}
+        self._save()
+
+    def invalidate(self, stage: str):
+        """
+        Forget a stage and every stage after it before the stage re-runs
+
+        Downstream outputs were built from the old outputs of this stage, so
+        they must not be skipped even if their own fingerprints still match.
+        """
+        dropped = [self.stages.pop(name, None) for name in STAGES[STAGES.index(stage):]]
+        if any(dropped):
+            self._save()
+
+    def _save(self):
+        tmp_file = self.state_file.with_name(self.state_file.name + ".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"stages": self.stages}, f, indent=2)
+        os.replace(tmp_file, self.state_file)
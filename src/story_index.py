@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Story Index for Zero-Loss Mapping Workflow
+In-memory lookup tables over story.json, built once and shared by every pipeline stage
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Union
+
+from story_store import StoryStore, open_store
+
+# Chapter number, or "B01-CH03" for a chapter of one book in a corpus
+ChapterKey = Union[int, str]
+
+
+class StoryIndex:
+    def __init__(self, story_data: Dict[str, Any], store: Optional[StoryStore] = None):
+        """
+        Build lookup tables over already-loaded story data
+
+        Args:
+            story_data: Parsed story.json ({"metadata": ..., "data": [units]})
+            store: Text store holding the unit texts, when the units carry only offsets into it
+        """
+        self.story_data = story_data
+        self.metadata = story_data.get('metadata', {})
+        self.units: List[Dict[str, Any]] = story_data['data']
+        self.store = store
+
+        self.by_uid: Dict[str, Dict[str, Any]] = {}
+        self.ordinals: Dict[str, int] = {}
+        self.chapter_ranges: Dict[ChapterKey, Tuple[int, int]] = {}
+
+        for ordinal, unit in enumerate(self.units):
+            uid = unit['uid']
+            self.by_uid[uid] = unit
+            self.ordinals[uid] = ordinal
+
+            # Half-open [start, end) ordinal range of each chapter
+            chapter = self.chapter_key(unit)
+            start, _ = self.chapter_ranges.get(chapter, (ordinal, ordinal))
+            self.chapter_ranges[chapter] = (start, ordinal + 1)
+
+    @staticmethod
+    def chapter_key(unit: Dict[str, Any]) -> ChapterKey:
+        """
+        Key of a unit's (or mapping row's) chapter in chapter_ranges
+
+        The chapter number, unless the unit belongs to one book of a corpus,
+        whose chapter numbers restart in every book.
+        """
+        chapter = unit.get('chapter', 0)
+        return f"{unit['book']}-CH{chapter:02d}" if unit.get('book') else chapter
+
+    @staticmethod
+    def uid_chapter_key(uid: str) -> ChapterKey:
+        """Chapter key encoded in a UID (CH03-P001-S001, or B01-CH03-P001-S001 in a corpus)"""
+        parts = uid.split('-')
+        if parts[0].startswith('CH'):
+            return int(parts[0][2:])
+        return f"{parts[0]}-{parts[1]}"
+
+    @classmethod
+    def load(cls, story_json: str = "story.json") -> "StoryIndex":
+        """Parse story.json, or the NDJSON story.jsonl of a streaming ingest, once and index it"""
+        path = Path(story_json)
+        with open(path, 'r', encoding='utf-8') as f:
+            story_data = cls.read_jsonl(f) if path.suffix == '.jsonl' else json.load(f)
+        return cls(story_data, open_store(path, story_data.get('metadata', {})))
+
+    @staticmethod
+    def read_jsonl(lines: Iterable[str]) -> Dict[str, Any]:
+        """Story data from NDJSON lines: one unit per line plus a {"metadata": ...} line"""
+        story_data = {"metadata": {}, "data": []}
+        for line in lines:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if 'metadata' in record and 'uid' not in record:
+                story_data['metadata'] = record['metadata']
+            else:
+                story_data['data'].append(record)
+        return story_data
+
+    def __len__(self) -> int:
+        return len(self.units)
+
+    def __contains__(self, uid: str) -> bool:
+        return uid in self.by_uid
+
+    def get(self, uid: str) -> Optional[Dict[str, Any]]:
+        """Unit for a UID, or None"""
+        return self.by_uid.get(uid)
+
+    def text(self, uid: str) -> str:
+        return self.unit_text(self.by_uid[uid])
+
+    def unit_text(self, unit: Dict[str, Any]) -> str:
+        """Text of a unit (or of a batch's copy of one), sliced from the text store if it carries none"""
+        text = unit.get('text')
+        if text is None:
+            return self.store.text(unit['offset'], unit['length'])
+        return text
+
+    def hash(self, uid: str) -> str:
+        return self.by_uid[uid]['hash']
+
+    def ordinal(self, uid: str) -> int:
+        """Position of a UID in story order"""
+        return self.ordinals[uid]
+
+    def chapter_units(self, chapter: ChapterKey) -> List[Dict[str, Any]]:
+        """Units of one chapter (see chapter_key) in story order"""
+        start, end = self.chapter_ranges.get(chapter, (0, 0))
+        return self.units[start:end]
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Story Store for Zero-Loss Mapping Workflow
+Keeps the normalized text of every unit in one memory-mapped file, so story.json and batch files hold only offsets into it
+"""
+
+import argparse
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+
+class StoryStore:
+    def __init__(self, text_path: str):
+        """
+        Memory-map a text store written by pack()
+
+        Args:
+            text_path: File holding the UTF-8 text of every unit, one unit per line in story order
+        """
+        self.text_path = Path(text_path)
+        self._file = open(self.text_path, 'rb')
+        if os.fstat(self._file.fileno()).st_size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            # mmap refuses empty files; a story without units has nothing to slice anyway
+            self._map = b""
+
+    def __len__(self) -> int:
+        return len(self._map)
+
+    def text(self, offset: int, length: int) -> str:
+        """Text of one unit, decoded from its byte range of the map"""
+        return self._map[offset:offset + length].decode('utf-8')
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    @staticmethod
+    def pack(story_json: str = "story.json", text_path: Optional[str] = None) -> Dict[str, int]:
+        """
+        Move the unit texts of story.json into a text store next to it
+
+        Each unit keeps its hash and gains the byte offset and length of its
+        text in the store in place of the text itself; metadata["text_store"]
+        names the store relative to story.json. A story.json that is already
+        packed is left alone. Returns the sizes of both files in bytes.
+        """
+        story_path = Path(story_json)
+        store_path = Path(text_path) if text_path else story_path.with_suffix(".text")
+        with open(story_path, 'r', encoding='utf-8') as f:
+            story_data = json.load(f)
+
+        if all('text' in unit for unit in story_data['data']):
+            tmp_store = store_path.with_name(store_path.name + ".tmp")
+            offset = 0
+            with open(tmp_store, 'wb') as out:
+                for unit in story_data['data']:
+                    data = unit.pop('text').encode('utf-8')
+                    out.write(data + b"\n")
+                    unit['offset'] = offset
+                    unit['length'] = len(data)
+                    offset += len(data) + 1
+            story_data['metadata']['text_store'] = os.path.relpath(store_path, story_path.parent)
+
+            tmp_story = story_path.with_name(story_path.name + ".tmp")
+            with open(tmp_story, 'w', encoding='utf-8') as f:
+                json.dump(story_data, f, indent=2, ensure_ascii=False)
+            # Store first: a story.json pointing at offsets must never outlive its store
+            os.replace(tmp_store, store_path)
+            os.replace(tmp_story, story_path)
+        elif any('text' in unit for unit in story_data['data']):
+            raise ValueError(f"{story_path} mixes inline and stored unit texts")
+
+        return {"story_json": story_path.stat().st_size,
+                "text_store": store_path.stat().st_size if store_path.exists() else 0}
+
+
+def open_store(story_path: Path, metadata: Dict[str, Any]) -> Optional[StoryStore]:
+    """Text store a story.json's metadata points to, or None when its units carry their text"""
+    text_store = metadata.get('text_store')
+    if not text_store:
+        return None
+    return StoryStore(str(story_path.parent / text_store))
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Move the unit texts of story.json into a memory-mapped text store")
+    parser.add_argument("story_json", nargs="?", default="story.json", help="story.json to pack in place")
+    parser.add_argument("--text-store", default=None, help="Text store file (default: story.text next to story.json)")
+    args = parser.parse_args()
+
+    sizes = StoryStore.pack(args.story_json, args.text_store)
+    print(f"✓ {args.story_json}: {sizes['story_json'] / 1024:.1f} KB index, "
+          f"{sizes['text_store'] / 1024:.1f} KB text store")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,20 +12,51 @@ from typing import List, Dict, Any, Tuple, Optional
 from datetime import datetime
 import difflib
 
+from story_index import StoryIndex
+
+
+def resolve_aliases(row: Dict[str, str], aliases: Dict[str, str]) -> Dict[str, str]:
+    """Map a row's per-batch UID alias (and aliases listed in Links) back to real UIDs"""
+    uid = row.get('UID', '')
+    row['UID'] = aliases.get(uid.lstrip('#'), uid)
+    links = row.get('Links')
+    if links:
+        row['Links'] = ', '.join(aliases.get(link.strip().lstrip('#'), link.strip()) for link in links.split(','))
+    return row
+
 
 class MappingVerifier:
-    def __init__(self, batch_file: str, story_json: str = "story.json"):
+    # Columns of a mapping row, in table order
+    columns = ['UID', 'Raw Sentence', 'Narrative Purpose', 'Characters', 'Locations',
+               'Key Items/Concepts', 'Links']
+    # Columns every row must fill for the batch to be accepted
+    required_columns = ['UID', 'Raw Sentence', 'Narrative Purpose']
+    
+    def __init__(self,
+                 batch_file: Optional[str] = None,
+                 story_json: str = "story.json",
+                 batch_data: Optional[Dict[str, Any]] = None,
+                 story_index: Optional[StoryIndex] = None,
+                 echo_text: bool = True):
         """
         Initialize verifier with batch data and original story
         
         Args:
-            batch_file: Path to the batch JSON file
-            story_json: Path to the original story.json
+            batch_file: Path to the batch JSON file (not read when batch_data is given)
+            story_json: Path to the original story.json (read lazily, only if no index is given)
+            batch_data: Batch already held in memory by the caller
+            story_index: Shared index over story.json built once per run
+            echo_text: Rows echo the sentence in Raw Sentence; when False (annotate-by-UID
+                prompts) only UIDs and annotations are checked
         """
-        self.batch_file = Path(batch_file)
+        self.batch_file = Path(batch_file) if batch_file else None
         self.story_json = Path(story_json)
-        self.batch_data = self._load_batch_data()
-        self.story_data = self._load_story_data()
+        self.batch_data = batch_data if batch_data is not None else self._load_batch_data()
+        self.story_index = story_index
+        self.aliases = self.batch_data.get('uid_aliases') or {}
+        self.echo_text = echo_text
+        self.columns = self.row_columns(echo_text)
+        self.required_columns = [col for col in self.required_columns if col in self.columns]
         self.errors = []
         self.warnings = []
         
@@ -34,51 +65,90 @@ class MappingVerifier:
         with open(self.batch_file, 'r', encoding='utf-8') as f:
             return json.load(f)
     
-    def _load_story_data(self) -> Dict[str, Any]:
-        """Load original story data"""
-        with open(self.story_json, 'r', encoding='utf-8') as f:
-            return json.load(f)
+    @property
+    def story_data(self) -> Dict[str, Any]:
+        """Original story data, parsed on first use when no shared index was given"""
+        if self.story_index is None:
+            self.story_index = StoryIndex.load(str(self.story_json))
+        return self.story_index.story_data
+    
+    def unit_text(self, unit: Dict[str, Any]) -> str:
+        """Original text of a batch unit, read from the story's text store when the unit carries none"""
+        if 'text' in unit:
+            return unit['text']
+        if self.story_index is None:
+            self.story_index = StoryIndex.load(str(self.story_json))
+        return self.story_index.unit_text(unit)
     
     def parse_markdown_table(self, markdown_response: str) -> List[Dict[str, str]]:
         """Parse markdown table from LLM response"""
-        rows = []
-        lines = markdown_response.strip().split('\n')
+        parser = StreamingTableParser(aliases=self.aliases)
+        parser.feed(markdown_response.strip())
+        parser.close()
+        return parser.rows
+    
+    @classmethod
+    def row_columns(cls, echo_text: bool = True) -> List[str]:
+        """Columns the model fills, without Raw Sentence for annotate-by-UID prompts"""
+        return [col for col in cls.columns if echo_text or col != 'Raw Sentence']
+    
+    @classmethod
+    def json_schema(cls, echo_text: bool = True) -> Dict[str, Any]:
+        """JSON schema for structured responses: {"rows": [row objects]}, passed as Ollama's `format`"""
+        columns = cls.row_columns(echo_text)
+        return {
+            "type": "object",
+            "properties": {
+                "rows": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {column: {"type": "string"} for column in columns},
+                        "required": columns
+                    }
+                }
+            },
+            "required": ["rows"]
+        }
+    
+    def parse_json_rows(self, json_response: str) -> List[Dict[str, str]]:
+        """
+        Parse and validate a structured (JSON) LLM response into table rows
         
-        # Find table start
-        table_started = False
-        headers = []
+        Row objects without a string UID are dropped; missing columns become
+        empty strings, so the usual checks report them instead of the row
+        silently disappearing.
+        """
+        try:
+            payload = json.loads(json_response)
+        except ValueError:
+            # Tolerate a code fence or chatter around the JSON object
+            match = re.search(r'\{.*\}', json_response, re.DOTALL)
+            try:
+                payload = json.loads(match.group(0)) if match else None
+            except ValueError:
+                payload = None
+            if payload is None:
+                self.errors.append(("invalid_json", json_response[:200]))
+                return []
         
-        for line in lines:
-            line = line.strip()
-            
-            # Skip empty lines
-            if not line:
-                continue
-            
-            # Detect header row
-            if '|' in line and 'UID' in line and 'Raw Sentence' in line:
-                headers = [h.strip() for h in line.split('|') if h.strip()]
-                table_started = True
-                continue
-            
-            # Skip separator row
-            if table_started and re.match(r'^[\|\s\-]+$', line):
-                continue
-            
-            # Parse data rows
-            if table_started and '|' in line:
-                values = [v.strip() for v in line.split('|') if v.strip()]
-                
-                if len(values) >= len(headers):
-                    row_dict = {}
-                    for i, header in enumerate(headers):
-                        if i < len(values):
-                            row_dict[header] = values[i]
-                    
-                    # Ensure we have at least UID and Raw Sentence
-                    if 'UID' in row_dict and 'Raw Sentence' in row_dict:
-                        rows.append(row_dict)
+        items = payload.get('rows', []) if isinstance(payload, dict) else payload
+        if not isinstance(items, list):
+            self.errors.append(("invalid_json", "rows is not an array"))
+            return []
         
+        rows = []
+        for item in items:
+            if not isinstance(item, dict) or not isinstance(item.get('UID'), str):
+                self.warnings.append(("invalid_json_row", str(item)[:200]))
+                continue
+            row = {}
+            for column in self.columns:
+                value = item.get(column)
+                if isinstance(value, list):
+                    value = ', '.join(str(v) for v in value)
+                row[column] = '' if value is None else str(value).strip()
+            rows.append(resolve_aliases(row, self.aliases) if self.aliases else row)
         return rows
     
     def verify_uid_completeness(self, parsed_rows: List[Dict[str, str]]) -> Tuple[bool, List[str]]:
@@ -108,7 +178,7 @@ class MappingVerifier:
     def verify_text_accuracy(self, parsed_rows: List[Dict[str, str]]) -> Tuple[bool, List[str]]:
         """Verify that raw sentences match exactly"""
         # Create lookup for original text
-        uid_to_text = {unit['uid']: unit['text'] for unit in self.batch_data['units']}
+        uid_to_text = {unit['uid']: self.unit_text(unit) for unit in self.batch_data['units']}
         
         errors = []
         text_mismatches = []
@@ -149,8 +219,8 @@ class MappingVerifier:
     
     def verify_table_structure(self, parsed_rows: List[Dict[str, str]]) -> Tuple[bool, List[str]]:
         """Verify table has all required columns"""
-        required_columns = ['UID', 'Raw Sentence', 'Narrative Purpose']
-        optional_columns = ['Characters', 'Locations', 'Key Items/Concepts', 'Links']
+        required_columns = self.required_columns
+        optional_columns = [col for col in self.columns if col not in required_columns]
         
         errors = []
         warnings = []
@@ -187,9 +257,12 @@ class MappingVerifier:
     
     def generate_report(self, parsed_rows: List[Dict[str, str]], llm_response: str) -> Dict[str, Any]:
         """Generate comprehensive verification report"""
-        # Run all checks
+        # Run all checks; annotate-by-UID rows carry no text to compare
         uid_complete, uid_errors = self.verify_uid_completeness(parsed_rows)
-        text_accurate, text_errors = self.verify_text_accuracy(parsed_rows)
+        if self.echo_text:
+            text_accurate, text_errors = self.verify_text_accuracy(parsed_rows)
+        else:
+            text_accurate, text_errors = True, []
         structure_valid, structure_errors = self.verify_table_structure(parsed_rows)
         
         # Calculate statistics
@@ -212,6 +285,7 @@ class MappingVerifier:
                 },
                 "text_accuracy": {
                     "passed": text_accurate,
+                    "skipped": not self.echo_text,
                     "errors": text_errors
                 },
                 "table_structure": {
@@ -227,6 +301,40 @@ class MappingVerifier:
         
         return report
     
+    def split_verified_rows(self, parsed_rows: List[Dict[str, str]]) -> Tuple[List[Dict[str, str]], List[str]]:
+        """
+        Separate rows that verify on their own from the batch UIDs that still need a row
+        
+        Call after generate_report(), whose detailed errors decide which rows are bad.
+        
+        Returns:
+            (usable rows in batch order, UIDs to regenerate in batch order)
+        """
+        expected_uids = [unit['uid'] for unit in self.batch_data['units']]
+        
+        bad_uids = set()
+        for error in self.errors:
+            if error[0] == 'duplicate_uids':
+                bad_uids.update(error[1])
+            elif error[0] == 'text_mismatch':
+                bad_uids.add(error[1])
+            elif error[0] == 'missing_columns':
+                # No row can be trusted if the table itself is malformed
+                bad_uids.update(expected_uids)
+        
+        usable = {}
+        for row in parsed_rows:
+            uid = row.get('UID', '')
+            if uid not in expected_uids or uid in bad_uids:
+                continue
+            if any(not row.get(col, '').strip() for col in self.required_columns):
+                continue
+            usable[uid] = row
+        
+        kept_rows = [usable[uid] for uid in expected_uids if uid in usable]
+        failed_uids = [uid for uid in expected_uids if uid not in usable]
+        return kept_rows, failed_uids
+    
     def _get_recommendation(self, uid_complete: bool, text_accurate: bool, structure_valid: bool) -> str:
         """Get recommendation based on verification results"""
         if uid_complete and text_accurate and structure_valid:
@@ -269,6 +377,157 @@ class MappingVerifier:
         return report
 
 
+class StreamingTableParser:
+    """
+    Incremental Markdown table parser for streamed LLM responses
+    
+    Text is fed in arbitrary chunks; complete lines are parsed into rows as
+    soon as they arrive. When the batch units are given, every row is checked
+    against the batch and `abort_reason` is set once the model goes off-script
+    so the caller can stop generation early.
+    """
+    
+    def __init__(self,
+                 units: Optional[List[Dict[str, Any]]] = None,
+                 runaway_factor: float = 4.0,
+                 max_line_chars: int = 4000,
+                 aliases: Optional[Dict[str, str]] = None,
+                 story_index: Optional[StoryIndex] = None):
+        """
+        Initialize parser
+        
+        Args:
+            units: Batch units to check rows against (None disables checks)
+            runaway_factor: A Raw Sentence longer than this multiple of the original counts as runaway text
+            max_line_chars: An unterminated line longer than this counts as runaway text
+            aliases: Per-batch UID aliases (alias -> UID) to map rows back through
+            story_index: Index whose text store holds the units' text, when they carry none
+        """
+        self.units = units
+        self.expected_uids = [unit['uid'] for unit in units] if units else []
+        self.uid_position = {uid: i for i, uid in enumerate(self.expected_uids)}
+        self.uid_to_text = {unit['uid']: story_index.unit_text(unit) if story_index else unit['text']
+                            for unit in units} if units else {}
+        self.runaway_factor = runaway_factor
+        self.max_line_chars = max_line_chars
+        self.aliases = aliases or {}
+        
+        self.headers = []
+        self.table_started = False
+        self.buffer = ""
+        self.rows = []
+        self.seen_uids = set()
+        self.last_position = -1
+        self.mismatched_uids = []
+        self.abort_reason = None
+    
+    @property
+    def complete(self) -> bool:
+        """True once every batch UID has a row"""
+        return bool(self.expected_uids) and self.seen_uids.issuperset(self.expected_uids)
+    
+    def feed(self, chunk: str) -> List[Dict[str, str]]:
+        """Consume a chunk of text; returns the rows completed by it"""
+        self.buffer += chunk
+        *lines, self.buffer = self.buffer.split('\n')
+        
+        new_rows = []
+        for line in lines:
+            row = self._parse_line(line)
+            if row is not None:
+                new_rows.append(row)
+            if self.abort_reason:
+                break
+        
+        if self.units and not self.abort_reason and len(self.buffer) > self.max_line_chars:
+            self.abort_reason = f"runaway text: {len(self.buffer)} characters without a line break"
+        
+        return new_rows
+    
+    def close(self) -> List[Dict[str, str]]:
+        """Parse whatever remains after the final chunk"""
+        remaining, self.buffer = self.buffer, ""
+        row = self._parse_line(remaining)
+        return [row] if row is not None else []
+    
+    def _parse_line(self, line: str) -> Optional[Dict[str, str]]:
+        line = line.strip()
+        
+        # Skip empty lines
+        if not line:
+            return None
+        
+        # Detect header row (annotate-by-UID tables have no Raw Sentence column)
+        if '|' in line and 'UID' in line and ('Raw Sentence' in line or 'Narrative Purpose' in line):
+            self.headers = [h for h in self._split_cells(line) if h]
+            self.table_started = True
+            return None
+        
+        # Skip separator row
+        if self.table_started and re.match(r'^[\|\s\-]+$', line):
+            return None
+        
+        # Parse data rows
+        if self.table_started and '|' in line:
+            values = self._split_cells(line)
+            
+            # Keep rows with empty or missing trailing cells so the checks can report them;
+            # a line that doesn't open with a pipe must still be a full row, not stray prose
+            is_row = line.startswith('|') or len(values) >= len(self.headers)
+            if is_row and len(values) >= 2 and values[0]:
+                row_dict = {}
+                for i, header in enumerate(self.headers):
+                    row_dict[header] = values[i] if i < len(values) else ''
+                
+                # Ensure we have at least a UID
+                if 'UID' in row_dict:
+                    if self.aliases:
+                        resolve_aliases(row_dict, self.aliases)
+                    self.rows.append(row_dict)
+                    if self.units:
+                        self._check_row(row_dict)
+                    return row_dict
+        
+        return None
+    
+    @staticmethod
+    def _split_cells(line: str) -> List[str]:
+        """Cells of a table line, splitting only on unescaped pipes and keeping empty cells"""
+        if line.startswith('|'):
+            line = line[1:]
+        if line.endswith('|') and not line.endswith('\\|'):
+            line = line[:-1]
+        return [cell.strip().replace('\\|', '|') for cell in re.split(r'(?<!\\)\|', line)]
+    
+    def _check_row(self, row: Dict[str, str]):
+        """Flag rows that show the model has gone off-script"""
+        uid = row['UID']
+        
+        if uid not in self.uid_position:
+            self.abort_reason = f"unexpected UID {uid}"
+            return
+        if uid in self.seen_uids:
+            self.abort_reason = f"repeated row for {uid}"
+            return
+        
+        # Skipping ahead is left to the verifier and repair loop; going backwards is not
+        position = self.uid_position[uid]
+        if position < self.last_position:
+            self.abort_reason = f"UID {uid} out of order"
+            return
+        self.last_position = position
+        self.seen_uids.add(uid)
+        
+        if 'Raw Sentence' not in row:
+            return
+        original = self.uid_to_text[uid]
+        provided = row['Raw Sentence']
+        if len(provided) > len(original) * self.runaway_factor + 200:
+            self.abort_reason = f"runaway text in row {uid}"
+        elif ' '.join(provided.split()) != ' '.join(original.split()):
+            self.mismatched_uids.append(uid)
+
+
 def main():
     """Example usage"""
     # This would normally be called by the orchestrator with actual LLM response
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Endpoint Pool tests for Zero-Loss Mapping Workflow
+Runs the pool against local stand-in Ollama servers: routing, ejection, readmission and shutdown
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from endpoint_pool import EndpointPool
+from orchestrator import MappingOrchestrator
+
+
+class StandInServer:
+    """Minimal Ollama stand-in answering /api/version and /api/chat on a free local port"""
+
+    def __init__(self):
+        self.up = True
+        self.chats = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, status, body):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if server.up:
+                    self.send_json(200, {"version": "0.0-standin"})
+                else:
+                    self.send_json(503, {"error": "down"})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers['Content-Length']))
+                server.chats += 1
+                if not server.up:
+                    return self.send_json(500, {"error": "down"})
+                self.send_json(200, {
+                    "model": "standin",
+                    "created_at": "2026-01-01T00:00:00Z",
+                    "message": {"role": "assistant", "content": "ok"},
+                    "done": True,
+                    "eval_count": 5
+                })
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def call(pool: EndpointPool):
+    """One chat request routed through the pool, reported back like the orchestrator does"""
+    endpoint = pool.acquire()
+    try:
+        endpoint.client.chat(model="standin", messages=[{"role": "user", "content": "hi"}])
+    except Exception:
+        pool.release(endpoint, False)
+        return endpoint, False
+    pool.release(endpoint, True, 0.01, 5)
+    return endpoint, True
+
+
+class EndpointPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.servers = [StandInServer(), StandInServer()]
+        self.pool = EndpointPool([server.url for server in self.servers], failure_threshold=2,
+                                 probe_interval=0.05, probe_timeout=1.0, acquire_timeout=1.0)
+
+    def tearDown(self):
+        self.pool.close()
+        for server in self.servers:
+            server.stop()
+
+    def test_routes_across_servers(self):
+        for _ in range(6):
+            _, ok = call(self.pool)
+            self.assertTrue(ok)
+        self.assertEqual([server.chats for server in self.servers], [3, 3])
+        self.assertEqual(sum(e['generated_tokens'] for e in self.pool.snapshot()), 30)
+
+    def test_ejects_failing_server_and_readmits_it(self):
+        good, bad = self.servers
+        bad.up = False
+        failures = 0
+        for _ in range(6):
+            _, ok = call(self.pool)
+            failures += not ok
+        self.assertEqual(failures, 2)
+        self.assertFalse(self.pool.endpoints[1].healthy)
+        self.assertEqual(bad.chats, 2)
+
+        bad.up = True
+        self.pool.probe_all()
+        self.assertTrue(self.pool.endpoints[1].healthy)
+        self.assertEqual(self.pool.snapshot()[1]['readmissions'], 1)
+        routed = {call(self.pool)[0].host for _ in range(2)}
+        self.assertEqual(routed, {good.url, bad.url})
+
+    def test_prober_ejects_and_readmits_in_background(self):
+        self.pool.start()
+        self.servers[0].up = False
+        self.assertTrue(self.wait_for(lambda: not self.pool.endpoints[0].healthy))
+        self.servers[0].up = True
+        self.assertTrue(self.wait_for(lambda: self.pool.endpoints[0].healthy))
+
+    def test_close_stops_the_prober(self):
+        self.pool.start()
+        prober = self.pool._prober
+        self.pool.close()
+        self.assertFalse(prober.is_alive())
+
+    def test_orchestrator_stops_the_prober_after_processing(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            try:
+                orchestrator = MappingOrchestrator(ollama_hosts=[server.url for server in self.servers],
+                                                   probe_interval=0.05, use_cache=False)
+                orchestrator.process_batches([], total=0)
+                self.assertIsNone(orchestrator.endpoint_pool._prober)
+                self.assertFalse(any(thread.name == "endpoint-prober" and thread.is_alive()
+                                     for thread in threading.enumerate()))
+            finally:
+                os.chdir(cwd)
+
+    @staticmethod
+    def wait_for(condition, timeout: float = 2.0) -> bool:
+        """Whether condition() became true within timeout seconds"""
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.02)
+        return True
+
+
+if __name__ == "__main__":
+    unittest.main()